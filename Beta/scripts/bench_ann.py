@@ -0,0 +1,92 @@
+"""
+ANN 后端基准：brute（全量点积 + argsort） vs HNSW（不同 efSearch） vs IVF（不同 nprobe）。
+在几种语料规模下报告相对精确 top-k 的 recall@k、单查询延迟（p50/p95）和建索引耗时，
+用来判断在多大的 chunk 数以上 ANN 才比暴力检索划算。没装 faiss/hnswlib 时对应后端跳过。
+
+    python scripts/bench_ann.py --sizes 10000,100000,500000 --queries 200
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.a_memory.ann import BruteForceIndex, HnswIndex, IvfIndex
+from src.a_memory.vectors import EmbeddingMatrix, save_embeddings
+from bench_embeddings import synthetic_embeddings
+
+
+def _measure(index, queries, truth, k):
+    lat, recall = [], []
+    for q, t in zip(queries, truth):
+        t0 = time.perf_counter()
+        rows, _ = index.search(q, k)
+        lat.append((time.perf_counter() - t0) * 1000)
+        recall.append(len(t.intersection(rows.tolist())) / k)
+    return {
+        f"recall@{k}": round(float(np.mean(recall)), 4),
+        "p50_ms": round(float(np.percentile(lat, 50)), 3),
+        "p95_ms": round(float(np.percentile(lat, 95)), 3),
+    }
+
+
+def bench_size(rows: int, dim: int, n_queries: int, k: int, efs, nprobes) -> dict:
+    emb = synthetic_embeddings(rows, dim)
+    rng = np.random.default_rng(1)
+    queries = emb[rng.integers(0, rows, n_queries)] + 0.3 * rng.standard_normal((n_queries, dim)).astype("float32")
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = [set(np.argpartition(emb @ q, -k)[-k:].tolist()) for q in queries]
+
+    out = {"rows": rows, "backends": []}
+    with tempfile.TemporaryDirectory() as d:
+        path = Path(d) / "emb.npy"
+        save_embeddings(emb, path, storage="float32")
+        brute = BruteForceIndex(EmbeddingMatrix(path, storage="float32"))
+        out["backends"].append({"backend": "brute", "build_s": 0.0, **_measure(brute, queries, truth, k)})
+
+    try:
+        t0 = time.perf_counter()
+        hnsw = HnswIndex.build(emb)
+        build_s = round(time.perf_counter() - t0, 2)
+        for ef in efs:
+            hnsw.set_ef(ef)
+            out["backends"].append({"backend": f"hnsw[{hnsw.lib}]", "ef_search": ef, "build_s": build_s,
+                                    **_measure(hnsw, queries, truth, k)})
+    except ImportError:
+        out["backends"].append({"backend": "hnsw", "skipped": "faiss/hnswlib not installed"})
+
+    try:
+        t0 = time.perf_counter()
+        ivf = IvfIndex.build(emb)
+        build_s = round(time.perf_counter() - t0, 2)
+        for nprobe in nprobes:
+            ivf.set_nprobe(nprobe)
+            out["backends"].append({"backend": "ivf", "nlist": int(ivf.index.nlist), "nprobe": nprobe,
+                                    "build_s": build_s, **_measure(ivf, queries, truth, k)})
+    except ImportError:
+        out["backends"].append({"backend": "ivf", "skipped": "faiss not installed"})
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10000,100000,500000")
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=50)
+    ap.add_argument("--ef", default="32,64,128,256")
+    ap.add_argument("--nprobe", default="4,16,64")
+    args = ap.parse_args()
+
+    efs = [int(x) for x in args.ef.split(",")]
+    nprobes = [int(x) for x in args.nprobe.split(",")]
+    report = {"dim": args.dim, "k": args.k, "sizes": []}
+    for rows in (int(x) for x in args.sizes.split(",")):
+        report["sizes"].append(bench_size(rows, args.dim, args.queries, args.k, efs, nprobes))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
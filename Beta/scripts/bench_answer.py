@@ -0,0 +1,80 @@
+"""
+抽取式回答基准：证据块带索引里预先算好的逐句特征（EvidenceBlock.utterances）vs 回答时现场切句 / 分词。
+
+    python scripts/bench_answer.py --questions 2000 --evidences 5
+
+两种方式的 answer() 输出逐字比较，不一致直接报错退出。
+"""
+import argparse
+import json
+import random
+import time
+
+from src.a_memory.utterances import extract_utterances
+from src.b_answer.qwen_answer import EvidenceBlock, ExtractiveAnswerer
+
+SPEAKERS = ["me", "clientA", "clientB", "coo", "pm", ""]
+WORDS = ["报价", "包含", "部署", "培训", "不含", "单独", "彩排", "流程", "回签", "已更新", "确认", "付款节点",
+         "内部", "版本", "发你", "下周", "2026-02-19", "3月5日", "周三", "今天下午", "合同v2", "20万", "演示", "脚本", "，", "。"]
+QUESTIONS = ["客户A之前问过报价包含什么吗？", "彩排什么时候？", "合同回签流程怎么走", "合同v2是在哪个会话发的？", "我跟谁说过报价20万？"]
+
+
+def synthetic_chunk(rnd: random.Random) -> str:
+    lines = []
+    for _ in range(rnd.randint(5, 60)):
+        body = "".join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 15)))
+        spk = rnd.choice(SPEAKERS)
+        lines.append(f"{spk}: {body}" if spk else body)
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--questions", type=int, default=2000)
+    ap.add_argument("--evidences", type=int, default=5)
+    args = ap.parse_args()
+
+    rnd = random.Random(7)
+    cases = []
+    for _ in range(args.questions):
+        texts = [synthetic_chunk(rnd) for _ in range(args.evidences)]
+        cases.append((rnd.choice(QUESTIONS), texts, [round(rnd.random(), 3) for _ in texts]))
+
+    def blocks(texts, scores, with_features: bool):
+        return [
+            EvidenceBlock(
+                idx=i, conv_id=f"c{i}", conv_title="", time_range=None, message_ids=[], score=s, confidence="",
+                snippet=t[:800], utterances=extract_utterances(t) if with_features else None,
+            )
+            for i, (t, s) in enumerate(zip(texts, scores), 1)
+        ]
+
+    answerer = ExtractiveAnswerer()
+    # 特征在构建索引时就算好了，不计入回答耗时
+    pre = [(q, blocks(texts, scores, True)) for q, texts, scores in cases]
+    raw = [(q, blocks(texts, scores, False)) for q, texts, scores in cases]
+
+    t0 = time.perf_counter()
+    out_pre = [answerer.answer(q, evs) for q, evs in pre]
+    t_pre = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    out_raw = [answerer.answer(q, evs) for q, evs in raw]
+    t_raw = time.perf_counter() - t0
+
+    for i, (a, b) in enumerate(zip(out_pre, out_raw)):
+        if a != b:
+            raise AssertionError(f"第 {i} 个问题的回答不一致：\n{a}\n---\n{b}")
+
+    print(json.dumps({
+        "questions": args.questions,
+        "evidences_per_question": args.evidences,
+        "equivalent": True,
+        "precomputed_ms_per_answer": round(t_pre * 1000 / args.questions, 3),
+        "on_the_fly_ms_per_answer": round(t_raw * 1000 / args.questions, 3),
+        "speedup": round(t_raw / t_pre, 2),
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+BM25 基准：rank_bm25.BM25Okapi（pickle） vs 倒排 CSR 的 BM25Index（mmap）。
+合成 Zipf 分布的语料，报告构建耗时、落盘体积、加载耗时、单查询延迟（打分 + top50），
+并校验两者分数逐位一致。
+
+    python scripts/bench_bm25.py --docs 100000,1000000 --queries 20
+"""
+import argparse
+import json
+import pickle
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from src.a_memory.bm25_index import BM25Index
+from src.a_memory.filters import top_k
+
+
+def synthetic_corpus(docs: int, vocab: int, avg_len: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    lens = rng.poisson(avg_len, docs)
+    ids = np.minimum(rng.zipf(1.3, int(lens.sum())), vocab) - 1
+    words = [f"w{i}" for i in range(vocab)]
+    out, pos = [], 0
+    for n in lens:
+        out.append([words[i] for i in ids[pos:pos + n]])
+        pos += n
+    return out
+
+
+def _doc_freqs(tokens):
+    freqs = {}
+    for w in tokens:
+        freqs[w] = freqs.get(w, 0) + 1
+    return freqs
+
+
+def _dir_mb(path: Path) -> float:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file()) / (1024 * 1024)
+
+
+def bench(docs: int, vocab: int, avg_len: int, n_queries: int) -> dict:
+    corpus = synthetic_corpus(docs, vocab, avg_len)
+    rng = np.random.default_rng(1)
+    # 查询词混合高频词与长尾词
+    queries = [[f"w{int(i)}" for i in np.minimum(rng.zipf(1.1, rng.integers(2, 6)), vocab) - 1] for _ in range(n_queries)]
+    out = {"docs": docs}
+
+    with tempfile.TemporaryDirectory() as d:
+        t0 = time.perf_counter()
+        okapi = BM25Okapi(corpus)
+        out["okapi_build_s"] = round(time.perf_counter() - t0, 2)
+        pkl = Path(d) / "bm25.pkl"
+        with open(pkl, "wb") as f:
+            pickle.dump(okapi, f)
+        out["okapi_disk_mb"] = round(pkl.stat().st_size / (1024 * 1024), 1)
+        del okapi
+        t0 = time.perf_counter()
+        with open(pkl, "rb") as f:
+            okapi = pickle.load(f)
+        out["okapi_load_s"] = round(time.perf_counter() - t0, 3)
+
+        t0 = time.perf_counter()
+        index = BM25Index.build([_doc_freqs(doc) for doc in corpus])
+        out["csr_build_s"] = round(time.perf_counter() - t0, 2)
+        root = Path(d) / "bm25_index"
+        index.save(root)
+        out["csr_disk_mb"] = round(_dir_mb(root), 1)
+        del index
+        t0 = time.perf_counter()
+        index = BM25Index.open(root)
+        out["csr_load_s"] = round(time.perf_counter() - t0, 3)
+
+        ok_lat, csr_lat, mismatches = [], [], 0
+        for q in queries:
+            t0 = time.perf_counter()
+            ref = okapi.get_scores(q)
+            np.argsort(ref)[-50:][::-1]
+            ok_lat.append((time.perf_counter() - t0) * 1000)
+
+            t0 = time.perf_counter()
+            rows, scores = index.score_sparse(q)
+            rows[top_k(scores, 50)]
+            csr_lat.append((time.perf_counter() - t0) * 1000)
+
+            dense = np.zeros(docs)
+            dense[rows] = scores
+            mismatches += int(not np.array_equal(dense, ref))
+        out["okapi_p50_ms"] = round(float(np.percentile(ok_lat, 50)), 2)
+        out["csr_p50_ms"] = round(float(np.percentile(csr_lat, 50)), 2)
+        out["score_mismatches"] = mismatches
+        index.close()
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", default="100000,1000000")
+    ap.add_argument("--vocab", type=int, default=200_000)
+    ap.add_argument("--avg-len", type=int, default=40)
+    ap.add_argument("--queries", type=int, default=20)
+    args = ap.parse_args()
+
+    report = {"vocab": args.vocab, "avg_len": args.avg_len, "sizes": []}
+    for n in (int(x) for x in args.docs.split(",")):
+        report["sizes"].append(bench(n, args.vocab, args.avg_len, args.queries))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+切分引擎等价性校验 + 基准：build_chunks（逐条 Python）vs build_chunks_columnar（列式 + NumPy）。
+
+    python scripts/bench_chunker.py --messages 1000000
+
+合成数据刻意覆盖各种边界：噪声/寒暄、短但信息密集的文本、>30 分钟间隔、超过 MAX_CHUNK_CHARS 的长消息、
+相同时间戳、带时区的时间。任何一个 chunk 不一致都会直接报错退出。
+"""
+import argparse
+import json
+import random
+import time
+from dataclasses import asdict
+from datetime import datetime, timedelta
+
+from src.a_memory.chunking import build_chunks, build_chunks_columnar, conversation_columns
+
+SHORT = ["嗯", "好的", "哈哈", "ok", "收到", "行", "可以", "没问题", "20万", "发了", "签了", "😂😂", "……", "", "  "]
+WORDS = ["报价", "合同", "付款节点", "部署", "培训", "演示", "彩排", "脚本", "下周", "版本", "2026-02-19", "10:30", "@dev", "#beta"]
+
+
+def synthetic_conversations(n_messages: int, msgs_per_conv: int, seed: int = 7):
+    rnd = random.Random(seed)
+    convs = []
+    j = 0
+    while j < n_messages:
+        n = min(msgs_per_conv, n_messages - j)
+        ts = datetime(2025, 1, 1) + timedelta(minutes=rnd.randint(0, 500000))
+        tz = rnd.random() < 0.1
+        msgs = []
+        for k in range(n):
+            r = rnd.random()
+            ts += timedelta(seconds=0 if r < 0.05 else (rnd.randint(1800, 7200) if r < 0.2 else rnd.randint(1, 600)))
+            if r < 0.3:
+                text = rnd.choice(SHORT)
+            elif r < 0.33:
+                text = "".join(rnd.choice(WORDS) for _ in range(rnd.randint(100, 300)))  # 超长
+            else:
+                text = "".join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 15)))
+            stamp = ts.isoformat(timespec="seconds") + ("+08:00" if tz else "")
+            msgs.append({"id": f"m{j + k}", "sender": rnd.choice(["me", "clientA", "pm"]), "ts": stamp, "text": text})
+        convs.append((f"c{len(convs)}", msgs))
+        j += n
+    return convs
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=1_000_000)
+    ap.add_argument("--msgs-per-conv", type=int, default=500)
+    args = ap.parse_args()
+
+    convs = synthetic_conversations(args.messages, args.msgs_per_conv)
+
+    t0 = time.perf_counter()
+    ref = [build_chunks(cid, msgs) for cid, msgs in convs]
+    t_ref = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    fast = [build_chunks_columnar(cid, conversation_columns(msgs)) for cid, msgs in convs]
+    t_fast = time.perf_counter() - t0
+
+    n_chunks = 0
+    for (cid, _), a, b in zip(convs, ref, fast):
+        if [asdict(c) for c in a] != [asdict(c) for c in b]:
+            raise AssertionError(f"会话 {cid} 的切分结果不一致")
+        n_chunks += len(a)
+
+    print(json.dumps({
+        "messages": args.messages,
+        "convs": len(convs),
+        "chunks": n_chunks,
+        "equivalent": True,
+        "build_chunks_seconds": round(t_ref, 3),
+        "columnar_seconds": round(t_fast, 3),
+        "speedup": round(t_ref / t_fast, 2),
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+并行切分扩展性基准：同一个合成库，分别用 1/2/4/... 个进程跑 chunk_conversations，
+并校验结果与串行完全一致（顺序 + chunk_id + 文本）。
+
+    python scripts/bench_chunking.py --messages 1000000 --convs 5000 --workers 1,2,4,8
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from bench_index_build import populate
+from src.a_memory.db import connect, migrate
+from src.a_memory.index_build import chunk_conversations
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=1_000_000)
+    ap.add_argument("--convs", type=int, default=5000)
+    ap.add_argument("--workers", default=",".join(str(w) for w in (1, 2, 4, 8) if w <= (os.cpu_count() or 1)))
+    ap.add_argument("--batch-convs", type=int, default=64)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        conn = connect(Path(d) / "bench.db")
+        migrate(conn)
+        populate(conn, args.messages, args.convs)
+        cur = conn.cursor()
+        cur.execute("SELECT conv_id FROM conversations")
+        conv_ids = [r[0] for r in cur.fetchall()]
+
+        report = {"messages": args.messages, "convs": args.convs, "cpu_count": os.cpu_count(), "runs": []}
+        baseline = None
+        for w in [int(x) for x in args.workers.split(",") if x.strip()]:
+            t0 = time.perf_counter()
+            chunks = chunk_conversations(cur, conv_ids, workers=w, batch_convs=args.batch_convs)
+            elapsed = time.perf_counter() - t0
+            sig = [(c.chunk_id, c.text) for c in chunks]
+            if baseline is None:
+                baseline = (sig, elapsed)
+            elif sig != baseline[0]:
+                raise AssertionError(f"workers={w} 的切分结果与串行不一致")
+            report["runs"].append({
+                "workers": w,
+                "seconds": round(elapsed, 3),
+                "chunks": len(chunks),
+                "speedup": round(baseline[1] / elapsed, 2),
+            })
+        conn.close()
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
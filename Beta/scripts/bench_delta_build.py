@@ -0,0 +1,97 @@
+"""
+增量构建的切分等价性校验 + 基准：追加消息后 旧 chunk[:resync_point] + rechunk_from 与整会话重切逐块比较。
+
+    python scripts/bench_delta_build.py --convs 2000
+
+合成数据刻意覆盖：同一秒内的大量消息（max_messages / MAX_CHUNK_CHARS 切在同一秒里）、噪声/寒暄、
+>30 分钟间隔、超长消息，以及新消息与旧高水位同一时刻（走整体重切，与 build_delta 相同）。
+只比较切分结果，不含 embedding。任何一个会话不一致都会直接报错退出。
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from src.a_memory.chunking import chunk_conversation, resync_point
+from src.a_memory.db import connect, migrate
+from src.a_memory.index_build import load_conv_messages, rechunk_from
+
+SHORT = ["嗯", "好的", "哈哈", "ok", "收到", "20万", "签了"]
+WORDS = ["报价", "合同", "付款节点", "部署", "培训", "演示", "彩排", "脚本", "下周", "版本", "2026-02-19"]
+
+
+def synthetic_messages(cid: str, rnd: random.Random, n: int):
+    ts = datetime(2026, 1, 1) + timedelta(minutes=rnd.randint(0, 100000))
+    msgs = []
+    for k in range(n):
+        r = rnd.random()
+        # 约一半的消息与上一条同一秒
+        ts += timedelta(seconds=0 if r < 0.5 else (rnd.randint(1800, 7200) if r < 0.55 else rnd.randint(1, 600)))
+        if rnd.random() < 0.2:
+            text = rnd.choice(SHORT)
+        elif rnd.random() < 0.05:
+            text = "".join(rnd.choice(WORDS) for _ in range(rnd.randint(100, 300)))
+        else:
+            text = "".join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 15)))
+        msgs.append((f"{cid}-m{k}", cid, rnd.choice(["me", "clientA", "pm"]), ts.isoformat(timespec="seconds"), text))
+    return msgs
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--convs", type=int, default=2000)
+    ap.add_argument("--max-messages", type=int, default=200)
+    args = ap.parse_args()
+
+    rnd = random.Random(11)
+    checked = appended = 0
+    t_delta = t_full = 0.0
+    with tempfile.TemporaryDirectory() as d:
+        conn = connect(Path(d) / "bench.db")
+        migrate(conn)
+        cur = conn.cursor()
+        for j in range(args.convs):
+            cid = f"c{j}"
+            msgs = synthetic_messages(cid, rnd, rnd.randint(2, args.max_messages))
+            cut = rnd.randint(1, len(msgs) - 1)
+            # 旧高水位：前 cut 条消息时的索引
+            cur.executemany("INSERT INTO messages(id, conv_id, sender, ts, text) VALUES(?,?,?,?,?)", msgs[:cut])
+            old = chunk_conversation(cid, load_conv_messages(cur, cid))
+            last_ts = max(m[3] for m in msgs[:cut])
+            cur.executemany("INSERT INTO messages(id, conv_id, sender, ts, text) VALUES(?,?,?,?,?)", msgs[cut:])
+
+            t0 = time.perf_counter()
+            full = chunk_conversation(cid, load_conv_messages(cur, cid))
+            t_full += time.perf_counter() - t0
+
+            # 与 build_delta 相同的判断：追加型只从 resync_point 起重切，否则整体重切
+            t0 = time.perf_counter()
+            delta = full
+            if old:
+                k = resync_point([(c.time_start, c.time_end) for c in old])
+                rechunked = rechunk_from(cur, cid, old[k].message_ids[0], old[k].time_start, last_ts)
+                if rechunked is not None and len(msgs) - rechunked[1] == cut:
+                    delta = old[:k] + rechunked[0]
+                    appended += 1
+            t_delta += time.perf_counter() - t0
+
+            if [asdict(c) for c in delta] != [asdict(c) for c in full]:
+                raise AssertionError(f"会话 {cid} 增量切分与全量重切不一致（cut={cut}）")
+            checked += 1
+        conn.close()
+
+    print(json.dumps({
+        "convs": checked,
+        "append_path": appended,
+        "equivalent": True,
+        "full_rechunk_seconds": round(t_full, 3),
+        "delta_rechunk_seconds": round(t_delta, 3),
+    }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
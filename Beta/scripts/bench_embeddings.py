@@ -0,0 +1,72 @@
+"""
+embedding 存储模式基准：float32（mmap 精确） vs float16 / int8（量化粗排 + float32 精排）。
+报告每种模式相对精确 float32 的 recall@k、单查询延迟（p50/p95）以及粗排矩阵占用。
+
+    python scripts/bench_embeddings.py --rows 500000 --queries 200
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.a_memory.vectors import EmbeddingMatrix, save_embeddings
+
+
+def synthetic_embeddings(rows: int, dim: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """带簇结构的单位向量（比纯随机更接近句向量的分布，近邻之间分数差更小、更考验量化误差）。"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+    x = centers[rng.integers(0, clusters, rows)] + 0.6 * rng.standard_normal((rows, dim)).astype("float32")
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=500_000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=50)
+    ap.add_argument("--rescore-k", type=int, default=200)
+    args = ap.parse_args()
+
+    emb = synthetic_embeddings(args.rows, args.dim)
+    rng = np.random.default_rng(1)
+    queries = emb[rng.integers(0, args.rows, args.queries)] + 0.3 * rng.standard_normal((args.queries, args.dim)).astype("float32")
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    truth = [set(np.argpartition(emb @ q, -args.k)[-args.k:].tolist()) for q in queries]
+
+    report = {"rows": args.rows, "dim": args.dim, "k": args.k, "rescore_k": args.rescore_k, "modes": []}
+    with tempfile.TemporaryDirectory() as d:
+        for storage in ("float32", "float16", "int8"):
+            path = Path(d) / f"emb_{storage}.npy"
+            save_embeddings(emb, path, storage=storage)
+            m = EmbeddingMatrix(path, storage=storage, rescore_k=args.rescore_k)
+
+            lat, recall = [], []
+            for q, t in zip(queries, truth):
+                t0 = time.perf_counter()
+                s = m.scores(q)
+                top = np.argpartition(s, -args.k)[-args.k:]
+                lat.append((time.perf_counter() - t0) * 1000)
+                recall.append(len(t.intersection(top.tolist())) / args.k)
+
+            scan = m.approx if m.approx is not None else m.exact
+            report["modes"].append({
+                "storage": storage,
+                f"recall@{args.k}": round(float(np.mean(recall)), 4),
+                "p50_ms": round(float(np.percentile(lat, 50)), 2),
+                "p95_ms": round(float(np.percentile(lat, 95)), 2),
+                "scan_matrix_mb": round(scan.nbytes / (1024 * 1024), 1),
+            })
+            del m
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
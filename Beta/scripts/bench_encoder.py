@@ -0,0 +1,100 @@
+"""
+编码器后端基准：torch（SentenceTransformer） vs onnx vs onnx-int8（onnxruntime）。
+文本取自当前 chunk store（没有索引时用内置查询），报告：
+- 加载耗时、单查询延迟 p50/p95（batch=1，即在线查询路径）
+- 建索引吞吐（texts/s，batch=32）
+- 与 torch 向量的余弦一致性（mean / min）以及 top-10 检索结果重合率
+
+先导出 ONNX：python -m src.a_memory.encoder --export
+    PYTHONPATH=.:scripts python scripts/bench_encoder.py --backends torch,onnx,onnx-int8 --threads 4
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from src.a_memory.encoder import TorchEncoder, OnnxEncoder
+from src.a_memory.filters import top_k
+from src.a_memory.ingest_chat import peak_rss_mb
+from src.a_memory.segments import SegmentSet
+from src.a_memory.snapshot import resolve_paths
+
+from bench_search_batch import SEED_QUERIES
+
+
+def load_texts(n: int) -> list[str]:
+    paths = resolve_paths()
+    if not paths.complete():
+        return [f"{SEED_QUERIES[i % len(SEED_QUERIES)]} {i}" for i in range(n)]
+    segments = SegmentSet.open(paths)
+    texts = []
+    for seg in segments:
+        texts += [seg.chunks.text(int(i)) for i in seg.live_rows()[:n - len(texts)]]
+    segments.close()
+    return texts
+
+
+def make_encoder(backend: str, threads: int):
+    if backend == "torch":
+        return TorchEncoder(threads=threads)
+    return OnnxEncoder(quantized=backend == "onnx-int8", threads=threads)
+
+
+def bench(backend: str, threads: int, texts: list[str], queries: list[str]):
+    out = {"backend": backend}
+    t0 = time.perf_counter()
+    enc = make_encoder(backend, threads)
+    out["load_s"] = round(time.perf_counter() - t0, 2)
+
+    enc.encode(queries[:1])  # 预热
+    lat = []
+    for q in queries:
+        t0 = time.perf_counter()
+        enc.encode([q])
+        lat.append((time.perf_counter() - t0) * 1000)
+    out["query_p50_ms"] = round(float(np.percentile(lat, 50)), 2)
+    out["query_p95_ms"] = round(float(np.percentile(lat, 95)), 2)
+
+    t0 = time.perf_counter()
+    X = enc.encode(texts, batch_size=32)
+    out["build_texts_per_s"] = round(len(texts) / (time.perf_counter() - t0), 1)
+    Q = enc.encode(queries)
+    return out, X, Q
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backends", default="torch,onnx,onnx-int8")
+    ap.add_argument("--texts", type=int, default=2000)
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--threads", type=int, default=0)
+    args = ap.parse_args()
+
+    texts = load_texts(args.texts)
+    queries = [f"{SEED_QUERIES[i % len(SEED_QUERIES)]} {i // len(SEED_QUERIES)}" for i in range(args.queries)]
+    report = {"texts": len(texts), "queries": len(queries), "threads": args.threads, "backends": []}
+
+    ref = None
+    for backend in args.backends.split(","):
+        row, X, Q = bench(backend, args.threads, texts, queries)
+        if backend == "torch":
+            ref = (X, Q)
+        elif ref is not None:
+            cos = np.sum(X * ref[0], axis=1)  # 两边都已 L2 归一化
+            row["cosine_mean"] = round(float(cos.mean()), 5)
+            row["cosine_min"] = round(float(cos.min()), 5)
+            k = min(10, len(texts))
+            overlap = [
+                len(set(top_k(X @ q, k)) & set(top_k(ref[0] @ rq, k))) / k
+                for q, rq in zip(Q, ref[1])
+            ]
+            row["top10_overlap"] = round(float(np.mean(overlap)), 4)
+        report["backends"].append(row)
+
+    report["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
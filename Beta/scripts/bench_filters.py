@@ -0,0 +1,106 @@
+"""
+过滤检索基准：旧做法（全量打分 + 全量 argsort + 逐条过滤）vs 先过滤再打分（ChunkFilter + 部分选择）。
+按过滤的选择度（单会话 / 不同宽度的时间窗 / 不过滤）报告向量打分阶段的延迟，
+以及旧做法在 top50 里过滤后还剩几条结果（过滤越窄越容易为 0）。
+
+    python scripts/bench_filters.py --rows 500000 --convs 5000 --queries 100
+"""
+import argparse
+import json
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from src.a_memory.chunking import Chunk
+from src.a_memory.chunk_store import ChunkStore, write_chunk_store
+from src.a_memory.filters import ChunkFilter, top_k
+from src.a_memory.vectors import EmbeddingMatrix, save_embeddings
+from bench_embeddings import synthetic_embeddings
+
+BASE = datetime(2024, 1, 1)
+SPAN_MINUTES = 365 * 24 * 60
+
+
+def synthetic_store(root: Path, rows: int, convs: int, seed: int = 0) -> ChunkStore:
+    rng = np.random.default_rng(seed)
+    starts = np.sort(rng.integers(0, SPAN_MINUTES, rows))
+    conv = rng.integers(0, convs, rows)
+    chunks = []
+    for i in range(rows):
+        s = BASE + timedelta(minutes=int(starts[i]))
+        chunks.append(Chunk(
+            chunk_id=f"c{i}", conv_id=f"conv{conv[i]}",
+            time_start=s.isoformat(), time_end=(s + timedelta(minutes=30)).isoformat(),
+            text="", message_ids=[f"m{i}"], senders=[f"u{conv[i] % 50}"],
+        ))
+    write_chunk_store(root, chunks)
+    return ChunkStore(root)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=500_000)
+    ap.add_argument("--convs", type=int, default=5000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=100)
+    args = ap.parse_args()
+
+    emb = synthetic_embeddings(args.rows, args.dim)
+    rng = np.random.default_rng(1)
+    queries = emb[rng.integers(0, args.rows, args.queries)]
+
+    with tempfile.TemporaryDirectory() as d:
+        store = synthetic_store(Path(d) / "store", args.rows, args.convs)
+        save_embeddings(emb, Path(d) / "emb.npy", storage="float32")
+        matrix = EmbeddingMatrix(Path(d) / "emb.npy", storage="float32")
+        t0 = time.perf_counter()
+        filt = ChunkFilter(store)
+        init_s = time.perf_counter() - t0
+
+        def epoch_us(minutes):
+            return int((BASE + timedelta(minutes=minutes) - datetime(1970, 1, 1)).total_seconds() * 1_000_000)
+
+        cases = {"none": {}, "conv": {"conv_code": 0}}
+        for days in (1, 7, 30, 180):
+            cases[f"time_{days}d"] = {"q_start": epoch_us(SPAN_MINUTES // 2), "q_end": epoch_us(SPAN_MINUTES // 2 + days * 1440)}
+
+        report = {"rows": args.rows, "convs": args.convs, "filter_init_s": round(init_s, 3), "cases": []}
+        for name, cond in cases.items():
+            old_lat, new_lat, old_hits, cand_n = [], [], [], 0
+            for q in queries:
+                t0 = time.perf_counter()
+                scores = emb @ q
+                top50 = scores.argsort()[-50:][::-1]
+                kept = [i for i in top50
+                        if ("conv_code" not in cond or store.conv_code[i] == cond["conv_code"])
+                        and ("q_start" not in cond or store.time_end[i] >= cond["q_start"])
+                        and ("q_end" not in cond or store.time_start[i] <= cond["q_end"])]
+                old_lat.append((time.perf_counter() - t0) * 1000)
+                old_hits.append(len(kept))
+
+                t0 = time.perf_counter()
+                cand = filt.candidates(**cond)
+                if cand is None:
+                    top_k(matrix.scores(q), 50)
+                else:
+                    cand[top_k(matrix.scores_rows(cand, q), 50)]
+                    cand_n = len(cand)
+                new_lat.append((time.perf_counter() - t0) * 1000)
+            report["cases"].append({
+                "filter": name,
+                "candidates": cand_n if cond else args.rows,
+                "old_p50_ms": round(float(np.percentile(old_lat, 50)), 3),
+                "new_p50_ms": round(float(np.percentile(new_lat, 50)), 3),
+                "old_avg_hits_after_filter": round(float(np.mean(old_hits)), 2),
+            })
+        store.close()
+        del matrix
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+index_build 读库+切块阶段基准：对比 schema v1（无二级索引）与最新 schema（(conv_id, ts) 索引）。
+
+    python scripts/bench_index_build.py --messages 1000000 --convs 2000
+
+只计时「按会话取消息 + build_chunks」，不含 embedding（与索引无关，且需要模型）。
+"""
+import argparse
+import json
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from src.a_memory.db import connect, migrate, schema_version
+from src.a_memory.chunking import build_chunks
+from src.a_memory.index_build import load_conv_messages
+
+WORDS = ["报价", "合同", "付款节点", "部署", "培训", "演示", "彩排", "脚本", "好的", "收到", "下周", "版本"]
+
+
+def populate(conn: sqlite3.Connection, n_messages: int, n_convs: int, seed: int = 42):
+    """消息按全局时间交错写入（更接近真实导入顺序），会话的行在表里是分散的。"""
+    rnd = random.Random(seed)
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT INTO conversations(conv_id, title, participants, last_active_ts) VALUES(?,?,?,?)",
+        [(f"c{i}", f"会话{i}", "me,clientA", None) for i in range(n_convs)],
+    )
+    base = datetime(2025, 1, 1)
+    batch = []
+    for j in range(n_messages):
+        ts = base + timedelta(seconds=j * 7)
+        batch.append((
+            f"m{j}",
+            f"c{rnd.randrange(n_convs)}",
+            rnd.choice(["me", "clientA", "pm", "dev"]),
+            ts.isoformat(timespec="seconds"),
+            "".join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 12))),
+        ))
+        if len(batch) >= 100_000:
+            cur.executemany("INSERT INTO messages(id, conv_id, sender, ts, text) VALUES(?,?,?,?,?)", batch)
+            batch = []
+    if batch:
+        cur.executemany("INSERT INTO messages(id, conv_id, sender, ts, text) VALUES(?,?,?,?,?)", batch)
+    conn.commit()
+
+
+def time_chunk_stage(conn: sqlite3.Connection, chunking: bool) -> dict:
+    cur = conn.cursor()
+    cur.execute("SELECT conv_id FROM conversations")
+    conv_ids = [r[0] for r in cur.fetchall()]
+
+    t0 = time.perf_counter()
+    n_msgs = n_chunks = 0
+    for cid in conv_ids:
+        msgs = load_conv_messages(cur, cid)
+        n_msgs += len(msgs)
+        if chunking:
+            n_chunks += len(build_chunks(cid, msgs))
+    elapsed = time.perf_counter() - t0
+    return {"seconds": round(elapsed, 3), "messages": n_msgs, "chunks": n_chunks}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--messages", type=int, default=1_000_000)
+    ap.add_argument("--convs", type=int, default=2000)
+    ap.add_argument("--no-chunking", action="store_true", help="只计时 SQL 读取")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        conn = connect(Path(d) / "bench.db")
+        migrate(conn, target=1)
+        populate(conn, args.messages, args.convs)
+
+        report = {"messages": args.messages, "convs": args.convs}
+        report["before"] = {"schema": schema_version(conn), **time_chunk_stage(conn, not args.no_chunking)}
+
+        t0 = time.perf_counter()
+        migrate(conn)
+        report["migrate_seconds"] = round(time.perf_counter() - t0, 3)
+
+        report["after"] = {"schema": schema_version(conn), **time_chunk_stage(conn, not args.no_chunking)}
+        report["speedup"] = round(report["before"]["seconds"] / max(report["after"]["seconds"], 1e-9), 1)
+        conn.close()
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
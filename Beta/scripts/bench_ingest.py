@@ -0,0 +1,58 @@
+"""
+导入吞吐基准：生成合成聊天导出文件，跑一遍流式导入，报告 msg/s 与峰值 RSS。
+
+    python scripts/bench_ingest.py --convs 50000 --msgs-per-conv 40
+"""
+import argparse
+import json
+import random
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from src.a_memory.ingest_chat import ingest
+
+WORDS = ["报价", "合同", "付款节点", "部署", "培训", "演示", "彩排", "脚本", "好的", "收到", "下周", "版本"]
+
+
+def write_synthetic_export(path: Path, n_convs: int, msgs_per_conv: int, seed: int = 42):
+    """逐个会话写出，生成文件本身也不占用与规模成正比的内存。"""
+    rnd = random.Random(seed)
+    base = datetime(2025, 1, 1)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"conversations": [\n')
+        for i in range(n_convs):
+            ts = base + timedelta(minutes=rnd.randint(0, 60 * 24 * 365))
+            msgs = []
+            for j in range(msgs_per_conv):
+                ts += timedelta(seconds=rnd.randint(5, 3600))
+                msgs.append({
+                    "id": f"m{i}_{j}",
+                    "sender": rnd.choice(["me", "clientA", "pm", "dev"]),
+                    "ts": ts.isoformat(timespec="seconds"),
+                    "text": "".join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 12))),
+                })
+            conv = {"conv_id": f"c{i}", "title": f"会话{i} - 测试", "participants": ["me", "clientA"], "messages": msgs}
+            f.write(("" if i == 0 else ",\n") + json.dumps(conv, ensure_ascii=False))
+        f.write("\n]}\n")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--convs", type=int, default=20000)
+    ap.add_argument("--msgs-per-conv", type=int, default=50)
+    ap.add_argument("--batch-messages", type=int, default=50_000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        src = Path(d) / "export.json"
+        write_synthetic_export(src, args.convs, args.msgs_per_conv)
+        size_mb = src.stat().st_size / (1024 * 1024)
+        print(f"synthetic export: {args.convs} convs × {args.msgs_per_conv} msgs, {size_mb:.1f}MB")
+
+        stats = ingest(str(src), batch_messages=args.batch_messages, db_path=Path(d) / "bench.db")
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+检索基准 + 回归：在 data/golden_queries.json 上对比不同检索配置（融合权重 / 候选数 / 向量精度 / ANN 后端），
+每个配置报告：
+- 质量：recall@k（expected 消息被前 k 条结果覆盖的比例）、MRR（第一条含 expected 消息的结果的倒数排名）
+- 延迟：单查询 p50 / p95 / p99（默认每次清空查询缓存，含 encode）
+- 索引加载耗时（不含编码器，编码器只加载一次单独计时）与加载后的 RSS
+结果输出 JSON（--out 落盘），--baseline 与旧结果对比，质量下降超过 --tolerance 时退出码为 1。
+
+    PYTHONPATH=.:scripts python scripts/bench_retrieval.py --out data/bench_retrieval.json
+    PYTHONPATH=.:scripts python scripts/bench_retrieval.py --configs default,wide --baseline data/bench_retrieval.json
+"""
+import argparse
+import contextlib
+import gc
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.a_memory.config import DATA_DIR
+from src.a_memory.encoder import get_encoder
+from src.a_memory.search import MemorySearch
+
+# 每个配置是 MemorySearch 的关键字参数（未给出的取 config 默认值）
+CONFIGS = {
+    "default": {},
+    "vector_only": {"vector_weight": 1.0, "bm25_weight": 0.0},
+    "bm25_only": {"vector_weight": 0.0, "bm25_weight": 1.0},
+    "balanced": {"vector_weight": 0.5, "bm25_weight": 0.5},
+    "wide": {"candidates": 200},
+    "float16": {"embedding_storage": "float16"},
+    "int8": {"embedding_storage": "int8"},
+    "sharded": {"shards": 4},
+    # 需要先用对应 ANN_BACKEND 构建过索引，否则会退回暴力检索
+    "hnsw": {"ann_backend": "hnsw"},
+    "ivf": {"ann_backend": "ivf"},
+}
+DEFAULT_CONFIGS = "default,vector_only,bm25_only,balanced,wide,float16,int8"
+
+
+def rss_mb() -> float | None:
+    """当前 RSS（MB）；优先 psutil，其次 /proc（Linux）。"""
+    try:
+        import psutil  # type: ignore
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        import os
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def load_golden(path: Path) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["queries"]
+
+
+def _filters(q: dict) -> dict:
+    return {k: q[k] for k in ("conv_id", "sender", "start_ts", "end_ts") if q.get(k)}
+
+
+def evaluate(ms: MemorySearch, golden: list[dict], ks: list[int]) -> dict:
+    """每条查询取前 max(ks) 条结果，按消息 id 计算 recall@k 与 MRR。"""
+    max_k = max(ks)
+    recall = {k: [] for k in ks}
+    rr = []
+    per_query = []
+    for q in golden:
+        results = ms.search(q["question"], top_k=max_k, **_filters(q))
+        expected = set(q["expected"])
+        ranks = [set(r.get("message_ids") or []) for r in results]
+        for k in ks:
+            covered = set().union(*ranks[:k]) if ranks[:k] else set()
+            recall[k].append(len(expected & covered) / len(expected))
+        first = next((i for i, ids in enumerate(ranks, 1) if ids & expected), None)
+        rr.append(1.0 / first if first else 0.0)
+        per_query.append({"id": q["id"], "first_hit_rank": first, "chunks": [r["chunk_id"] for r in results]})
+    out = {f"recall@{k}": round(float(np.mean(v)), 4) for k, v in recall.items()}
+    out["mrr"] = round(float(np.mean(rr)), 4)
+    out["per_query"] = per_query
+    return out
+
+
+def latency(ms: MemorySearch, golden: list[dict], repeat: int, warm: bool) -> dict:
+    lat = []
+    for _ in range(repeat):
+        for q in golden:
+            if not warm:
+                ms.query_cache.clear()
+            t0 = time.perf_counter()
+            ms.search(q["question"], **_filters(q))
+            lat.append((time.perf_counter() - t0) * 1000)
+    return {f"p{p}_ms": round(float(np.percentile(lat, p)), 3) for p in (50, 95, 99)}
+
+
+def bench_config(name: str, encoder, golden: list[dict], ks: list[int], repeat: int, warm: bool) -> dict:
+    gc.collect()
+    rss0 = rss_mb()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):  # 回退提示不混进 JSON 输出
+        ms = MemorySearch(encoder=encoder, **CONFIGS[name])
+    load_s = time.perf_counter() - t0
+    rss1 = rss_mb()
+    ms.search(golden[0]["question"])  # 预热
+    row = {
+        "config": name,
+        "params": {
+            "vector_weight": ms.vector_weight,
+            "bm25_weight": ms.bm25_weight,
+            "candidates": ms.candidates,
+            "embedding_storage": ms.embedding_storage,
+            "ann": ms.ann_backend,
+            "shards": len(ms.scorer),
+            "segments": len(ms.segments),
+        },
+        "load_s": round(load_s, 4),
+        "rss_mb": round(rss1, 1) if rss1 is not None else None,
+        "rss_delta_mb": round(rss1 - rss0, 1) if rss0 is not None and rss1 is not None else None,
+    }
+    row.update(evaluate(ms, golden, ks))
+    row.update(latency(ms, golden, repeat, warm))
+    ms.close()
+    del ms
+    return row
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """逐配置对比质量指标；返回退化项说明。"""
+    old = {r["config"]: r for r in baseline.get("configs", [])}
+    regressions = []
+    for row in report["configs"]:
+        prev = old.get(row["config"])
+        if prev is None:
+            continue
+        keys = [k for k in row if k.startswith("recall@")] + ["mrr"]
+        deltas = {}
+        for k in keys:
+            if k in prev:
+                deltas[k] = round(row[k] - prev[k], 4)
+                if deltas[k] < -tolerance:
+                    regressions.append(f"{row['config']}: {k} {prev[k]} -> {row[k]}")
+        for k in ("p50_ms", "p95_ms", "p99_ms", "load_s"):
+            if k in prev:
+                deltas[k] = round(row[k] - prev[k], 4)
+        row["delta_vs_baseline"] = deltas
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--golden", type=Path, default=DATA_DIR / "golden_queries.json")
+    ap.add_argument("--configs", default=DEFAULT_CONFIGS, help=f"逗号分隔，可选：{','.join(CONFIGS)}")
+    ap.add_argument("--k", default="1,3,5")
+    ap.add_argument("--repeat", type=int, default=5, help="延迟测量时整套查询重复的次数")
+    ap.add_argument("--warm", action="store_true", help="测延迟时保留查询缓存（默认每次清空，含 encode）")
+    ap.add_argument("--out", type=Path, help="结果 JSON 写入路径")
+    ap.add_argument("--baseline", type=Path, help="与之前的结果 JSON 对比")
+    ap.add_argument("--tolerance", type=float, default=0.0, help="允许的 recall / MRR 下降幅度")
+    args = ap.parse_args()
+
+    golden = load_golden(args.golden)
+    ks = [int(x) for x in args.k.split(",")]
+    names = args.configs.split(",")
+    unknown = [n for n in names if n not in CONFIGS]
+    if unknown:
+        ap.error(f"unknown configs: {unknown}")
+
+    t0 = time.perf_counter()
+    encoder = get_encoder()
+    report = {
+        "golden": str(args.golden),
+        "queries": len(golden),
+        "encoder": encoder.key,
+        "encoder_load_s": round(time.perf_counter() - t0, 3),
+        "warm_cache": args.warm,
+        "configs": [bench_config(n, encoder, golden, ks, args.repeat, args.warm) for n in names],
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        args.out.write_text(text, encoding="utf-8")
+    print(text)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
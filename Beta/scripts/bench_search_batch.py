@@ -0,0 +1,68 @@
+"""
+批量检索基准（使用当前 data/ 下的真实索引与 embedding 模型）：
+- 逐条 MemorySearch.search  vs  MemorySearch.search_batch（不同批大小）的吞吐
+- N 个并发线程直接调用 search  vs  经过 SearchBatcher 微批 的吞吐与平均批大小
+并校验 search_batch / 微批的结果与逐条 search 完全一致。
+
+    python scripts/bench_search_batch.py --queries 256 --batch 1,8,32 --threads 16
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.a_memory.batcher import SearchBatcher
+from src.a_memory.search import MemorySearch
+
+SEED_QUERIES = [
+    "项目进度怎么样了", "周末一起吃饭吗", "报销流程", "下周的会议时间", "合同什么时候签",
+    "deadline 是哪天", "上次说的那个方案", "机票订好了吗", "预算还剩多少", "客户反馈",
+]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queries", type=int, default=256)
+    ap.add_argument("--batch", default="1,8,32")
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--window-ms", type=float, default=5)
+    args = ap.parse_args()
+
+    ms = MemorySearch()
+    queries = [f"{SEED_QUERIES[i % len(SEED_QUERIES)]} {i // len(SEED_QUERIES)}" for i in range(args.queries)]
+    ms.search(queries[0])  # 预热（模型首次前向较慢）
+
+    report = {"chunks": ms.num_chunks, "queries": args.queries, "batch": [], "concurrent": {}}
+
+    t0 = time.perf_counter()
+    reference = [ms.search(q) for q in queries]
+    seq_s = time.perf_counter() - t0
+    report["sequential_qps"] = round(args.queries / seq_s, 1)
+
+    for bs in (int(x) for x in args.batch.split(",")):
+        t0 = time.perf_counter()
+        out = []
+        for i in range(0, len(queries), bs):
+            out.extend(ms.search_batch(queries[i:i + bs]))
+        dt = time.perf_counter() - t0
+        report["batch"].append({"batch_size": bs, "qps": round(args.queries / dt, 1), "identical": out == reference})
+
+    with ThreadPoolExecutor(args.threads) as pool:
+        t0 = time.perf_counter()
+        list(pool.map(ms.search, queries))
+        report["concurrent"]["direct_qps"] = round(args.queries / (time.perf_counter() - t0), 1)
+
+    batcher = SearchBatcher(ms, window_ms=args.window_ms)
+    with ThreadPoolExecutor(args.threads) as pool:
+        t0 = time.perf_counter()
+        out = list(pool.map(batcher.search, queries))
+        report["concurrent"]["batched_qps"] = round(args.queries / (time.perf_counter() - t0), 1)
+    report["concurrent"]["avg_batch_size"] = round(batcher.avg_batch_size, 2)
+    report["concurrent"]["identical"] = out == reference
+    batcher.close()
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
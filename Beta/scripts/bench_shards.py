@@ -0,0 +1,116 @@
+"""
+分片并行打分基准：合成向量 + 合成语料，按 分片数 × 线程数 网格测 MemorySearch 的两条打分路径：
+- 向量：不分片为 BruteForceIndex.search_batch，分片为 ShardedScorer.vector_top
+- BM25：不分片为 BM25Index.score_sparse + top_k，分片为 ShardedScorer.bm25_top
+报告每种组合的单查询 p50 / p95（ms）、相对不分片的加速比，并校验结果（行号与分数）逐位一致。
+有过滤条件的情形用 --filter-frac 抽一部分行作为候选。
+
+    PYTHONPATH=.:scripts python scripts/bench_shards.py --rows 1000000 --shards 1,2,4,8 --threads 1,2,4,8
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.a_memory.ann import BruteForceIndex
+from src.a_memory.bm25_index import BM25Index
+from src.a_memory.filters import top_k
+from src.a_memory.shards import ScanPart, ShardedScorer
+from src.a_memory.vectors import EmbeddingMatrix, save_embeddings
+
+from bench_bm25 import synthetic_corpus, _doc_freqs
+from bench_embeddings import synthetic_embeddings
+
+
+def _timed(fn, queries):
+    lat, out = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        out.append(fn(q))
+        lat.append((time.perf_counter() - t0) * 1000)
+    return out, lat
+
+
+def _pct(lat):
+    return {"p50_ms": round(float(np.percentile(lat, 50)), 3), "p95_ms": round(float(np.percentile(lat, 95)), 3)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=500_000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--vocab", type=int, default=200_000)
+    ap.add_argument("--avg-len", type=int, default=40)
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("--k", type=int, default=50)
+    ap.add_argument("--storage", default="float32", choices=["float32", "float16", "int8"])
+    ap.add_argument("--shards", default="1,2,4,8")
+    ap.add_argument("--threads", default="1,2,4,8")
+    ap.add_argument("--filter-frac", type=float, default=0.0, help="候选行占比（0 表示不过滤）")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(1)
+    emb = synthetic_embeddings(args.rows, args.dim)
+    Q = emb[rng.integers(0, args.rows, args.queries)] + 0.3 * rng.standard_normal((args.queries, args.dim)).astype("float32")
+    Q /= np.linalg.norm(Q, axis=1, keepdims=True)
+    corpus = synthetic_corpus(args.rows, args.vocab, args.avg_len)
+    bm25 = BM25Index.build([_doc_freqs(d) for d in corpus])
+    token_queries = [corpus[i][:4] for i in rng.integers(0, args.rows, args.queries)]
+    rows = None
+    if args.filter_frac > 0:
+        rows = np.sort(rng.choice(args.rows, int(args.rows * args.filter_frac), replace=False)).astype(np.int64)
+
+    report = {
+        "rows": args.rows, "dim": args.dim, "storage": args.storage, "k": args.k,
+        "candidates": None if rows is None else len(rows), "cpu_count": os.cpu_count(), "grid": [],
+    }
+    with tempfile.TemporaryDirectory() as d:
+        path = Path(d) / "emb.npy"
+        save_embeddings(emb, path, storage=args.storage)
+        m = EmbeddingMatrix(path, storage=args.storage)
+
+        # 不分片基线
+        if rows is None:
+            vec_fn = lambda q: BruteForceIndex(m).search_batch(q[None, :], args.k)[0]
+        else:
+            def vec_fn(q):
+                s = m.scores_rows(rows, q[None, :])[:, 0]
+                sel = top_k(s, args.k)
+                return rows[sel], s[sel]
+
+        def bm_fn(tokens):
+            docs, s = bm25.score_sparse(tokens, rows)
+            sel = top_k(s, args.k)
+            return docs[sel], s[sel]
+
+        base_vec, lat_v = _timed(vec_fn, Q)
+        base_bm, lat_b = _timed(bm_fn, token_queries)
+        base = {"vector": _pct(lat_v), "bm25": _pct(lat_b)}
+        report["unsharded"] = base
+
+        for shards in [int(x) for x in args.shards.split(",")]:
+            for threads in [int(x) for x in args.threads.split(",")]:
+                sc = ShardedScorer([ScanPart(m, bm25, args.rows)], shards=shards, threads=threads)
+                cands = None if rows is None else [rows]
+                got_vec, lat_v = _timed(lambda q: sc.vector_top(q, args.k, cands)[0], Q)
+                got_bm, lat_b = _timed(lambda t: sc.bm25_top(t, args.k, cands)[:2], token_queries)
+                identical = all(
+                    np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1])
+                    for a, b in zip(got_vec + got_bm, base_vec + base_bm)
+                )
+                row = {"shards": len(sc), "threads": threads, "vector": _pct(lat_v), "bm25": _pct(lat_b), "identical": identical}
+                for kind in ("vector", "bm25"):
+                    row[kind]["speedup"] = round(base[kind]["p50_ms"] / max(row[kind]["p50_ms"], 1e-9), 2)
+                report["grid"].append(row)
+                sc.close()
+        del m
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
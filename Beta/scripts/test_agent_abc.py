@@ -5,6 +5,7 @@ from typing import Any, Dict, List, Tuple
 
 from src.b_style.style_profile import StyleProfile
 from src.b_style.adapter.apply import StyleAdapter, LoraAdapterConfig
+from src.b_answer.model_registry import get_registry
 from src.copilot.agent_abc import CopilotAgentABC
 
 
@@ -93,10 +94,16 @@ def main():
 
     agent = CopilotAgentABC(profile=profile, adapter=adapter)
 
+    models = [
+        f"{m['base_model']}: 常驻 {m['resident_bytes'] / 2**20:.0f} MB，"
+        f"使用方 {', '.join(m['users'])}，共享省下 {m['saved_bytes'] / 2**20:.0f} MB"
+        for m in get_registry().memory_report()
+    ]
     print(_box("HetaiAI Beta (ABC) — Demo Console", [
         "A: 记忆检索（向量 + BM25）",
         "B: 证据驱动回答（Answer + Evidence）",
         "C: 可选风格润色（仅对外回复启用）",
+        *models,
         "",
         "输入 q 退出。"
     ], width=88))
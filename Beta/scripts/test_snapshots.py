@@ -0,0 +1,119 @@
+"""
+快照发布 / 清理的回归检查（不需要模型和数据库，全部在临时目录里跑）：
+
+    python scripts/test_snapshots.py
+
+- 同一秒内连续发布超过 keep 个快照，留下的必须是最新的 keep 个，CURRENT 指向最后一个
+- 运行中服务端租约里的快照不被 GC 删掉；租约释放或过期后照常清理
+- 多个进程带 expect 并发发布：每个发布成功的快照的父快照都是紧挨着它之前发布的那个（没有被悄悄覆盖的发布）
+- 同一份快照目录只有一个 SegmentCompactor 是 leader
+"""
+import multiprocessing as mp
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from src.a_memory.segments import SegmentCompactor
+from src.a_memory.snapshot import (
+    SnapshotConflict,
+    SnapshotLease,
+    current_snapshot,
+    gc_snapshots,
+    list_snapshots,
+    new_snapshot,
+    publish,
+)
+
+
+def _publish(base: Path, keep: int, tag: str = "") -> str:
+    snap = new_snapshot(base)
+    (snap.root / "build.txt").write_text(tag, encoding="utf-8")
+    return publish(snap, base, keep=keep).name
+
+
+def test_gc_keeps_newest_within_one_second(keep: int = 3, builds: int = 8):
+    with tempfile.TemporaryDirectory() as d:
+        base = Path(d)
+        published = [_publish(base, keep, str(i)) for i in range(builds)]
+        assert len({name[:15] for name in published}) <= 2, "发布太慢，没有覆盖同一秒内的情况"
+        survivors = list_snapshots(base)
+        assert survivors == published[-keep:], f"GC 留下了 {survivors}，应为 {published[-keep:]}"
+        assert current_snapshot(base) == published[-1]
+        assert [(base / n / "build.txt").read_text(encoding="utf-8") for n in survivors] == [
+            str(i) for i in range(builds - keep, builds)
+        ]
+
+
+def test_gc_skips_leased_snapshots(keep: int = 2):
+    with tempfile.TemporaryDirectory() as d:
+        base = Path(d)
+        pinned = _publish(base, keep)
+        lease = SnapshotLease(base)
+        lease.hold(pinned)
+        others = [_publish(base, keep) for _ in range(keep + 2)]
+        assert list_snapshots(base) == [pinned] + others[-keep:], "租约里的快照被 GC 删掉了"
+
+        # 进程挂掉、租约不再续期：过期后不再保留，过期的租约文件也一并清掉
+        stale = time.time() - 10**6
+        os.utime(lease.path, (stale, stale))
+        gc_snapshots(base, keep)
+        assert list_snapshots(base) == others[-keep:]
+        assert not lease.path.exists()
+
+        # 续期时发现租约已被清掉会重新写回
+        lease.hold(others[-keep])
+        lease.release()
+        assert not lease.path.exists()
+        lease.hold(others[-keep])
+        os.remove(lease.path)
+        lease.renew()
+        assert lease.path.read_text(encoding="utf-8") == others[-keep]
+
+
+def _chained_publisher(base: str, rounds: int):
+    base = Path(base)
+    for _ in range(rounds):
+        parent = current_snapshot(base)
+        snap = new_snapshot(base)
+        (snap.root / "parent.txt").write_text(parent or "", encoding="utf-8")
+        try:
+            publish(snap, base, keep=10**6, expect=parent)
+        except SnapshotConflict:
+            pass
+
+
+def test_concurrent_publish_keeps_chain(procs: int = 4, rounds: int = 25):
+    with tempfile.TemporaryDirectory() as d:
+        base = Path(d)
+        _publish(base, 10**6)
+        workers = [mp.Process(target=_chained_publisher, args=(d, rounds)) for _ in range(procs)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        names = list_snapshots(base)
+        assert current_snapshot(base) == names[-1]
+        for prev, name in zip(names, names[1:]):
+            parent = (base / name / "parent.txt").read_text(encoding="utf-8")
+            assert parent == prev, f"{name} 基于 {parent} 发布，但它之前发布的是 {prev}：有一次发布被覆盖了"
+
+
+def test_single_compactor_leader():
+    with tempfile.TemporaryDirectory() as d:
+        a, b = SegmentCompactor(base=Path(d)), SegmentCompactor(base=Path(d))
+        a.check()
+        b.check()
+        assert a.leader and not b.leader
+        a.close()
+        b.check()
+        assert b.leader
+        b.close()
+
+
+if __name__ == "__main__":
+    test_gc_keeps_newest_within_one_second()
+    test_gc_skips_leased_snapshots()
+    test_concurrent_publish_keeps_chain()
+    test_single_compactor_leader()
+    print("✅ snapshot tests passed")
@@ -10,6 +10,14 @@ import pickle
 
 
 from src.copilot.agent_abc import CopilotAgentABC, CopilotResult
+from src.a_memory.db import close_connections
+from src.a_memory.batcher import SearchBatcher
+from src.a_memory.search import MemorySearch
+from src.a_memory.config import HYDRATE_WINDOW, SEGMENT_COMPACT_INTERVAL_S
+from src.a_memory.hydrator import get_hydrator
+from src.a_memory.segments import SegmentCompactor
+from src.a_memory.snapshot import SnapshotWatcher
+from src.b_answer.model_registry import get_registry
 
 app = FastAPI(title="HetaiAI Beta API")
 
@@ -21,7 +29,41 @@ def root():
     return FileResponse(UI_DIR / "index.html")
 
 # 你的项目里 profile/adapter 可选；为了最稳先 None
-AGENT = CopilotAgentABC(profile=None, adapter=None)
+# B 用抽取式：服务进程里不加载 LLM（省几 GB 内存和几十秒启动）
+AGENT = CopilotAgentABC(profile=None, adapter=None, answer_mode="extractive")
+# 并发 /chat 的检索在几毫秒窗口内合并成一次 search_batch（一次 encode + 一次矩阵乘）
+# 分段文件默认第一次检索时才打开：启动时就全部打开，第一条请求不付这个代价
+AGENT.search = SearchBatcher(AGENT.search.warm())
+
+
+def _load_snapshot(paths) -> MemorySearch:
+    # 复用已加载的编码器与查询缓存：热加载不重新加载模型；新快照的全部分段（mmap + 过滤索引）
+    # 在 watcher 线程里打开好再切换，请求线程不会碰到没打开的文件
+    return MemorySearch(encoder=AGENT.search.model, query_cache=AGENT.search.query_cache, snapshot=paths).warm()
+
+
+def _swap_snapshot(new: MemorySearch):
+    # 排在切换之前的请求由旧索引处理完，之后的走新索引；旧实例随后释放 mmap
+    AGENT.search.swap(new).close()
+
+
+# index_build 发布新快照（原子切换 data/snapshots/CURRENT）后，后台加载并切换，不用重启服务；
+# 在用的快照记在本进程的租约里（data/snapshots/.leases），GC 不会删掉
+WATCHER = SnapshotWatcher(AGENT.search.snapshot_id, _load_snapshot, _swap_snapshot).start()
+
+# 后台合并小的 / 墓碑过多的索引分段，结果作为新快照发布，由上面的 WATCHER 照常切换；
+# 多个 worker 进程各启动一个，只有拿到 leader 锁（data/snapshots/COMPACTOR.lock）的那个真正合并
+COMPACTOR = SegmentCompactor().start() if SEGMENT_COMPACT_INTERVAL_S > 0 else None
+
+
+@app.on_event("shutdown")
+def _close_db_connections():
+    # 先停快照监视与微批线程（处理完已排队的检索），再关闭各线程的只读长连接与写连接，避免 WAL 残留/句柄泄漏
+    if COMPACTOR is not None:
+        COMPACTOR.close()
+    WATCHER.close()
+    AGENT.search.close()
+    close_connections()
 
 # ---------- helpers ----------
 ANSWER_RE = re.compile(r"(?s)^\s*Answer:\s*(.*?)\s*(?:\nEvidence:\s*.*)?$")
@@ -64,6 +106,8 @@ class ChatReq(BaseModel):
     mode: int = 1  # 1=self_qa 2=external_reply
     question: str
     extra: Optional[Dict[str, Any]] = None
+    expand_citations: bool = False  # 返回被引用记忆的原文消息（含前后 context_window 条相邻消息）
+    context_window: int = HYDRATE_WINDOW
 
 class CitedMemory(BaseModel):
     idx: int
@@ -75,10 +119,23 @@ class CitedMemory(BaseModel):
     confidence: str
     snippet: str
 
+class CitedMessage(BaseModel):
+    id: str
+    sender: str
+    ts: str
+    text: str
+    hit: bool  # True = 属于被引用的 chunk；False = 前后相邻的上下文消息
+
+class ExpandedCitation(BaseModel):
+    idx: int
+    conv_id: str
+    messages: List[CitedMessage]
+
 class ChatResp(BaseModel):
     answer: str
     cited_memories: List[CitedMemory]
     timing_ms: Dict[str, float]
+    expanded_citations: Optional[List[ExpandedCitation]] = None  # 仅 expand_citations=True 时返回
 
 
 # ---------- conversations (sample data) ----------
@@ -118,7 +175,8 @@ def _conv_summary(conv: Dict[str, Any]) -> Dict[str, Any]:
 # ---------- routes ----------
 @app.get("/health")
 def health():
-    return {"ok": True}
+    # 已加载的 base model（抽取式模式下为空）：常驻字节数与共享省下的字节数
+    return {"ok": True, "models": get_registry().memory_report()}
 
 
 @app.get("/api/conversations")
@@ -180,6 +238,30 @@ def chat(req: ChatReq):
     if not timing:
         timing = {"total": int((t1 - t0) * 1000)}
 
-    return ChatResp(answer=answer_text, cited_memories=cited_memories, timing_ms=timing)
+    # 5) 可选：被引用记忆的原文消息 + 相邻上下文（一次批量查询 + 每条命中两次 (conv_id, ts) 范围扫描）
+    expanded = None
+    if req.expand_citations and chosen:
+        t2 = time.perf_counter()
+        windows = get_hydrator().expand(chosen, window=max(0, req.context_window))
+        expanded = [
+            ExpandedCitation(
+                idx=int(m.get("idx", 0)),
+                conv_id=str(m.get("conv_id", "")),
+                messages=[
+                    CitedMessage(
+                        id=str(msg["id"]),
+                        sender=str(msg["sender"] or ""),
+                        ts=str(msg["ts"] or ""),
+                        text=str(msg["text"] or ""),
+                        hit=msg["hit"],
+                    )
+                    for msg in msgs
+                ],
+            )
+            for m, msgs in zip(chosen, windows)
+        ]
+        timing = {**timing, "hydrate": round((time.perf_counter() - t2) * 1000, 2)}
+
+    return ChatResp(answer=answer_text, cited_memories=cited_memories, timing_ms=timing, expanded_citations=expanded)
 
 
@@ -0,0 +1,200 @@
+# src/a_memory/ann.py
+import json
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from src.a_memory.config import (
+    ANN_BACKEND,
+    ANN_HNSW_M,
+    ANN_HNSW_EF_CONSTRUCTION,
+    ANN_EF_SEARCH,
+    ANN_IVF_NLIST,
+    ANN_NPROBE,
+    FAISS_INDEX_PATH,
+)
+from src.a_memory.vectors import EmbeddingMatrix
+from src.a_memory.filters import top_k
+
+
+def _meta_path(path: Path) -> Path:
+    return path.with_name(path.name + ".json")
+
+
+class AnnIndex:
+    """
+    向量召回后端接口：search_batch(Q, k) → 每个查询一组 (行号, 分数)，按分数从高到低；
+    search(q, k) 是单条查询的便捷形式。
+    分数都是内积（建库时 normalize_embeddings=True → 内积=余弦）。
+    """
+    backend = "base"
+
+    def search_batch(self, Q: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        raise NotImplementedError
+
+    def search(self, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self.search_batch(np.asarray(q, dtype="float32").reshape(1, -1), k)[0]
+
+    def save(self, path: Path):
+        pass
+
+
+class BruteForceIndex(AnnIndex):
+    """全量点积 + 部分选择（argpartition），不再对全部 N 行排序。"""
+    backend = "brute"
+
+    def __init__(self, matrix: EmbeddingMatrix):
+        self.matrix = matrix
+
+    def search_batch(self, Q, k):
+        S = self.matrix.scores_batch(Q)  # (N, B)，一次矩阵乘
+        out = []
+        for j in range(S.shape[1]):
+            rows = top_k(S[:, j], k)
+            out.append((rows, S[rows, j]))
+        return out
+
+
+class _FaissIndex(AnnIndex):
+    def __init__(self, index):
+        self.index = index
+
+    def search_batch(self, Q, k):
+        Q = np.atleast_2d(np.asarray(Q, dtype="float32"))
+        k = min(k, self.index.ntotal)
+        if k <= 0:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype="float32")) for _ in range(len(Q))]
+        scores, rows = self.index.search(Q, k)
+        ok = rows >= 0  # 候选不足 k 时 faiss 用 -1 补位
+        return [(rows[j][ok[j]], scores[j][ok[j]]) for j in range(len(Q))]
+
+    def save(self, path: Path):
+        import faiss  # type: ignore
+        faiss.write_index(self.index, str(path))
+
+
+class HnswIndex(_FaissIndex):
+    """HNSW 图索引（faiss IndexHNSWFlat；没装 faiss 时用 hnswlib）。ef 越大越准越慢。"""
+    backend = "hnsw"
+
+    def __init__(self, index, ef_search: int = ANN_EF_SEARCH, lib: str = "faiss"):
+        super().__init__(index)
+        self.lib = lib
+        self.set_ef(ef_search)
+
+    def set_ef(self, ef: int):
+        self.ef_search = ef
+        if self.lib == "faiss":
+            self.index.hnsw.efSearch = ef
+        else:
+            self.index.set_ef(ef)
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, m: int = ANN_HNSW_M, ef_construction: int = ANN_HNSW_EF_CONSTRUCTION):
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+        try:
+            import faiss  # type: ignore
+        except ImportError:
+            import hnswlib  # type: ignore
+            index = hnswlib.Index(space="ip", dim=embeddings.shape[1])
+            index.init_index(max_elements=max(1, len(embeddings)), ef_construction=ef_construction, M=m)
+            index.add_items(embeddings, np.arange(len(embeddings)))
+            return cls(index, lib="hnswlib")
+        index = faiss.IndexHNSWFlat(embeddings.shape[1], m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+        index.add(embeddings)
+        return cls(index)
+
+    def search_batch(self, Q, k):
+        if self.lib == "faiss":
+            return super().search_batch(Q, k)
+        Q = np.atleast_2d(np.asarray(Q, dtype="float32"))
+        k = min(k, self.index.get_current_count())
+        if k <= 0:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype="float32")) for _ in range(len(Q))]
+        labels, dist = self.index.knn_query(Q, k=k)
+        # hnswlib 的 ip 距离是 1 - 内积
+        return [(labels[j].astype(np.int64), (1.0 - dist[j]).astype("float32")) for j in range(len(Q))]
+
+    def save(self, path: Path):
+        if self.lib == "faiss":
+            return super().save(path)
+        self.index.save_index(str(path))
+
+
+class IvfIndex(_FaissIndex):
+    """IVF 倒排（faiss IndexIVFFlat）：先选 nprobe 个最近的簇，只在簇内精确打分。"""
+    backend = "ivf"
+
+    def __init__(self, index, nprobe: int = ANN_NPROBE):
+        super().__init__(index)
+        self.set_nprobe(nprobe)
+
+    def set_nprobe(self, nprobe: int):
+        self.nprobe = nprobe
+        self.index.nprobe = nprobe
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, nlist: int = ANN_IVF_NLIST):
+        import faiss  # type: ignore
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+        n, dim = embeddings.shape
+        # nlist=0 表示自动：约 4*sqrt(N)，且不超过样本数（faiss 训练要求）
+        nlist = nlist or int(4 * np.sqrt(max(n, 1)))
+        nlist = max(1, min(nlist, n))
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(embeddings)
+        index.add(embeddings)
+        return cls(index)
+
+
+def build_ann_index(embeddings: np.ndarray, backend: str = ANN_BACKEND, path: Path = FAISS_INDEX_PATH):
+    """index_build 调用：按配置构建并落盘（brute 不需要落盘，只清理旧索引）。"""
+    path = Path(path)
+    if backend == "brute":
+        for p in (path, _meta_path(path)):
+            if p.exists():
+                p.unlink()
+        return None
+    if backend == "hnsw":
+        index = HnswIndex.build(embeddings)
+        meta = {"backend": "hnsw", "lib": index.lib, "dim": int(embeddings.shape[1])}
+    elif backend == "ivf":
+        index = IvfIndex.build(embeddings)
+        meta = {"backend": "ivf", "lib": "faiss", "nlist": int(index.index.nlist)}
+    else:
+        raise ValueError(f"unknown ANN backend: {backend}")
+    index.save(path)
+    meta["count"] = int(embeddings.shape[0])
+    with open(_meta_path(path), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    return index
+
+
+def load_ann_index(matrix: EmbeddingMatrix, backend: str = ANN_BACKEND, path: Path = FAISS_INDEX_PATH) -> AnnIndex:
+    """MemorySearch 调用：按配置加载；索引缺失或与 embeddings 行数不一致时退回暴力检索。"""
+    path = Path(path)
+    if backend == "brute":
+        return BruteForceIndex(matrix)
+
+    meta_path = _meta_path(path)
+    if not (path.exists() and meta_path.exists()):
+        print(f"⚠️ 没有 {path.name}，ANN 后端 {backend} 退回暴力检索（请重新运行 index_build.py）")
+        return BruteForceIndex(matrix)
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("backend") != backend or meta.get("count") != matrix.shape[0]:
+        print(f"⚠️ {path.name} 与当前配置/embeddings 不一致，退回暴力检索（请重新运行 index_build.py）")
+        return BruteForceIndex(matrix)
+
+    if meta.get("lib") == "hnswlib":
+        import hnswlib  # type: ignore
+        index = hnswlib.Index(space="ip", dim=meta["dim"])
+        index.load_index(str(path))
+        return HnswIndex(index, lib="hnswlib")
+
+    import faiss  # type: ignore
+    index = faiss.read_index(str(path))
+    return HnswIndex(index) if backend == "hnsw" else IvfIndex(index)
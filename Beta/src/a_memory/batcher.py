@@ -0,0 +1,139 @@
+# src/a_memory/batcher.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from src.a_memory.config import SEARCH_BATCH_WINDOW_MS, SEARCH_BATCH_MAX
+
+_SWAP = object()
+
+
+class SearchBatcher:
+    """
+    服务端微批：并发到达的检索请求在 window_ms 内攒成一批，交给 MemorySearch.search_batch
+    （一次 encode + 一次矩阵乘）。
+    - search(...) 与 MemorySearch.search 同签名、同结果，可以直接替换 agent.search
+    - top_k / 过滤条件不同的请求分组，各调一次 search_batch
+    - 全部检索都在后台线程里串行执行，MemorySearch 不会被多个线程同时调用
+    - swap(new) 也走同一个队列：之前入队的请求由旧实例处理完，之后的由新实例处理
+    其它属性透传给被包装的 MemorySearch。
+    """
+
+    def __init__(self, searcher, window_ms: float = SEARCH_BATCH_WINDOW_MS, max_batch: int = SEARCH_BATCH_MAX):
+        self.searcher = searcher
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.batches = 0
+        self.queries = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = False
+        # 判断 _closed 与入队要和 close() 放 None 互斥：否则排在 None 之后的请求没人处理，fut.result() 永远等下去
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="search-batcher", daemon=True)
+        self._thread.start()
+
+    def __getattr__(self, name):
+        return getattr(self.searcher, name)
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        conv_id: str | None = None,
+        start_ts: str | None = None,
+        end_ts: str | None = None,
+        sender: str | None = None,
+    ):
+        fut: Future = Future()
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._queue.put((query, (top_k, conv_id, start_ts, end_ts, sender), fut))
+        if closed:
+            return self.searcher.search(
+                query, top_k=top_k, conv_id=conv_id, start_ts=start_ts, end_ts=end_ts, sender=sender
+            )
+        return fut.result()
+
+    def swap(self, searcher):
+        """
+        换成新的 MemorySearch（热加载新索引快照），返回旧实例。
+        返回时后台线程已不会再使用旧实例，调用方可以放心 close 它。
+        """
+        fut: Future = Future()
+        with self._lock:
+            closed = self._closed
+            if closed:
+                old, self.searcher = self.searcher, searcher
+            else:
+                self._queue.put((_SWAP, searcher, fut))
+        return old if closed else fut.result()
+
+    def _swap(self, item):
+        _, searcher, fut = item
+        old, self.searcher = self.searcher, searcher
+        fut.set_result(old)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if item[0] is _SWAP:
+                self._swap(item)
+                continue
+            batch = [item]
+            stop = False
+            swap = None
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    nxt = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                if nxt[0] is _SWAP:
+                    swap = nxt
+                    break
+                batch.append(nxt)
+            self._dispatch(batch)
+            if swap is not None:
+                self._swap(swap)
+            if stop:
+                return
+
+    def _dispatch(self, batch):
+        groups: dict[tuple, list] = {}
+        for query, key, fut in batch:
+            groups.setdefault(key, []).append((query, fut))
+        for (top_k, conv_id, start_ts, end_ts, sender), items in groups.items():
+            try:
+                results = self.searcher.search_batch(
+                    [q for q, _ in items],
+                    top_k=top_k, conv_id=conv_id, start_ts=start_ts, end_ts=end_ts, sender=sender,
+                )
+            except BaseException as e:
+                for _, fut in items:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), res in zip(items, results):
+                fut.set_result(res)
+        self.batches += 1
+        self.queries += len(batch)
+
+    @property
+    def avg_batch_size(self) -> float:
+        return self.queries / self.batches if self.batches else 0.0
+
+    def close(self):
+        """停止后台线程；已入队的请求会先处理完，之后的请求直接走 MemorySearch.search。"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
@@ -0,0 +1,293 @@
+# src/a_memory/bm25_index.py
+import copy
+import json
+import math
+import pickle
+import shutil
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from src.a_memory.chunk_store import StringColumn, replace_dir
+from src.a_memory.config import BM25_INDEX_DIR, BM25_PATH
+
+INDEX_VERSION = 1
+
+_EMPTY_DOCS = np.zeros(0, dtype=np.int64)
+_EMPTY_SCORES = np.zeros(0, dtype=np.float64)
+_ARRAYS = ("post_off", "post_doc", "post_tf", "idf", "doc_len", "doc_norm", "doc_off", "doc_term", "doc_tf")
+
+
+def _idf(df: np.ndarray, n: int, epsilon: float) -> Tuple[np.ndarray, float]:
+    """逐词用 math.log 并按词表顺序顺序累加（与 Okapi._calc_idf 相同的浮点运算顺序）；负值换成 epsilon * average_idf。"""
+    idf = np.empty(len(df), dtype=np.float64)
+    idf_sum = 0
+    negative = []
+    for tid, freq in enumerate(df.tolist()):
+        v = math.log(n - freq + 0.5) - math.log(freq + 0.5)
+        idf[tid] = v
+        idf_sum += v
+        if v < 0:
+            negative.append(tid)
+    average_idf = idf_sum / len(df) if len(df) else 0.0
+    idf[negative] = epsilon * average_idf
+    return idf, average_idf
+
+
+class BM25Index:
+    """
+    倒排 BM25（与 rank_bm25.BM25Okapi 分数逐位一致，k1=1.5, b=0.75, epsilon=0.25）。
+    全部是 numpy 数组，落盘后 mmap 打开，不再 pickle：
+    - terms:               词表（StringColumn），词 id 按首次出现顺序编号（与 Okapi 的 nd 迭代顺序一致 → average_idf 一致）
+    - post_off/doc/tf:     倒排 CSR，term → (doc id 升序, 词频)
+    - idf:                 预计算 idf（负值已替换为 epsilon * average_idf）
+    - doc_len / doc_norm:  文档长度与 k1 * (1 - b + b * dl / avgdl)
+    - doc_off/term/tf:     正排 CSR（文档内按首次出现顺序），增量构建时还原词频表用
+    查询只遍历查询词的倒排链，不再对每个词扫一遍全部文档。
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: dict, terms: List[str] | StringColumn):
+        self.post_off = arrays["post_off"]
+        self.post_doc = arrays["post_doc"]
+        self.post_tf = arrays["post_tf"]
+        self.idf = arrays["idf"]
+        self.doc_len = arrays["doc_len"]
+        self.doc_norm = arrays["doc_norm"]
+        self.doc_off = arrays["doc_off"]
+        self.doc_term = arrays["doc_term"]
+        self.doc_tf = arrays["doc_tf"]
+        self.k1 = meta["k1"]
+        self.b = meta["b"]
+        self.epsilon = meta["epsilon"]
+        self.corpus_size = meta["corpus_size"]
+        self.avgdl = meta["avgdl"]
+        self.average_idf = meta["average_idf"]
+        self._terms = terms
+        names = terms if isinstance(terms, list) else terms.slice(0, len(terms))
+        self.vocab = {t: i for i, t in enumerate(names)}
+
+    # ---- 构建 ----
+    @classmethod
+    def build(cls, doc_freqs: List[Dict[str, int]], k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25) -> "BM25Index":
+        """由每个文档的词频表（dict，插入顺序=词首次出现顺序）构建；等价于 BM25Okapi(tokenized)。"""
+        vocab: Dict[str, int] = {}
+        doc_term: List[int] = []
+        doc_tf: List[int] = []
+        doc_off = np.zeros(len(doc_freqs) + 1, dtype=np.int64)
+        for d, freqs in enumerate(doc_freqs):
+            for w, tf in freqs.items():
+                tid = vocab.get(w)
+                if tid is None:
+                    tid = vocab[w] = len(vocab)
+                doc_term.append(tid)
+                doc_tf.append(tf)
+            doc_off[d + 1] = len(doc_term)
+
+        n = len(doc_freqs)
+        doc_term_a = np.asarray(doc_term, dtype=np.int32)
+        doc_tf_a = np.asarray(doc_tf, dtype=np.int32)
+        entry_doc = np.repeat(np.arange(n, dtype=np.int32), np.diff(doc_off))
+
+        # 倒排：按 term 稳定排序 → 每条倒排链内 doc id 升序
+        order = np.argsort(doc_term_a, kind="stable")
+        df = np.bincount(doc_term_a, minlength=len(vocab))
+        post_off = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=post_off[1:])
+
+        # doc_len / avgdl：与 Okapi 相同，整数累加后再除
+        doc_len = np.bincount(entry_doc, weights=doc_tf_a, minlength=n).astype(np.int64)
+        avgdl = int(doc_len.sum()) / n if n else 0.0
+
+        idf, average_idf = _idf(df, n, epsilon)
+
+        arrays = {
+            "post_off": post_off,
+            "post_doc": entry_doc[order],
+            "post_tf": doc_tf_a[order],
+            "idf": idf,
+            "doc_len": doc_len,
+            "doc_norm": k1 * (1 - b + b * doc_len / avgdl) if n else np.zeros(0, dtype=np.float64),
+            "doc_off": doc_off,
+            "doc_term": doc_term_a,
+            "doc_tf": doc_tf_a,
+        }
+        meta = {
+            "version": INDEX_VERSION, "k1": k1, "b": b, "epsilon": epsilon,
+            "corpus_size": n, "avgdl": avgdl, "average_idf": average_idf,
+        }
+        return cls(arrays, meta, list(vocab))
+
+    @classmethod
+    def from_okapi(cls, bm25) -> "BM25Index":
+        """旧版 bm25.pkl（BM25Okapi）→ BM25Index；doc_freqs 原样复用。"""
+        return cls.build(bm25.doc_freqs, k1=bm25.k1, b=bm25.b, epsilon=bm25.epsilon)
+
+    # ---- 落盘 / 打开 ----
+    def save(self, root: Path = BM25_INDEX_DIR) -> Path:
+        root = Path(root)
+        tmp = root.with_name(root.name + ".tmp")
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir(parents=True)
+        StringColumn.write(tmp, "terms", self.vocab)
+        for name in _ARRAYS:
+            np.save(tmp / f"{name}.npy", getattr(self, name))
+        meta = {
+            "version": INDEX_VERSION, "k1": self.k1, "b": self.b, "epsilon": self.epsilon,
+            "corpus_size": self.corpus_size, "avgdl": self.avgdl, "average_idf": self.average_idf,
+        }
+        with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        return replace_dir(tmp, root)
+
+    @classmethod
+    def open(cls, root: Path = BM25_INDEX_DIR) -> "BM25Index":
+        """mmap 打开；只有旧版 bm25.pkl 时先就地转换一次。"""
+        root = Path(root)
+        if not (root / "meta.json").exists() and BM25_PATH.exists():
+            with open(BM25_PATH, "rb") as f:
+                cls.from_okapi(pickle.load(f)).save(root)
+        with open(root / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION:
+            raise RuntimeError(f"bm25 索引版本不匹配（{meta.get('version')}），请重新运行 index_build.py")
+        arrays = {name: np.load(root / f"{name}.npy", mmap_mode="r") for name in _ARRAYS}
+        return cls(arrays, meta, StringColumn.open(root, "terms"))
+
+    def with_stats(self, idf: np.ndarray, doc_norm: np.ndarray, stats: dict) -> "BM25Index":
+        """
+        同一份倒排链，换成整个语料的统计量（分段索引：每个分段只存自己的倒排，idf / avgdl 按全部分段计算，
+        见 merged_stats）。corpus_size 仍是本分段的文档数；视图与原对象共用 mmap，只 close 其中一个。
+        """
+        view = copy.copy(self)
+        view.idf = idf
+        view.doc_norm = doc_norm
+        view.avgdl = stats["avgdl"]
+        view.average_idf = stats["average_idf"]
+        return view
+
+    # ---- 查询 ----
+    def __len__(self) -> int:
+        return self.corpus_size
+
+    def score_sparse(
+        self,
+        tokens: List[str],
+        rows: Optional[np.ndarray] = None,
+        lo: int = 0,
+        hi: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        只给包含查询词的文档打分，返回 (doc id 升序, 分数)；其余文档的分数都是 0。
+        rows（升序）给定时只保留这些文档（检索前过滤）；lo / hi 只看 [lo, hi) 内的文档（分片打分）。
+        每个文档按查询词顺序累加，浮点结果与 BM25Okapi.get_scores 相同（与是否分片无关）。
+        """
+        hi = self.corpus_size if hi is None else hi
+        partial = lo > 0 or hi < self.corpus_size
+        docs_parts, contrib_parts = [], []
+        for w in tokens:
+            tid = self.vocab.get(w)
+            if tid is None:
+                continue
+            a, b = int(self.post_off[tid]), int(self.post_off[tid + 1])
+            if partial:
+                # 倒排链按 doc 升序：二分截出 [lo, hi) 这一段
+                chain = self.post_doc[a:b]
+                a, b = a + int(np.searchsorted(chain, lo)), a + int(np.searchsorted(chain, hi))
+            docs = self.post_doc[a:b]
+            tf = self.post_tf[a:b]
+            if rows is not None:
+                pos = np.searchsorted(rows, docs)
+                hit = pos < len(rows)
+                hit[hit] = rows[pos[hit]] == docs[hit]
+                docs, tf = docs[hit], tf[hit]
+            tf = tf.astype(np.int64)
+            docs_parts.append(docs)
+            contrib_parts.append(self.idf[tid] * (tf * (self.k1 + 1) / (tf + self.doc_norm[docs])))
+        if not docs_parts:
+            return _EMPTY_DOCS, _EMPTY_SCORES
+        total = sum(len(p) for p in docs_parts)
+        if not total:
+            return _EMPTY_DOCS, _EMPTY_SCORES
+        if total * 8 > hi - lo:
+            # 倒排链很长（高频词）：稠密累加比排序去重便宜；同一条倒排链内 doc 不重复，可直接花式索引相加
+            acc = np.zeros(hi - lo)
+            touched = np.zeros(hi - lo, dtype=bool)
+            for docs, contrib in zip(docs_parts, contrib_parts):
+                acc[docs - lo] += contrib
+                touched[docs - lo] = True
+            rows = np.flatnonzero(touched)
+            return rows + lo, acc[rows]
+        # bincount 按输入顺序累加 → 每个文档的各项按查询词顺序相加
+        uniq, inv = np.unique(np.concatenate(docs_parts), return_inverse=True)
+        scores = np.bincount(inv, weights=np.concatenate(contrib_parts), minlength=len(uniq))
+        return uniq.astype(np.int64), scores
+
+    def get_scores(self, tokens: List[str]) -> np.ndarray:
+        """稠密分数（长度 N），与 BM25Okapi.get_scores 同接口。"""
+        out = np.zeros(self.corpus_size)
+        docs, scores = self.score_sparse(tokens)
+        out[docs] = scores
+        return out
+
+    # ---- 增量构建 ----
+    def iter_doc_freqs(self, rows: Optional[List[int]] = None) -> Iterator[Dict[str, int]]:
+        """还原文档的词频表（插入顺序与构建时相同），供增量构建复用。"""
+        terms = list(self.vocab)
+        doc_off = np.asarray(self.doc_off)
+        for d in (range(self.corpus_size) if rows is None else rows):
+            a, b = int(doc_off[d]), int(doc_off[d + 1])
+            yield {terms[t]: tf for t, tf in zip(self.doc_term[a:b].tolist(), self.doc_tf[a:b].tolist())}
+
+    def close(self):
+        if isinstance(self._terms, StringColumn):
+            self._terms.close()
+
+
+def merged_stats(parts: List[Tuple[BM25Index, Optional[np.ndarray]]]) -> Tuple[dict, List[Tuple[np.ndarray, np.ndarray]]]:
+    """
+    多个分段（各自的 BM25Index + 存活文档掩码，None 表示全部存活）合在一起的语料统计量。
+    词表按存活文档的全局顺序（分段顺序，段内行号）首次出现编号，df / 文档长度只计存活文档，
+    所以与把全部存活文档按这个顺序 BM25Index.build 一次得到的 idf / doc_norm 逐位一致。
+    返回 (统计量, 每个分段的 (本地词 id → idf, 行 → doc_norm))，用于 BM25Index.with_stats。
+    """
+    k1, b, epsilon = (parts[0][0].k1, parts[0][0].b, parts[0][0].epsilon) if parts else (1.5, 0.75, 0.25)
+    vocab: Dict[str, int] = {}
+    maps, live_terms = [], []
+    n = total_len = 0
+    for index, live in parts:
+        live = np.ones(index.corpus_size, dtype=bool) if live is None else np.asarray(live, dtype=bool)
+        terms = list(index.vocab)
+        lt = np.asarray(index.doc_term)[np.repeat(live, np.diff(np.asarray(index.doc_off)))]
+        uniq, first = np.unique(lt, return_index=True)
+        for tid in uniq[np.argsort(first, kind="stable")].tolist():
+            vocab.setdefault(terms[tid], len(vocab))
+        g = np.fromiter((vocab.get(t, -1) for t in terms), dtype=np.int64, count=len(terms))
+        maps.append(g)
+        live_terms.append(g[lt])  # 文档内词不重复：每个 (文档, 词) 计一次 df
+        n += int(live.sum())
+        total_len += int(np.asarray(index.doc_len)[live].sum())
+
+    df = np.bincount(np.concatenate(live_terms), minlength=len(vocab)) if live_terms else np.zeros(0, dtype=np.int64)
+    avgdl = total_len / n if n else 0.0
+    idf, average_idf = _idf(df, n, epsilon)
+
+    per_part = []
+    for (index, _), g in zip(parts, maps):
+        local_idf = np.where(g >= 0, idf[np.maximum(g, 0)], 0.0) if len(idf) else np.zeros(len(g))
+        doc_len = np.asarray(index.doc_len)
+        doc_norm = k1 * (1 - b + b * doc_len / avgdl) if n else np.zeros(len(doc_len), dtype=np.float64)
+        per_part.append((local_idf, doc_norm))
+    stats = {
+        "version": INDEX_VERSION, "k1": k1, "b": b, "epsilon": epsilon,
+        "corpus_size": n, "avgdl": avgdl, "average_idf": average_idf, "vocab": len(vocab),
+    }
+    return stats, per_part
+
+
+if __name__ == "__main__":
+    # 旧索引迁移：python -m src.a_memory.bm25_index  （bm25.pkl → bm25_index/）
+    with open(BM25_PATH, "rb") as f:
+        BM25Index.from_okapi(pickle.load(f)).save(BM25_INDEX_DIR)
+    print("✅ converted:", BM25_PATH, "→", BM25_INDEX_DIR)
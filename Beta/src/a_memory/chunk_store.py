@@ -0,0 +1,275 @@
+# src/a_memory/chunk_store.py
+import json
+import mmap
+import os
+import pickle
+import shutil
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from src.a_memory.chunking import Chunk, _epoch_us
+from src.a_memory.config import CHUNK_STORE_DIR, CHUNKS_PATH
+from src.a_memory.utterances import UTTERANCE_VERSION, Utterances, extract_utterances
+
+STORE_VERSION = 1
+
+
+class StringColumn:
+    """
+    变长字符串列：offsets(int64, n+1, 字节偏移) + UTF-8 blob，两者都 mmap。
+    打开是 O(1)，读第 i 个字符串只碰到它所在的页。
+    """
+
+    def __init__(self, offsets: np.ndarray, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    @classmethod
+    def open(cls, root: Path, name: str) -> "StringColumn":
+        offsets = np.load(root / f"{name}_off.npy", mmap_mode="r")
+        path = root / f"{name}.bin"
+        if path.stat().st_size == 0:
+            return cls(offsets, b"")
+        with open(path, "rb") as f:
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(offsets, blob)
+
+    @staticmethod
+    def write(root: Path, name: str, values: Iterable[str]) -> int:
+        offsets = [0]
+        with open(root / f"{name}.bin", "wb") as f:
+            pos = 0
+            for v in values:
+                b = v.encode("utf-8")
+                f.write(b)
+                pos += len(b)
+                offsets.append(pos)
+        np.save(root / f"{name}_off.npy", np.asarray(offsets, dtype=np.int64))
+        return len(offsets) - 1
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        a, b = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self.blob[a:b].decode("utf-8")
+
+    def slice(self, a: int, b: int) -> List[str]:
+        return [self[i] for i in range(a, b)]
+
+    def close(self):
+        if isinstance(self.blob, mmap.mmap):
+            self.blob.close()
+
+
+def replace_dir(tmp: Path, root: Path) -> Path:
+    """把写好的临时目录整体换成 root（两次 os.replace，读者只会看到旧目录或新目录）。"""
+    if root.exists():
+        old = root.with_name(root.name + ".old")
+        if old.exists():
+            shutil.rmtree(old)
+        os.replace(root, old)
+        os.replace(tmp, root)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        os.replace(tmp, root)
+    return root
+
+
+def _write_utterances(root: Path, chunks: List[Chunk]):
+    """每个 chunk 文本的逐句特征，所有 chunk 的句子首尾相接存成一组列。"""
+    utt_off = np.zeros(len(chunks) + 1, dtype=np.int64)
+    spans, flags, keywords, tok_off, tokens, speakers = [], [], [], [np.zeros(1, dtype=np.int64)], [], []
+    n_tok = 0
+    for i, c in enumerate(chunks):
+        u = extract_utterances(c.text)
+        utt_off[i + 1] = utt_off[i] + len(u)
+        spans.append(u.span)
+        flags.append(u.flags)
+        keywords.append(u.keywords)
+        tok_off.append(u.tok_off[1:] + n_tok)
+        tokens.append(u.tokens)
+        speakers.extend(u.speakers)
+        n_tok += len(u.tokens)
+
+    np.save(root / "utt_off.npy", utt_off)
+    np.save(root / "utt_span.npy", np.concatenate(spans or [np.zeros((0, 3), dtype=np.int32)]))
+    np.save(root / "utt_flags.npy", np.concatenate(flags or [np.zeros(0, dtype=np.uint8)]))
+    np.save(root / "utt_kw.npy", np.concatenate(keywords or [np.zeros(0, dtype=np.uint32)]))
+    np.save(root / "utt_tok_off.npy", np.concatenate(tok_off))
+    np.save(root / "utt_tok.npy", np.concatenate(tokens or [np.zeros(0, dtype=np.int64)]))
+    StringColumn.write(root, "utt_speaker", speakers)
+
+
+def write_chunk_store(root: Path, chunks: List[Chunk]) -> Path:
+    """
+    把 chunks 写成列式目录（先写 <root>.tmp 再整体换上，读者不会看到写了一半的目录）：
+    - text / chunk_id / ts_start / ts_end: StringColumn
+    - time_start / time_end: int64 epoch 微秒（过滤用）
+    - conv_code: int32，字典在 meta.json 的 convs 里
+    - msg_off: int64 (n+1)，每个 chunk 在 msg_ids / senders 两列里的区间
+    - utt_*: 逐句特征（utterances.Utterances），utt_off: int64 (n+1) 为每个 chunk 的句子区间
+    """
+    root = Path(root)
+    tmp = root.with_name(root.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+
+    convs: dict[str, int] = {}
+    conv_code = np.empty(len(chunks), dtype=np.int32)
+    time_start = np.empty(len(chunks), dtype=np.int64)
+    time_end = np.empty(len(chunks), dtype=np.int64)
+    msg_off = np.zeros(len(chunks) + 1, dtype=np.int64)
+    for i, c in enumerate(chunks):
+        conv_code[i] = convs.setdefault(c.conv_id, len(convs))
+        time_start[i] = _epoch_us(c.time_start)
+        time_end[i] = _epoch_us(c.time_end)
+        msg_off[i + 1] = msg_off[i] + len(c.message_ids)
+
+    StringColumn.write(tmp, "text", (c.text for c in chunks))
+    StringColumn.write(tmp, "chunk_id", (c.chunk_id for c in chunks))
+    StringColumn.write(tmp, "ts_start", (c.time_start for c in chunks))
+    StringColumn.write(tmp, "ts_end", (c.time_end for c in chunks))
+    StringColumn.write(tmp, "msg_ids", (m for c in chunks for m in c.message_ids))
+    # senders 可能缺失（Chunk.senders=None）：按消息数补空串，保证与 msg_ids 对齐
+    StringColumn.write(tmp, "senders", (
+        s for c in chunks for s in (c.senders if c.senders else [""] * len(c.message_ids))
+    ))
+    np.save(tmp / "conv_code.npy", conv_code)
+    np.save(tmp / "time_start.npy", time_start)
+    np.save(tmp / "time_end.npy", time_end)
+    np.save(tmp / "msg_off.npy", msg_off)
+    _write_utterances(tmp, chunks)
+    with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {"version": STORE_VERSION, "count": len(chunks), "convs": list(convs), "utterances": UTTERANCE_VERSION},
+            f,
+            ensure_ascii=False,
+        )
+
+    return replace_dir(tmp, root)
+
+
+class ChunkStore:
+    """
+    mmap 的列式 chunk 存储。打开时只读 meta.json + 映射文件，不反序列化任何 chunk；
+    多个进程打开同一目录时共享 page cache。
+    检索时用 conv_code / time_start / time_end 数组做过滤，只有最终 top-k 才去取 text 等字段。
+    """
+
+    def __init__(self, root: Path = CHUNK_STORE_DIR):
+        self.root = Path(root)
+        with open(self.root / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != STORE_VERSION:
+            raise RuntimeError(f"chunk store 版本不匹配（{meta.get('version')}），请重新运行 index_build.py")
+        self.count = int(meta["count"])
+        self.convs: List[str] = meta["convs"]
+        self._conv_index = {cid: i for i, cid in enumerate(self.convs)}
+
+        self.conv_code = np.load(self.root / "conv_code.npy", mmap_mode="r")
+        self.time_start = np.load(self.root / "time_start.npy", mmap_mode="r")
+        self.time_end = np.load(self.root / "time_end.npy", mmap_mode="r")
+        self.msg_off = np.load(self.root / "msg_off.npy", mmap_mode="r")
+
+        self._text = StringColumn.open(self.root, "text")
+        self._chunk_id = StringColumn.open(self.root, "chunk_id")
+        self._ts_start = StringColumn.open(self.root, "ts_start")
+        self._ts_end = StringColumn.open(self.root, "ts_end")
+        self._msg_ids = StringColumn.open(self.root, "msg_ids")
+        self._senders = StringColumn.open(self.root, "senders")
+
+        # 逐句特征：旧目录没有，或规则版本变了，就是 None（回答时现场计算）
+        self._utt = None
+        if meta.get("utterances") == UTTERANCE_VERSION:
+            self._utt = tuple(
+                np.load(self.root / f"{name}.npy", mmap_mode="r")
+                for name in ("utt_off", "utt_span", "utt_flags", "utt_kw", "utt_tok_off", "utt_tok")
+            )
+            self._utt_speaker = StringColumn.open(self.root, "utt_speaker")
+
+    @classmethod
+    def open(cls, root: Path = CHUNK_STORE_DIR) -> "ChunkStore":
+        """打开列式存储；只有旧版 chunks.pkl 时先就地转换一次。"""
+        root = Path(root)
+        if not (root / "meta.json").exists() and CHUNKS_PATH.exists():
+            with open(CHUNKS_PATH, "rb") as f:
+                write_chunk_store(root, pickle.load(f))
+        return cls(root)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def conv_code_of(self, conv_id: str) -> int:
+        """conv_id → 字典编码；不在索引里返回 -1。"""
+        return self._conv_index.get(conv_id, -1)
+
+    def text(self, i: int) -> str:
+        return self._text[i]
+
+    def chunk_id(self, i: int) -> str:
+        return self._chunk_id[i]
+
+    def conv_id(self, i: int) -> str:
+        return self.convs[int(self.conv_code[i])]
+
+    def time_range(self, i: int) -> Tuple[str, str]:
+        return self._ts_start[i], self._ts_end[i]
+
+    def message_ids(self, i: int) -> List[str]:
+        return self._msg_ids.slice(int(self.msg_off[i]), int(self.msg_off[i + 1]))
+
+    def senders(self, i: int) -> List[str]:
+        return self._senders.slice(int(self.msg_off[i]), int(self.msg_off[i + 1]))
+
+    def utterances(self, i: int) -> Optional[Utterances]:
+        """第 i 个 chunk 文本的逐句特征；存储里没有时返回 None。"""
+        if self._utt is None:
+            return None
+        utt_off, span, flags, kw, tok_off, tok = self._utt
+        a, b = int(utt_off[i]), int(utt_off[i + 1])
+        t0, t1 = int(tok_off[a]), int(tok_off[b])
+        return Utterances(
+            np.asarray(span[a:b]),
+            self._utt_speaker.slice(a, b),
+            np.asarray(flags[a:b]),
+            np.asarray(kw[a:b]),
+            np.asarray(tok_off[a : b + 1]) - t0,
+            np.asarray(tok[t0:t1]),
+        )
+
+    def get(self, i: int) -> Chunk:
+        ts_start, ts_end = self.time_range(i)
+        return Chunk(
+            chunk_id=self.chunk_id(i),
+            conv_id=self.conv_id(i),
+            time_start=ts_start,
+            time_end=ts_end,
+            text=self.text(i),
+            message_ids=self.message_ids(i),
+            senders=self.senders(i),
+        )
+
+    def __getitem__(self, i: int) -> Chunk:
+        return self.get(i)
+
+    def __iter__(self) -> Iterator[Chunk]:
+        for i in range(self.count):
+            yield self.get(i)
+
+    def close(self):
+        for col in (self._text, self._chunk_id, self._ts_start, self._ts_end, self._msg_ids, self._senders):
+            col.close()
+        if self._utt is not None:
+            self._utt_speaker.close()
+
+
+if __name__ == "__main__":
+    # 旧索引迁移：python -m src.a_memory.chunk_store  （chunks.pkl → chunk_store/）
+    with open(CHUNKS_PATH, "rb") as f:
+        legacy: Optional[List[Chunk]] = pickle.load(f)
+    write_chunk_store(CHUNK_STORE_DIR, legacy or [])
+    print("✅ converted:", CHUNKS_PATH, "→", CHUNK_STORE_DIR)
@@ -1,10 +1,12 @@
 from dataclasses import dataclass
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Sequence, Tuple
+from datetime import datetime, timedelta, timezone
 from dateutil.parser import isoparse
 import re
 
-from src.a_memory.config import MIN_TEXT_LEN, MAX_CHUNK_CHARS
+import numpy as np
+
+from src.a_memory.config import MIN_TEXT_LEN, MAX_CHUNK_CHARS, CHUNK_ENGINE
 from src.a_memory.preprocess import normalize_text
 
 # “纯寒暄/确认”噪声词：只在信息量极低时丢弃
@@ -17,6 +19,7 @@ INFO_DENSE_RE = (
     r"|(\d{1,2}:\d{2})"                               # 时间
     r"|(#\w+|@\w+)"                                   # 话题/提及
 )
+_INFO_DENSE_PAT = re.compile(INFO_DENSE_RE)
 
 @dataclass
 class Chunk:
@@ -38,12 +41,15 @@ def is_noise(text: str) -> bool:
     - 允许短，但不能“无信息”
     - 如果包含数字/金额/日期等信息，哪怕很短也保留
     """
-    t = normalize_text(text)
+    return _is_noise_normalized(normalize_text(text))
+
+def _is_noise_normalized(t: str) -> bool:
+    """is_noise 的主体：t 已经 normalize_text 过（调用方已清洗时避免重复清洗）。"""
     if not t:
         return True
     if _is_punct_only(t):
         return True
-    if re.search(INFO_DENSE_RE, t):
+    if _INFO_DENSE_PAT.search(t):
         return False
     # 低于阈值且属于寒暄词，丢弃
     if len(t) < MIN_TEXT_LEN and t in NOISE_WORDS:
@@ -172,3 +178,166 @@ def build_chunks(
             merged.append(c)
 
     return merged
+
+
+_EPOCH_NAIVE = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_US = timedelta(microseconds=1)
+
+
+def _epoch_us(ts: str) -> int:
+    """ISO 时间 → epoch 微秒（int，精确到微秒，保证与 isoparse 相减的比较结果一致）。"""
+    try:
+        dt = datetime.fromisoformat(ts)
+    except ValueError:
+        dt = isoparse(ts)
+    return (dt - (_EPOCH_NAIVE if dt.tzinfo is None else _EPOCH_UTC)) // _US
+
+
+@dataclass
+class ConvColumns:
+    """
+    一个会话的列式表示（每条消息一行）：
+    - noise: 噪声标记（True=丢弃）
+    - epoch_us: epoch 微秒，只对非噪声消息有意义
+    - line_len: 拼好的 "sender: text" 行长度
+    """
+    ids: List[str]
+    senders: List[str]
+    ts: List[str]
+    lines: List[str]
+    noise: np.ndarray
+    epoch_us: np.ndarray
+    line_len: np.ndarray
+
+
+def conversation_columns(messages: List[Dict]) -> ConvColumns:
+    """每条消息只 normalize 一次、解析时间一次，产出 build_chunks_columnar 需要的列。"""
+    n = len(messages)
+    ids: List[str] = [""] * n
+    senders: List[str] = [""] * n
+    ts_list: List[str] = [""] * n
+    lines: List[str] = [""] * n
+    noise = np.ones(n, dtype=bool)
+    epoch = np.zeros(n, dtype=np.int64)
+    line_len = np.zeros(n, dtype=np.int64)
+
+    for i, m in enumerate(messages):
+        txt = normalize_text(m.get("text", ""))
+        if _is_noise_normalized(txt):
+            continue
+        ts = m["ts"]
+        line = f'{m["sender"]}: {txt}'
+        ids[i], senders[i], ts_list[i], lines[i] = m["id"], m["sender"], ts, line
+        noise[i] = False
+        epoch[i] = _epoch_us(ts)
+        line_len[i] = len(line)
+
+    return ConvColumns(ids, senders, ts_list, lines, noise, epoch, line_len)
+
+
+def build_chunks_columnar(
+    conv_id: str,
+    cols: ConvColumns,
+    *,
+    max_messages: int = 8,
+    min_messages: int = 2,
+    time_gap_minutes: int = 30,
+) -> List[Chunk]:
+    """
+    build_chunks 的列式实现，输出与 build_chunks 完全一致（顺序、chunk_id、文本、时间、ids）。
+    - 时间间隔切分：相邻保留消息的时间差 > gap 处断开（np.diff）
+    - 消息上限切分：每个时间段内按 max_messages 等分（段内位置取模）
+    - MAX_CHUNK_CHARS：组总长不超限的直接成块（np.add.reduceat），只有超长组逐行拆
+    - 碎块合并：每个 >= min_messages 的块（以及第一个块）是“头”，后面的碎块都并进它；
+      合并后的 chunk_id 保持头块自己的首尾 id（与 build_chunks 的就地合并一致）
+    """
+    kept = np.flatnonzero(~cols.noise)
+    n = len(kept)
+    if n == 0:
+        return []
+
+    ep = cols.epoch_us[kept]
+    gap_us = time_gap_minutes * 60 * 1_000_000
+
+    gap_break = np.empty(n, dtype=bool)
+    gap_break[0] = True
+    gap_break[1:] = np.diff(ep) > gap_us
+    seg_starts = np.flatnonzero(gap_break)
+    pos = np.arange(n) - seg_starts[np.cumsum(gap_break) - 1]
+    group_starts = np.flatnonzero(pos % max_messages == 0)
+    group_ends = np.append(group_starts[1:], n)
+
+    ll = cols.line_len[kept]
+    group_total = np.add.reduceat(ll, group_starts) + (group_ends - group_starts - 1)
+
+    chunk_starts = [group_starts]
+    for g in np.flatnonzero(group_total > MAX_CHUNK_CHARS):
+        cur_len = 0
+        for j in range(group_starts[g], group_ends[g]):
+            added = int(ll[j]) + (1 if cur_len else 0)
+            if cur_len and cur_len + added > MAX_CHUNK_CHARS:
+                chunk_starts.append(np.array([j]))
+                # 与 build_chunks 一致：拆分后新块的长度沿用拆分前算好的 added（含换行的 +1）
+                cur_len = added
+            else:
+                cur_len += added
+    starts = np.unique(np.concatenate(chunk_starts))
+    ends = np.append(starts[1:], n)
+
+    head = (ends - starts) >= min_messages
+    head[0] = True
+    head_idx = np.flatnonzero(head)
+    out_start = starts[head_idx]
+    out_head_end = ends[head_idx] - 1
+    out_end = np.append(starts[head_idx[1:]], n) - 1
+
+    ids, senders, ts, lines = cols.ids, cols.senders, cols.ts, cols.lines
+    chunks: List[Chunk] = []
+    for a, h, b in zip(out_start.tolist(), out_head_end.tolist(), out_end.tolist()):
+        rows = kept[a:b + 1].tolist()
+        chunks.append(Chunk(
+            chunk_id=f"{conv_id}_{ids[rows[0]]}_{ids[kept[h]]}",
+            conv_id=conv_id,
+            time_start=ts[rows[0]],
+            time_end=ts[rows[-1]],
+            text="\n".join(lines[r] for r in rows),
+            message_ids=[ids[r] for r in rows],
+            senders=[senders[r] for r in rows],
+        ))
+    return chunks
+
+
+# 消息太少时 NumPy 的固定开销反而更贵，直接走逐条实现（两者结果相同）
+_COLUMNAR_MIN_MESSAGES = 16
+
+
+def chunk_conversation(conv_id: str, messages: List[Dict], engine: str = CHUNK_ENGINE) -> List[Chunk]:
+    """按配置选择切分引擎：columnar（默认，列式 + NumPy）或 python（build_chunks 原实现）。"""
+    if engine == "columnar" and len(messages) >= _COLUMNAR_MIN_MESSAGES:
+        return build_chunks_columnar(conv_id, conversation_columns(messages))
+    return build_chunks(conv_id, messages)
+
+
+def resync_point(spans: Sequence[Tuple[str, str]], time_gap_minutes: int = 30) -> int:
+    """
+    一个会话已有 chunk 的 (time_start, time_end)（按顺序）→ 增量构建可以从哪个 chunk 起重切：
+    最后一个与前一块间隔 > time_gap 的 chunk（build_chunks 在这里清空缓冲，之前的 chunk 不受后续消息影响），没有就是 0。
+    不能直接从尾块起切：尾块可能是 MAX_CHUNK_CHARS 拆出来的后半段，或并了碎块，切分状态没有在它的起点重置。
+    """
+    gap = timedelta(minutes=time_gap_minutes)
+    for k in range(len(spans) - 1, 0, -1):
+        if isoparse(spans[k][0]) - isoparse(spans[k - 1][1]) > gap:
+            return k
+    return 0
+
+
+def build_chunks_batch(batch: List[Tuple[str, List[Dict]]]) -> List[Chunk]:
+    """
+    进程池 worker：对一批 (conv_id, messages) 依次切分，按输入顺序拼接。
+    放在 chunking 里（而不是 index_build）是为了让子进程只 import 切分需要的轻量依赖。
+    """
+    out: List[Chunk] = []
+    for conv_id, messages in batch:
+        out.extend(chunk_conversation(conv_id, messages))
+    return out
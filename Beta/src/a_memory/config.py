@@ -9,13 +9,60 @@ DATA_DIR = BASE_DIR / "data"
 # ---- storage ----
 DB_PATH = DATA_DIR / "memory.db"
 FAISS_INDEX_PATH = DATA_DIR / "faiss.index"
-BM25_PATH = DATA_DIR / "bm25.pkl"
-CHUNKS_PATH = DATA_DIR / "chunks.pkl"
+BM25_PATH = DATA_DIR / "bm25.pkl"                # 旧版 pickle 格式（BM25Okapi），仅用于迁移
+BM25_INDEX_DIR = DATA_DIR / "bm25_index"         # 倒排 CSR BM25（mmap）
+CHUNKS_PATH = DATA_DIR / "chunks.pkl"            # 旧版 pickle 格式，仅用于迁移
+CHUNK_STORE_DIR = DATA_DIR / "chunk_store"       # 列式 mmap chunk 存储
 EMBEDDINGS_PATH = DATA_DIR / "embeddings.npy"
+EMBED_CACHE_PATH = DATA_DIR / "embed_cache.db"     # chunk 文本 → 向量 的内容寻址缓存
+EMBED_CACHE_MAX_ROWS = 2_000_000                   # 约 2M × 384 × 4B ≈ 3GB 上限，超出按 LRU 淘汰
+SNAPSHOTS_DIR = DATA_DIR / "snapshots"             # 版本化索引快照；CURRENT 文件指向当前快照（上面几个平铺路径为旧布局）
+SNAPSHOT_KEEP = 3                                  # 保留最近几个快照（便于回滚）
+SNAPSHOT_POLL_S = 2.0                              # 服务端检查 CURRENT 是否变化的间隔（秒）
+SNAPSHOT_LEASE_TTL_S = 600                         # 服务端快照租约多久没续期算过期（进程已退出），过期后 GC 不再为它保留快照
+SEGMENT_MIN_ROWS = 10_000                          # 已封存分段存活行数低于此值时，compactor 把它与相邻小分段合并
+SEGMENT_MAX_ROWS = 2_000_000                       # 合并后单个分段的行数上限
+SEGMENT_MAX_DELETED = 0.2                          # 分段里被替换掉（墓碑）的行占比超过此值时由 compactor 重写
+SEGMENT_COMPACT_INTERVAL_S = 600                   # 服务端后台 compactor 的检查间隔（秒）；0 = 服务端不合并
+
+# ---- embedding storage ----
+EMBEDDING_STORAGE = "float32"   # float32 | float16 | int8：粗排用的矩阵精度（float32 原矩阵始终保留用于精排）
+EMBEDDING_RESCORE_K = 200       # 量化粗排后用 float32 精排的候选数
+
+# ---- ANN index ----
+ANN_BACKEND = "brute"           # brute | hnsw | ivf；hnsw/ivf 需要 faiss（hnsw 也可用 hnswlib），持久化到 FAISS_INDEX_PATH
+ANN_HNSW_M = 32                 # HNSW 每个节点的邻居数
+ANN_HNSW_EF_CONSTRUCTION = 200  # HNSW 建图时的候选队列长度
+ANN_EF_SEARCH = 64              # HNSW 查询时的候选队列长度：越大召回越高、越慢
+ANN_IVF_NLIST = 0               # IVF 簇数；0 = 自动（约 4*sqrt(N)）
+ANN_NPROBE = 16                 # IVF 查询时探测的簇数：越大召回越高、越慢
+
+# ---- retrieval / fusion ----
+FUSION_VECTOR_WEIGHT = 0.6      # 融合分 = w_vec * 余弦 + w_bm25 * (bm25 / 候选集内最大 bm25)
+FUSION_BM25_WEIGHT = 0.4
+RETRIEVAL_CANDIDATES = 50       # 向量 / BM25 各自取前多少条进入融合（scripts/bench_retrieval.py 评估）
+SEARCH_SHARDS = 1               # 打分分片数：>1 时索引行切成连续分片在线程池里并行打分（结果与 1 相同），见 scripts/bench_shards.py
+SEARCH_THREADS = 0              # 分片打分线程数；0 = 每个分片一个线程
 
 # ---- models ----
 EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+ENCODER_BACKEND = "torch"   # torch | onnx | onnx-int8（onnx 需先 python -m src.a_memory.encoder --export）
+ENCODER_THREADS = 0         # 编码器 CPU 线程数（onnxruntime intra-op / torch.set_num_threads）；0 = 库默认
+ONNX_MODEL_DIR = BASE_DIR / "models" / "paraphrase-multilingual-MiniLM-L12-v2-onnx"
 
 # ---- chunking ----
 MIN_TEXT_LEN = 4        # ⭐ 建议降低，避免短关键事实丢失
-MAX_CHUNK_CHARS = 1000  # ⭐ 稍微放宽，减少过度切分
\ No newline at end of file
+MAX_CHUNK_CHARS = 1000  # ⭐ 稍微放宽，减少过度切分
+CHUNK_ENGINE = "columnar"  # columnar: 列式 + NumPy 边界计算；python: 逐条的 build_chunks（结果相同）
+
+# ---- index build ----
+BUILD_WORKERS = 1       # 切分阶段的进程数；>1 时按会话批次并行，结果与串行一致
+
+# ---- serving ----
+SEARCH_BATCH_WINDOW_MS = 5   # 服务端微批：第一个请求到达后最多再等多久凑批（0 = 不等，只合并已排队的请求）
+SEARCH_BATCH_MAX = 32        # 单批最多合并的查询数
+QUERY_CACHE_SIZE = 4096      # 查询向量 / 分词 / 意图解析 各自的 LRU 上限（条）
+QUERY_CACHE_TTL_S = 3600     # 缓存条目存活秒数（None = 不过期，只按 LRU 淘汰）
+CONV_CATALOG_POLL_S = 1.0    # 会话元信息目录最多每隔多久查一次 ingest 计数器（秒）；0 = 每次访问都查
+HYDRATE_CACHE_SIZE = 20_000  # 引用展开时原文消息的 LRU 上限（条）；ingest 计数器变化时整体清空
+HYDRATE_WINDOW = 2           # 展开引用时每条命中 chunk 前后各带几条相邻消息
@@ -0,0 +1,116 @@
+# src/a_memory/conv_catalog.py
+"""
+进程级会话元信息目录：conv_id -> (title, participants, last_active_ts)，启动时整表读一次，之后全在内存里查。
+
+失效：ingest 写会话时在同一事务里把 generations 表的 "conversations" 计数器 +1。
+目录最多每 CONV_CATALOG_POLL_S 秒读一次计数器（一次主键查询）；变了才去 DB 增量取：
+INSERT OR REPLACE 过的会话总是拿到更大的 rowid，所以只读 rowid 高水位之后的行。
+"""
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from src.a_memory.config import CONV_CATALOG_POLL_S, DB_PATH
+from src.a_memory.db import read_conn, read_generation
+
+
+class ConvMeta(NamedTuple):
+    conv_id: str
+    title: str
+    participants: str      # 逗号分隔，与 conversations 表一致
+    last_active_ts: str
+
+    @property
+    def participant_list(self) -> List[str]:
+        return [p.strip() for p in self.participants.split(",") if p.strip()]
+
+
+class ConvCatalog:
+    """
+    - get(conv_id) / get_many(conv_ids) / title(conv_id)：O(1) 字典查询
+    - all()：按 rowid 顺序的全部会话（与 SELECT ... FROM conversations 的顺序一致）
+    - generation：内容每变化一次 +1
+    """
+
+    def __init__(self, db_path=None, poll_s: float = CONV_CATALOG_POLL_S):
+        self.db_path = db_path
+        self.poll_s = poll_s
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._by_id: Dict[str, ConvMeta] = {}
+        self._high = 0
+        self._db_generation: Optional[int] = None
+        self._next_check = 0.0
+
+    def __len__(self) -> int:
+        self._maybe_refresh()
+        return len(self._by_id)
+
+    def _maybe_refresh(self):
+        if time.monotonic() >= self._next_check:
+            self.refresh()
+
+    def refresh(self, force: bool = False) -> bool:
+        """DB 计数器变了（或 force）就增量重载；有变化返回 True。"""
+        with self._lock:
+            conn = read_conn(self.db_path)
+            self._next_check = time.monotonic() + self.poll_s
+            db_gen = read_generation(conn, "conversations")
+            if db_gen == self._db_generation and not force:
+                return False
+            top = conn.execute("SELECT max(rowid) FROM conversations").fetchone()[0] or 0
+            rebuild = top < self._high  # 表被重建过：整体重来
+            high = 0 if rebuild else self._high
+            rows = conn.execute(
+                "SELECT rowid, conv_id, title, participants, last_active_ts FROM conversations "
+                "WHERE rowid > ? ORDER BY rowid",
+                (high,),
+            ).fetchall()
+            if rows or rebuild:
+                # 写时复制：读者拿到的字典要么是旧的要么是新的，不会看到更新到一半的状态
+                by_id = {} if rebuild else dict(self._by_id)
+                for rowid, cid, title, participants, last_ts in rows:
+                    # 先删再插：被替换的会话移到末尾，保持 rowid 顺序
+                    by_id.pop(cid, None)
+                    by_id[cid] = ConvMeta(cid, title or "", participants or "", last_ts or "")
+                    high = max(high, rowid)
+                self._by_id, self._high = by_id, high
+            changed = self._db_generation is None or bool(rows) or rebuild
+            self._db_generation = db_gen
+            if changed:
+                self.generation += 1
+            return changed
+
+    def get(self, conv_id: str) -> Optional[ConvMeta]:
+        self._maybe_refresh()
+        return self._by_id.get(conv_id)
+
+    def get_many(self, conv_ids: Iterable[str]) -> List[Optional[ConvMeta]]:
+        """一批 conv_id（例如一次回答的全部证据）只检查一次计数器。"""
+        self._maybe_refresh()
+        by_id = self._by_id
+        return [by_id.get(cid) for cid in conv_ids]
+
+    def title(self, conv_id: str) -> str:
+        """会话标题；未知会话或标题为空时返回 conv_id。"""
+        meta = self.get(conv_id)
+        return meta.title if meta and meta.title else conv_id
+
+    def all(self) -> List[ConvMeta]:
+        self._maybe_refresh()
+        return list(self._by_id.values())
+
+
+_CATALOGS: Dict[Path, ConvCatalog] = {}
+_CATALOGS_LOCK = threading.Lock()
+
+
+def get_catalog(db_path=None) -> ConvCatalog:
+    """按数据库路径取进程级单例（与 db.get_manager 相同的约定）。"""
+    key = Path(db_path or DB_PATH).resolve()
+    with _CATALOGS_LOCK:
+        catalog = _CATALOGS.get(key)
+        if catalog is None:
+            catalog = _CATALOGS[key] = ConvCatalog(key)
+        return catalog
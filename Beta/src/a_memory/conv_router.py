@@ -0,0 +1,212 @@
+# src/a_memory/conv_router.py
+"""
+会话路由（query.detect_conv_id 的实现）：
+所有会话的 title 主关键词 / title 片段 / participant 编进同一个 Aho-Corasick 自动机，
+查询时对问题文本扫一遍拿到全部命中，再按原来的优先级挑：
+    1) title 主关键词（" - " 前面的部分）
+    2) title 片段（中文 2~6 字、英文数字 2~20 字符的词块）
+    3) participant（必须等于问题分词后的某个 token）
+同一层里按会话顺序取第一个（DB 的 rowid 顺序，即 load_conversations 的返回顺序），
+片段层同一会话内再按片段在标题里的顺序——与逐会话循环的结果一致。
+
+增量刷新：ingest 用 INSERT OR REPLACE 写会话表，新增 / 改过的会话总会拿到更大的 rowid，
+refresh() 只读 rowid 高水位之后的行：改过的会话先撤掉旧模式再加新模式，
+trie 只增不减，有新节点时才重算一遍失配链接（O(节点数)，不碰 DB、不重新切标题）。
+"""
+import re
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.a_memory.db import read_conn
+
+_ZH_FRAGMENT = re.compile(r"[\u4e00-\u9fff]{2,6}")
+_EN_FRAGMENT = re.compile(r"[A-Za-z0-9_]{2,20}")
+_QUERY_TOKEN = re.compile(r"[A-Za-z0-9_]+|[\u4e00-\u9fff]{1,6}")
+
+MAIN_KEY, FRAGMENT, PARTICIPANT = 0, 1, 2
+REASONS = ("title主关键词命中: {}", "title片段命中: {}", "participant命中: {}")
+UNMATCHED = "未识别"
+
+
+def split_participants(participants: Optional[str]) -> List[str]:
+    return [p.strip() for p in (participants or "").split(",") if p.strip()]
+
+
+def conv_patterns(title: str, participants: Iterable[str]) -> List[Tuple[int, str, int]]:
+    """一个会话的全部 (层, 模式串, 层内顺序)。"""
+    out = []
+    main_key = title.split(" - ")[0].strip()
+    if main_key:
+        out.append((MAIN_KEY, main_key, 0))
+    title = title.strip()
+    fragments = _ZH_FRAGMENT.findall(title) + _EN_FRAGMENT.findall(title)
+    out += [(FRAGMENT, tok, i) for i, tok in enumerate(fragments)]
+    out += [(PARTICIPANT, p, i) for i, p in enumerate(participants) if p]
+    return out
+
+
+class ConvRouter:
+    """
+    多模式匹配的会话识别器。
+    - ConvRouter.from_db()：从 conversations 表加载；之后每次查询前 refresh() 一次（无变化时只查一次 max(rowid)）
+    - ConvRouter.from_convs(convs)：给定会话列表（load_conversations 的格式），顺序即优先级
+    - route(query) -> (conv_id | None, 原因)
+    - generation：每次内容变化 +1，可用于缓存键
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # trie：goto[节点] = {字符: 子节点}；term[节点] = 在此结束的模式串
+        self._goto: List[Dict[str, int]] = [{}]
+        self._term: List[Optional[str]] = [None]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[str, ...]] = [()]
+        self._relink = False
+        # 模式串 -> 层 -> {conv_id: 排序键}；best 为每层排序键最小的 (排序键, conv_id)
+        self._routes: Dict[str, Dict[int, Dict[str, tuple]]] = {}
+        self._best: Dict[str, Dict[int, Tuple[tuple, str]]] = {}
+        self._dirty: set = set()
+        self._conv_patterns: Dict[str, List[Tuple[int, str]]] = {}
+        self._high = 0
+
+    @classmethod
+    def from_convs(cls, convs: List[dict]) -> "ConvRouter":
+        router = cls()
+        for rank, c in enumerate(convs):
+            router._add(c["conv_id"], c["title"], c["participants"], rank)
+        router.generation = 1
+        return router
+
+    @classmethod
+    def from_db(cls, db_path=None) -> "ConvRouter":
+        router = cls(db_path)
+        router.refresh()
+        return router
+
+    def __len__(self) -> int:
+        return len(self._conv_patterns)
+
+    # ---------- 维护 ----------
+    def _insert(self, pattern: str):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._term.append(None)
+                self._fail.append(0)
+                self._out.append(())
+                self._relink = True
+            node = nxt
+        if self._term[node] is None:
+            self._term[node] = pattern
+            self._relink = True
+
+    def _remove(self, conv_id: str):
+        for tier, pattern in self._conv_patterns.pop(conv_id, ()):
+            self._routes[pattern][tier].pop(conv_id, None)
+            self._dirty.add(pattern)
+
+    def _add(self, conv_id: str, title: str, participants: Iterable[str], rank):
+        self._remove(conv_id)
+        keys = []
+        for tier, pattern, order in conv_patterns(title or "", participants):
+            ranks = self._routes.setdefault(pattern, {}).setdefault(tier, {})
+            key = (rank, order)
+            if conv_id not in ranks or key < ranks[conv_id]:
+                ranks[conv_id] = key
+                keys.append((tier, pattern))
+            self._insert(pattern)
+            self._dirty.add(pattern)
+        self._conv_patterns[conv_id] = keys
+
+    def _compile(self):
+        """重算脏模式的每层最优会话；trie 有新节点时 BFS 重建失配链接与输出表。"""
+        for pattern in self._dirty:
+            self._best[pattern] = {
+                tier: min((key, cid) for cid, key in ranks.items())
+                for tier, ranks in self._routes[pattern].items() if ranks
+            }
+        self._dirty.clear()
+        if not self._relink:
+            return
+        goto, fail, out, term = self._goto, self._fail, self._out, self._term
+        queue = deque()
+        for child in goto[0].values():
+            fail[child] = 0
+            out[child] = (term[child],) if term[child] else ()
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(ch, 0)
+                fail[child] = f
+                out[child] = ((term[child],) + out[f]) if term[child] else out[f]
+                queue.append(child)
+        self._relink = False
+
+    def refresh(self) -> bool:
+        """读入 rowid 高水位之后新增 / 改过的会话；有变化返回 True。"""
+        cur = read_conn(self.db_path).cursor()
+        top = cur.execute("SELECT max(rowid) FROM conversations").fetchone()[0] or 0
+        if top == self._high:
+            return False
+        rows = cur.execute(
+            "SELECT rowid, conv_id, title, participants FROM conversations WHERE rowid > ? ORDER BY rowid",
+            (0 if top < self._high else self._high,),
+        ).fetchall()
+        with self._lock:
+            if top < self._high:  # 表被重建过：整体重来
+                self._reset()
+            for rowid, cid, title, participants in rows:
+                self._add(cid, title, split_participants(participants), rowid)
+            self._high = top
+            self._compile()
+            self.generation += 1
+        return True
+
+    def reload(self):
+        """整表重建（会话被删除时用；正常 ingest 只需 refresh）。"""
+        with self._lock:
+            self._reset()
+        self.refresh()
+
+    # ---------- 查询 ----------
+    def route(self, query: str) -> Tuple[Optional[str], str]:
+        q = query.strip()
+        best: List[Optional[Tuple[tuple, str, str]]] = [None, None, None]
+        spans = None
+        with self._lock:
+            if self._dirty or self._relink:
+                self._compile()
+            goto, fail, out, table = self._goto, self._fail, self._out, self._best
+            node = 0
+            for i, ch in enumerate(q):
+                while node and ch not in goto[node]:
+                    node = fail[node]
+                node = goto[node].get(ch, 0)
+                for pattern in out[node]:
+                    for tier, (key, cid) in table[pattern].items():
+                        if tier == PARTICIPANT:
+                            # participant 要整词相等：命中区间必须正好是问题里的一个 token
+                            if spans is None:
+                                spans = {m.span() for m in _QUERY_TOKEN.finditer(q)}
+                            if (i + 1 - len(pattern), i + 1) not in spans:
+                                continue
+                        if best[tier] is None or key < best[tier][0]:
+                            best[tier] = (key, cid, pattern)
+        for tier, hit in enumerate(best):
+            if hit is not None:
+                return hit[1], REASONS[tier].format(hit[2])
+        return None, UNMATCHED
@@ -1,30 +1,251 @@
 import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
 from src.a_memory.config import DB_PATH
 
-def connect():
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    return sqlite3.connect(DB_PATH)
-
-def init_db():
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS conversations (
-        conv_id TEXT PRIMARY KEY,
-        title TEXT,
-        participants TEXT,
-        last_active_ts TEXT
-    )
-    """)
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS messages (
-        id TEXT PRIMARY KEY,
-        conv_id TEXT,
-        sender TEXT,
-        ts TEXT,
-        text TEXT,
-        FOREIGN KEY(conv_id) REFERENCES conversations(conv_id)
+# 只读连接的 mmap 大小（字节）；读路径直接走 OS page cache，多线程共享
+READ_MMAP_SIZE = 256 * 1024 * 1024
+
+# ---- schema migrations ----
+# 每个版本是一组幂等 DDL；按版本号顺序执行，执行后 PRAGMA user_version 记为该版本。
+# 老库（user_version=0，但表已存在）会从 v1 开始原地升级，CREATE ... IF NOT EXISTS 保证不破坏已有数据。
+MIGRATIONS = [
+    (1, "base tables", [
+        """
+        CREATE TABLE IF NOT EXISTS conversations (
+            conv_id TEXT PRIMARY KEY,
+            title TEXT,
+            participants TEXT,
+            last_active_ts TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS messages (
+            id TEXT PRIMARY KEY,
+            conv_id TEXT,
+            sender TEXT,
+            ts TEXT,
+            text TEXT,
+            FOREIGN KEY(conv_id) REFERENCES conversations(conv_id)
+        )
+        """,
+        # 流式导入的断点：每个源文件记录下一个待导入的会话序号
+        """
+        CREATE TABLE IF NOT EXISTS ingest_checkpoint (
+            source TEXT PRIMARY KEY,
+            file_size INTEGER,
+            file_mtime_ns INTEGER,
+            next_index INTEGER,
+            done INTEGER,
+            updated_at TEXT
+        )
+        """,
+    ]),
+    (2, "query-serving indexes", [
+        # index_build 按会话取消息（WHERE conv_id=? ORDER BY ts）直接走索引，不再全表扫描
+        "CREATE INDEX IF NOT EXISTS idx_messages_conv_ts ON messages(conv_id, ts)",
+        "CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages(sender)",
+    ]),
+    (3, "generation counters", [
+        # 读侧缓存（会话元信息目录等）比较计数器决定是否重新加载；ingest 写会话时在同一事务里 +1
+        """
+        CREATE TABLE IF NOT EXISTS generations (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        """,
+        "INSERT OR IGNORE INTO generations(name, value) VALUES('conversations', 0)",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def connect(db_path=None):
+    path = db_path or DB_PATH
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return sqlite3.connect(path)
+
+
+def schema_version(conn) -> int:
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def migrate(conn, target: int | None = None) -> int:
+    """
+    把数据库升级到 target 版本（默认最新），返回升级后的版本号。
+    每个版本在独立事务里执行，并写一条 schema_migrations 记录。
+    """
+    target = SCHEMA_VERSION if target is None else target
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT,
+        applied_at TEXT
     )
     """)
     conn.commit()
-    conn.close()
\ No newline at end of file
+
+    current = schema_version(conn)
+    for version, name, statements in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+        cur = conn.cursor()
+        for sql in statements:
+            cur.execute(sql)
+        cur.execute(
+            "INSERT OR REPLACE INTO schema_migrations(version, name, applied_at) VALUES(?,?,?)",
+            (version, name, datetime.now().isoformat(timespec="seconds")),
+        )
+        # PRAGMA 不能参数化；version 来自上面的常量表
+        cur.execute(f"PRAGMA user_version = {int(version)}")
+        conn.commit()
+        current = version
+        print(f"🛠️  schema migrated to v{version}: {name}")
+    return current
+
+
+def bump_generation(cur, name: str):
+    """计数器 +1；在调用方的事务里执行，与数据一起提交。"""
+    cur.execute(
+        "INSERT INTO generations(name, value) VALUES(?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+        (name,),
+    )
+
+
+def read_generation(conn, name: str) -> int:
+    """读计数器；老库还没迁移出 generations 表（只读连接不会迁移）时返回 0。"""
+    try:
+        row = conn.execute("SELECT value FROM generations WHERE name=?", (name,)).fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return int(row[0]) if row else 0
+
+
+def init_db(db_path=None):
+    conn = connect(db_path)
+    migrate(conn)
+    conn.close()
+
+
+def _close_quietly(conn: sqlite3.Connection):
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+class ConnectionManager:
+    """
+    长连接管理：
+    - reader(): 每个线程一条只读连接（mode=ro + shared cache + mmap），首次使用时创建，之后复用；
+      新建时顺带关闭已退出线程的连接（线程池替换空闲线程时不会越攒越多）
+    - writer(): 全进程唯一的写连接，用锁串行化
+    - close(): 关闭全部连接（FastAPI shutdown 时调用）；之后再用会自动重连
+    """
+
+    def __init__(self, db_path=None, mmap_size: int = READ_MMAP_SIZE):
+        self.db_path = Path(db_path or DB_PATH)
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._readers: list[tuple[threading.Thread, int, sqlite3.Connection]] = []  # (所属线程, generation, 连接)
+        self._writer: sqlite3.Connection | None = None
+        self._generation = 0
+
+    def _open_reader(self) -> sqlite3.Connection:
+        if not self.db_path.exists():
+            init_db(self.db_path)
+        uri = self.db_path.resolve().as_uri() + "?mode=ro&cache=shared"
+        # check_same_thread=False 只是为了 close() 能跨线程关闭；实际每条连接只在创建它的线程里用
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        local = self._local
+        conn = getattr(local, "conn", None)
+        if conn is None or getattr(local, "generation", -1) != self._generation:
+            conn = self._open_reader()
+            with self._lock:
+                self._prune_readers()
+                self._readers.append((threading.current_thread(), self._generation, conn))
+                local.conn = conn
+                local.generation = self._generation
+        return conn
+
+    def _prune_readers(self):
+        """持 _lock 调用：关闭并丢掉所属线程已退出、或 generation 已过期的连接（不会再有人用它们）。"""
+        keep = []
+        for entry in self._readers:
+            thread, generation, conn = entry
+            if thread.is_alive() and generation == self._generation:
+                keep.append(entry)
+            else:
+                _close_quietly(conn)
+        self._readers = keep
+
+    @contextmanager
+    def writer(self):
+        """
+        串行化写入：with manager.writer() as conn: ...
+        连接是 autocommit 模式（isolation_level=None），需要事务时由调用方显式 BEGIN；
+        退出时若仍在事务中：正常退出 commit，异常退出 rollback。
+        """
+        with self._write_lock:
+            if self._writer is None:
+                init_db(self.db_path)
+                conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                self._writer = conn
+            conn = self._writer
+            try:
+                yield conn
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            else:
+                if conn.in_transaction:
+                    conn.commit()
+
+    def close(self):
+        with self._lock:
+            readers, self._readers = self._readers, []
+            self._generation += 1
+        for _, _, conn in readers:
+            _close_quietly(conn)
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+_MANAGERS: dict[Path, ConnectionManager] = {}
+_MANAGERS_LOCK = threading.Lock()
+
+
+def get_manager(db_path=None) -> ConnectionManager:
+    """按数据库路径取进程级单例 ConnectionManager。"""
+    key = Path(db_path or DB_PATH).resolve()
+    with _MANAGERS_LOCK:
+        mgr = _MANAGERS.get(key)
+        if mgr is None:
+            mgr = _MANAGERS[key] = ConnectionManager(key)
+        return mgr
+
+
+def read_conn(db_path=None) -> sqlite3.Connection:
+    """当前线程的只读长连接（不要 close）。"""
+    return get_manager(db_path).reader()
+
+
+def close_connections():
+    """关闭所有 ConnectionManager 的连接；用于进程/服务退出。"""
+    with _MANAGERS_LOCK:
+        managers = list(_MANAGERS.values())
+    for mgr in managers:
+        mgr.close()
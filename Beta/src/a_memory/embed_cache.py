@@ -0,0 +1,134 @@
+# src/a_memory/embed_cache.py
+"""
+内容寻址的 embedding 缓存（index_build 用）。
+
+key = sha1(chunk 文本, EMBEDDING_MODEL, normalize 标志)。chunk 文本在切分时已经逐行 normalize_text，
+这里对送进 encoder 的原文做 hash，命中时拿到的向量与重新 encode 完全一致。
+存储是单独的 SQLite 文件（不和 memory.db 混在一起，删掉即清空缓存），按 last_used 做 LRU 淘汰。
+"""
+import hashlib
+import sqlite3
+import time
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+from src.a_memory.config import EMBED_CACHE_PATH, EMBED_CACHE_MAX_ROWS, EMBEDDING_MODEL
+
+# 单条 SQL 里 IN (...) 的参数个数上限（老版本 SQLite 限制 999）
+_LOOKUP_BATCH = 900
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        path=EMBED_CACHE_PATH,
+        *,
+        model_name: str = EMBEDDING_MODEL,
+        normalize: bool = True,
+        max_rows: int = EMBED_CACHE_MAX_ROWS,
+    ):
+        self.path = path
+        self.model_name = model_name
+        self.normalize = normalize
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS embeddings (
+            key BLOB PRIMARY KEY,
+            dim INTEGER,
+            vec BLOB,
+            last_used INTEGER
+        ) WITHOUT ROWID
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self.conn.commit()
+
+        self._salt = f"{model_name}\0{int(normalize)}\0".encode("utf-8")
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha1(self._salt + text.encode("utf-8")).digest()
+
+    def get_many(self, keys: Sequence[bytes]) -> Dict[bytes, np.ndarray]:
+        found: Dict[bytes, np.ndarray] = {}
+        now = int(time.time())
+        cur = self.conn.cursor()
+        for i in range(0, len(keys), _LOOKUP_BATCH):
+            part = list(keys[i:i + _LOOKUP_BATCH])
+            q = ",".join(["?"] * len(part))
+            cur.execute(f"SELECT key, dim, vec FROM embeddings WHERE key IN ({q})", part)
+            rows = cur.fetchall()
+            for k, dim, vec in rows:
+                found[k] = np.frombuffer(vec, dtype="float32", count=dim)
+            # 刷新 LRU 时间戳
+            cur.executemany("UPDATE embeddings SET last_used=? WHERE key=?", [(now, r[0]) for r in rows])
+        self.conn.commit()
+        return found
+
+    def put_many(self, items: Dict[bytes, np.ndarray]):
+        now = int(time.time())
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO embeddings(key, dim, vec, last_used) VALUES(?,?,?,?)",
+            [(k, int(v.shape[0]), np.asarray(v, dtype="float32").tobytes(), now) for k, v in items.items()],
+        )
+        self.conn.commit()
+        self.evict()
+
+    def evict(self) -> int:
+        """超过 max_rows 时按 last_used 从旧到新删除，返回删除条数。"""
+        (n,) = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        over = n - self.max_rows
+        if over <= 0:
+            return 0
+        self.conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (over,),
+        )
+        self.conn.commit()
+        return over
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        self.conn.close()
+
+
+def encode_with_cache(
+    encode: Callable[[List[str]], np.ndarray],
+    texts: Sequence[str],
+    cache: EmbeddingCache,
+) -> np.ndarray:
+    """
+    只把缓存未命中的（去重后的）文本交给 encode，结果写回缓存；返回与 texts 一一对应的 float32 矩阵。
+    encode 接收 list[str]，返回 (len, dim) 的向量，调用方负责模型加载（全命中时可以完全不加载模型）。
+    """
+    keys = [cache.key(t) for t in texts]
+    found = cache.get_many(list(dict.fromkeys(keys)))
+
+    miss_text: Dict[bytes, str] = {}
+    for k, t in zip(keys, texts):
+        if k not in found:
+            miss_text.setdefault(k, t)
+
+    cache.hits += len(keys) - sum(1 for k in keys if k in miss_text)
+    cache.misses += sum(1 for k in keys if k in miss_text)
+
+    if miss_text:
+        miss_keys = list(miss_text)
+        vecs = np.asarray(encode([miss_text[k] for k in miss_keys]), dtype="float32")
+        fresh = dict(zip(miss_keys, vecs))
+        cache.put_many(fresh)
+        found.update(fresh)
+
+    if not keys:
+        return np.zeros((0, 0), dtype="float32")
+    return np.stack([found[k] for k in keys]).astype("float32", copy=False)
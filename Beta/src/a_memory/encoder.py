@@ -0,0 +1,209 @@
+# src/a_memory/encoder.py
+"""
+查询 / chunk 编码器后端（config.ENCODER_BACKEND）：
+- torch:     SentenceTransformer（PyTorch eager），默认
+- onnx:      导出的 ONNX 图 + onnxruntime（CPU），mean pooling + L2 归一化在 numpy 里做
+- onnx-int8: 同上，权重做动态 int8 量化（onnxruntime.quantization.quantize_dynamic）
+
+ONNX 模型需要先导出一次：
+    python -m src.a_memory.encoder --export            # 生成 model.onnx + model.int8.onnx
+两个后端的 encode 签名一致（texts, batch_size, show_progress_bar, normalize_embeddings），可以直接替换。
+不同后端的向量有细微差别，所以缓存键 / 索引状态都用 encoder_key（模型名 + 后端）区分；
+切换后端后请重新构建索引（余弦一致性见 scripts/bench_encoder.py）。
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import List, Sequence
+
+import numpy as np
+
+from src.a_memory.config import EMBEDDING_MODEL, ENCODER_BACKEND, ENCODER_THREADS, ONNX_MODEL_DIR
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def encoder_key(backend: str = ENCODER_BACKEND, model_name: str = EMBEDDING_MODEL) -> str:
+    """缓存 / 索引状态用的编码器标识；torch 保持原来的模型名，已有缓存与索引状态继续有效。"""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+class TorchEncoder:
+    def __init__(self, model_name: str = EMBEDDING_MODEL, threads: int = ENCODER_THREADS):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.backend = "torch"
+        self.key = encoder_key("torch", model_name)
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def encode(
+        self,
+        texts: Sequence[str],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        normalize_embeddings: bool = True,
+    ) -> np.ndarray:
+        return np.asarray(
+            self.model.encode(
+                list(texts),
+                batch_size=batch_size,
+                show_progress_bar=show_progress_bar,
+                normalize_embeddings=normalize_embeddings,
+            ),
+            dtype="float32",
+        )
+
+
+class OnnxEncoder:
+    """
+    onnxruntime 推理：tokenizer（与原模型相同）→ last_hidden_state → 按 attention_mask 做 mean pooling。
+    与 SentenceTransformer 一样先按长度排序再分批，减少 padding。
+    """
+
+    def __init__(self, model_dir: Path = ONNX_MODEL_DIR, quantized: bool = False, threads: int = ENCODER_THREADS):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_dir = Path(model_dir)
+        path = model_dir / ("model.int8.onnx" if quantized else "model.onnx")
+        if not path.exists():
+            raise FileNotFoundError(f"{path} 不存在，请先运行 python -m src.a_memory.encoder --export")
+        with open(model_dir / "encoder.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = threads
+            opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(str(path), opts, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.max_seq_length = int(meta["max_seq_length"])
+        self.dim = int(meta["dim"])
+        self.backend = "onnx-int8" if quantized else "onnx"
+        self.key = encoder_key(self.backend, meta["model"])
+
+    def encode(
+        self,
+        texts: Sequence[str],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        normalize_embeddings: bool = True,
+    ) -> np.ndarray:
+        texts = list(texts)
+        out = np.empty((len(texts), self.dim), dtype="float32")
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        for a in range(0, len(texts), batch_size):
+            idx = order[a:a + batch_size]
+            enc = self.tokenizer(
+                [texts[i] for i in idx],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            mask = enc["attention_mask"].astype(np.int64)
+            (hidden,) = self.session.run(
+                ["last_hidden_state"],
+                {"input_ids": enc["input_ids"].astype(np.int64), "attention_mask": mask},
+            )
+            m = mask[..., None].astype("float32")
+            emb = (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                emb /= np.clip(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12, None)
+            out[idx] = emb
+            if show_progress_bar:
+                print(f"\r  encoded {min(a + batch_size, len(texts))}/{len(texts)}", end="", flush=True)
+        if show_progress_bar and texts:
+            print()
+        return out
+
+
+def get_encoder(backend: str = ENCODER_BACKEND):
+    """按配置创建编码器（依赖都是惰性导入：选 onnx 时进程里不需要 torch）。"""
+    if backend == "torch":
+        return TorchEncoder()
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEncoder(quantized=backend == "onnx-int8")
+    raise ValueError(f"unknown encoder backend: {backend} (choose from {BACKENDS})")
+
+
+def export_onnx(
+    out_dir: Path = ONNX_MODEL_DIR,
+    model_name: str = EMBEDDING_MODEL,
+    quantize: bool = True,
+    opset: int = 14,
+) -> List[Path]:
+    """导出 transformer 主体为 ONNX（动态 batch / seq 维），可选再生成动态 int8 量化版本。"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    st = SentenceTransformer(model_name, device="cpu")
+    pooling = st[1].get_pooling_mode_str() if len(st) > 1 else "mean"
+    if pooling != "mean":
+        raise ValueError(f"only mean pooling is supported, got {pooling}")
+    auto_model = st[0].auto_model.eval()
+    tokenizer = st[0].tokenizer
+
+    class _LastHidden(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    dummy = tokenizer(["导出 ONNX 用的示例句子", "example"], padding=True, return_tensors="pt")
+    path = out_dir / "model.onnx"
+    with torch.no_grad():
+        torch.onnx.export(
+            _LastHidden(auto_model),
+            (dummy["input_ids"], dummy["attention_mask"]),
+            str(path),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "seq"},
+                "attention_mask": {0: "batch", 1: "seq"},
+                "last_hidden_state": {0: "batch", 1: "seq"},
+            },
+            opset_version=opset,
+        )
+    tokenizer.save_pretrained(str(out_dir))
+    with open(out_dir / "encoder.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "model": model_name,
+                "max_seq_length": int(st.max_seq_length),
+                "dim": int(st.get_sentence_embedding_dimension()),
+                "pooling": pooling,
+            },
+            f,
+            ensure_ascii=False,
+        )
+    written = [path]
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        qpath = out_dir / "model.int8.onnx"
+        quantize_dynamic(str(path), str(qpath), weight_type=QuantType.QInt8)
+        written.append(qpath)
+    return written
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="导出 ONNX 编码器")
+    ap.add_argument("--export", action="store_true", help="导出 model.onnx（以及 int8 量化版）")
+    ap.add_argument("--no-quantize", action="store_true", help="只导出 fp32 ONNX")
+    ap.add_argument("--out", type=Path, default=ONNX_MODEL_DIR)
+    args = ap.parse_args()
+    if not args.export:
+        ap.error("nothing to do (use --export)")
+    for p in export_onnx(args.out, quantize=not args.no_quantize):
+        print("✅ exported:", p)
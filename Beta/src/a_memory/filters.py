@@ -0,0 +1,135 @@
+# src/a_memory/filters.py
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.a_memory.chunk_store import ChunkStore
+
+_EMPTY = np.zeros(0, dtype=np.int64)
+
+
+class ChunkFilter:
+    """
+    检索前过滤：把 conv / sender / 时间条件变成候选行号（升序 int64），打分只在这些行上做。
+    - conv:   按 conv_code 稳定排序后的 CSR（conv_off），取某会话的行是一次切片
+    - sender: sender → 出现过该 sender 的 chunk 行（CSR），首次按 sender 过滤时才构建
+    - 时间:   time_start / time_end 各自排序，searchsorted 二分取满足单边条件的行
+    多个条件时先取候选最少的那个索引，其余条件只在这些行上向量化判断，过滤越窄越便宜。
+    """
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+        self.n = len(store)
+        conv_code = np.asarray(store.conv_code)
+        self.time_start = np.asarray(store.time_start)
+        self.time_end = np.asarray(store.time_end)
+        self.conv_code = conv_code
+
+        self._conv_rows = np.argsort(conv_code, kind="stable").astype(np.int64)
+        self._conv_off = np.zeros(len(store.convs) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(conv_code, minlength=len(store.convs)), out=self._conv_off[1:])
+
+        self._by_start = np.argsort(self.time_start, kind="stable").astype(np.int64)
+        self._start_sorted = self.time_start[self._by_start]
+        self._by_end = np.argsort(self.time_end, kind="stable").astype(np.int64)
+        self._end_sorted = self.time_end[self._by_end]
+
+        self._sender_index: Optional[Dict[str, int]] = None
+        self._sender_rows = _EMPTY
+        self._sender_off = _EMPTY
+
+    # ---- 单条件索引 ----
+    def conv_rows(self, conv_code: int) -> np.ndarray:
+        if conv_code < 0:
+            return _EMPTY
+        return self._conv_rows[self._conv_off[conv_code]:self._conv_off[conv_code + 1]]
+
+    def _build_sender_index(self):
+        store = self.store
+        msg_off = np.asarray(store.msg_off)
+        names = store._senders.slice(0, int(msg_off[-1]))
+        index: Dict[str, int] = {}
+        codes = np.fromiter((index.setdefault(s, len(index)) for s in names), dtype=np.int64, count=len(names))
+        rows = np.repeat(np.arange(self.n, dtype=np.int64), np.diff(msg_off))
+        # (sender, row) 去重后按 sender 分组；组内行号升序
+        pairs = np.unique(codes * max(self.n, 1) + rows)
+        self._sender_rows = pairs % max(self.n, 1)
+        self._sender_off = np.zeros(len(index) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs // max(self.n, 1), minlength=len(index)), out=self._sender_off[1:])
+        self._sender_index = index
+
+    def sender_rows(self, sender: str) -> np.ndarray:
+        if self._sender_index is None:
+            self._build_sender_index()
+        code = self._sender_index.get(sender)
+        if code is None:
+            return _EMPTY
+        return self._sender_rows[self._sender_off[code]:self._sender_off[code + 1]]
+
+    def ends_after(self, q_start: int) -> np.ndarray:
+        """time_end >= q_start 的行（无序）。"""
+        return self._by_end[np.searchsorted(self._end_sorted, q_start, side="left"):]
+
+    def starts_before(self, q_end: int) -> np.ndarray:
+        """time_start <= q_end 的行（无序）。"""
+        return self._by_start[:np.searchsorted(self._start_sorted, q_end, side="right")]
+
+    # ---- 组合 ----
+    def candidates(
+        self,
+        conv_code: Optional[int] = None,
+        sender: Optional[str] = None,
+        q_start: Optional[int] = None,
+        q_end: Optional[int] = None,
+    ) -> Optional[np.ndarray]:
+        """
+        返回满足全部条件的行号（升序）；没有任何条件时返回 None（表示全量，不必物化）。
+        时间条件与原 time_overlap 同语义：区间 [time_start, time_end] 与 [q_start, q_end] 有交集。
+        """
+        sources: List[tuple] = []
+        if conv_code is not None:
+            sources.append(("conv", self.conv_rows(conv_code)))
+        if sender is not None:
+            sources.append(("sender", self.sender_rows(sender)))
+        if q_start is not None:
+            sources.append(("start", self.ends_after(q_start)))
+        if q_end is not None:
+            sources.append(("end", self.starts_before(q_end)))
+        if not sources:
+            return None
+
+        name, rows = min(sources, key=lambda s: len(s[1]))
+        if len(rows) == 0:
+            return _EMPTY
+        keep = np.ones(len(rows), dtype=bool)
+        if conv_code is not None and name != "conv":
+            keep &= self.conv_code[rows] == conv_code
+        if q_start is not None and name != "start":
+            keep &= self.time_end[rows] >= q_start
+        if q_end is not None and name != "end":
+            keep &= self.time_start[rows] <= q_end
+        if sender is not None and name != "sender":
+            srows = self.sender_rows(sender)
+            pos = np.minimum(np.searchsorted(srows, rows), max(len(srows) - 1, 0))
+            keep &= (srows[pos] == rows) if len(srows) else False
+        return np.sort(rows[keep])
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    部分选择：argpartition 取前 k，再只对这 k 个排序（从高到低）。
+    分数并列时下标小的优先（包括第 k 名边界上的并列），结果是确定的，
+    分片打分后合并（shards.py）与整体选择得到同一组行。
+    """
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return _EMPTY
+    part = np.argpartition(scores, n - k)[n - k:]
+    if k < n:
+        kth = scores[part].min()
+        above = part[scores[part] > kth]
+        if len(above) + np.count_nonzero(scores == kth) > k:
+            # 边界上的并列值 argpartition 任取一部分；统一取下标最小的
+            part = np.concatenate([above, np.flatnonzero(scores == kth)[: k - len(above)]])
+    return part[np.lexsort((part, -scores[part]))]
@@ -0,0 +1,111 @@
+# src/a_memory/hydrator.py
+"""
+引用展开：检索结果（chunk）→ 原文消息 + 前后相邻消息。
+- 全部命中 chunk 的 message_ids 合起来一次查询：WHERE id IN (SELECT value FROM json_each(?))，
+  只绑定一个 JSON 参数（不受 SQLite 变量个数限制），走 messages 主键
+- 相邻消息：每条命中在 (conv_id, ts) 索引上向前 / 向后各做一次带 LIMIT 的范围扫描
+- 消息按 id 放进有界 LRU；ingest 计数器（generations 表的 "conversations"）变化时整体清空，不会读到旧文本
+"""
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from src.a_memory.config import DB_PATH, HYDRATE_CACHE_SIZE, HYDRATE_WINDOW
+from src.a_memory.db import read_conn, read_generation
+from src.a_memory.query_cache import LRUCache
+
+_COLUMNS = "id, conv_id, sender, ts, text"
+
+
+def _row(r) -> dict:
+    return {"id": r[0], "conv_id": r[1], "sender": r[2], "ts": r[3], "text": r[4]}
+
+
+class MessageHydrator:
+    """
+    - fetch(ids)：id → 消息（缺失的 id 不出现在结果里）
+    - expand(hits, window)：每条命中（search 结果 / memory_trace，含 conv_id 与 message_ids）的原文消息
+      加上前后各 window 条相邻消息，按时间排序；命中 chunk 内的消息带 hit=True
+    """
+
+    def __init__(self, db_path=None, cache_size: int = HYDRATE_CACHE_SIZE):
+        self.db_path = db_path
+        self.cache = LRUCache(cache_size, ttl=None)
+        self._generation: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        conn = read_conn(self.db_path)
+        gen = read_generation(conn, "conversations")
+        if gen != self._generation:
+            with self._lock:
+                if gen != self._generation:
+                    self.cache.clear()
+                    self._generation = gen
+        return conn
+
+    def _fetch(self, conn, ids: Iterable[str]) -> Dict[str, dict]:
+        out: Dict[str, dict] = {}
+        missing = []
+        for mid in dict.fromkeys(ids):
+            msg = self.cache.get(mid)
+            if msg is None:
+                missing.append(mid)
+            else:
+                out[mid] = msg
+        if missing:
+            rows = conn.execute(
+                f"SELECT {_COLUMNS} FROM messages WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(missing),),
+            ).fetchall()
+            for r in rows:
+                msg = out[r[0]] = _row(r)
+                self.cache.put(r[0], msg)
+        return out
+
+    def fetch(self, ids: Iterable[str]) -> Dict[str, dict]:
+        return self._fetch(self._conn(), ids)
+
+    def _neighbors(self, conn, conv_id: str, first_ts: str, last_ts: str, window: int) -> List[dict]:
+        before = conn.execute(
+            f"SELECT {_COLUMNS} FROM messages WHERE conv_id=? AND ts<? ORDER BY ts DESC LIMIT ?",
+            (conv_id, first_ts, window),
+        ).fetchall()
+        after = conn.execute(
+            f"SELECT {_COLUMNS} FROM messages WHERE conv_id=? AND ts>? ORDER BY ts LIMIT ?",
+            (conv_id, last_ts, window),
+        ).fetchall()
+        msgs = [_row(r) for r in reversed(before)] + [_row(r) for r in after]
+        for m in msgs:
+            self.cache.put(m["id"], m)
+        return msgs
+
+    def expand(self, hits: List[dict], window: int = HYDRATE_WINDOW) -> List[List[dict]]:
+        conn = self._conn()
+        ids_per_hit = [list(h.get("message_ids") or h.get("msg_ids") or []) for h in hits]
+        found = self._fetch(conn, (mid for ids in ids_per_hit for mid in ids))
+        out = []
+        for hit, ids in zip(hits, ids_per_hit):
+            msgs = [dict(found[mid], hit=True) for mid in ids if mid in found]
+            msgs.sort(key=lambda m: m["ts"])
+            if window > 0 and msgs:
+                conv_id = hit.get("conv_id") or msgs[0]["conv_id"]
+                near = self._neighbors(conn, conv_id, msgs[0]["ts"], msgs[-1]["ts"], window)
+                msgs = sorted(msgs + [dict(m, hit=False) for m in near], key=lambda m: m["ts"])
+            out.append(msgs)
+        return out
+
+
+_HYDRATORS: Dict[Path, MessageHydrator] = {}
+_HYDRATORS_LOCK = threading.Lock()
+
+
+def get_hydrator(db_path=None) -> MessageHydrator:
+    """按数据库路径取进程级单例（与 conv_catalog.get_catalog 相同的约定）。"""
+    key = Path(db_path or DB_PATH).resolve()
+    with _HYDRATORS_LOCK:
+        hydrator = _HYDRATORS.get(key)
+        if hydrator is None:
+            hydrator = _HYDRATORS[key] = MessageHydrator(key)
+        return hydrator
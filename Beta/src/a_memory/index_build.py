@@ -1,89 +1,361 @@
 # src/index_build.py
-import pickle
+import argparse
+import json
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from rank_bm25 import BM25Okapi
-from sentence_transformers import SentenceTransformer
 
-from src.a_memory.db import connect
-from src.a_memory.chunking import build_chunks, Chunk
+from src.a_memory.db import init_db, read_conn
+from src.a_memory.chunking import chunk_conversation, build_chunks_batch, resync_point, Chunk
 from src.a_memory.config import (
-    EMBEDDING_MODEL,
-    DATA_DIR,
-    BM25_PATH,
-    CHUNKS_PATH,
+    BUILD_WORKERS,
+    ANN_BACKEND,
+    EMBEDDING_STORAGE,
 )
-
-# 你需要在 src/config.py 里加一行：
-# EMBEDDINGS_PATH = DATA_DIR / "embeddings.npy"
-from src.a_memory.config import EMBEDDINGS_PATH
 from src.a_memory.preprocess import tokenize_for_bm25
+from src.a_memory.embed_cache import EmbeddingCache, encode_with_cache
+from src.a_memory.encoder import encoder_key, get_encoder
+from src.a_memory.segments import SegmentSet, finish_snapshot, group_by_month, link_segment, sort_entries, write_segment
+from src.a_memory.snapshot import SnapshotConflict, SnapshotPaths, new_snapshot, read_manifest, resolve_paths
 
 
-def build():
-    # 1) 读库：取全部会话
-    conn = connect()
-    cur = conn.cursor()
+def load_conv_messages(cur, conv_id: str, since_ts: str | None = None) -> list[dict]:
+    """
+    按时间顺序取一个会话的消息（走 idx_messages_conv_ts 索引）；since_ts 给定时只取 ts >= since_ts。
+    同一时刻的消息按 rowid 排（索引里本来就是这个顺序），全量与增量构建看到的顺序一致。
+    """
+    if since_ts is None:
+        cur.execute(
+            "SELECT id, conv_id, sender, ts, text FROM messages WHERE conv_id=? ORDER BY ts, rowid",
+            (conv_id,),
+        )
+    else:
+        cur.execute(
+            "SELECT id, conv_id, sender, ts, text FROM messages WHERE conv_id=? AND ts>=? ORDER BY ts, rowid",
+            (conv_id, since_ts),
+        )
+    return [
+        {"id": r[0], "conv_id": r[1], "sender": r[2], "ts": r[3], "text": r[4]}
+        for r in cur.fetchall()
+    ]
 
-    cur.execute("SELECT conv_id FROM conversations")
-    conv_ids = [r[0] for r in cur.fetchall()]
 
-    # 2) 生成 chunks
-    all_chunks: list[Chunk] = []
+def rechunk_from(cur, conv_id: str, first_id: str, since_ts: str, last_ts: str) -> tuple[list[Chunk], int] | None:
+    """
+    追加型增量：从某个 chunk（chunking.resync_point 选出）的第一条消息 first_id（时间 since_ts）起重新切分到最新，
+    返回 (chunks, 高水位 last_ts 之后的新消息数)。
+    ts >= since_ts 还会取到同一时刻、但属于前一个 chunk 的消息（max_messages / MAX_CHUNK_CHARS 切在同一秒内），
+    所以按 first_id 截断；这条消息已不在库里时返回 None（调用方整体重切）。
+    """
+    msgs = load_conv_messages(cur, conv_id, since_ts=since_ts)
+    first = next((i for i, m in enumerate(msgs) if m["id"] == first_id), None)
+    if first is None:
+        return None
+    msgs = msgs[first:]
+    return chunk_conversation(conv_id, msgs), sum(1 for m in msgs if m["ts"] > last_ts)
+
+
+def iter_conv_batches(cur, conv_ids: list[str], batch_convs: int):
+    """从 SQLite 逐会话流式读出消息，每 batch_convs 个会话打成一批。"""
+    batch = []
     for cid in conv_ids:
-        cur.execute(
-            "SELECT id, conv_id, sender, ts, text FROM messages WHERE conv_id=? ORDER BY ts",
-            (cid,),
+        batch.append((cid, load_conv_messages(cur, cid)))
+        if len(batch) >= batch_convs:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def chunk_conversations(cur, conv_ids: list[str], workers: int = 1, batch_convs: int = 64) -> list[Chunk]:
+    """
+    切分全部会话。workers>1 时把会话批次分发到进程池：
+    - 在途批次数有上限（workers*4），内存不随语料线性增长
+    - 按提交顺序取回结果，chunk 顺序与 chunk_id 与串行构建完全一致
+    """
+    if workers <= 1:
+        all_chunks: list[Chunk] = []
+        for cid in conv_ids:
+            all_chunks.extend(chunk_conversation(cid, load_conv_messages(cur, cid)))
+        return all_chunks
+
+    all_chunks = []
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        pending = deque()
+        for batch in iter_conv_batches(cur, conv_ids, batch_convs):
+            pending.append(ex.submit(build_chunks_batch, batch))
+            if len(pending) >= workers * 4:
+                all_chunks.extend(pending.popleft().result())
+        while pending:
+            all_chunks.extend(pending.popleft().result())
+    return all_chunks
+
+
+def _conv_watermarks(cur) -> dict[str, tuple[str, int]]:
+    """每个会话当前的 (最新 ts, 消息数)；一次聚合查询，走 (conv_id, ts) 覆盖索引。"""
+    cur.execute("SELECT conv_id, MAX(ts), COUNT(*) FROM messages GROUP BY conv_id")
+    return {cid: (ts, int(n)) for cid, ts, n in cur.fetchall()}
+
+
+def _embed(texts: list[str]) -> np.ndarray:
+    """
+    normalize_embeddings=True -> 后续点积=余弦
+    先查内容寻址缓存，只有未命中的文本才加载模型 encode。
+    """
+    model = None
+
+    def encode(batch: list[str]) -> np.ndarray:
+        nonlocal model
+        if model is None:
+            model = get_encoder()
+        return model.encode(
+            batch,
+            batch_size=32,
+            show_progress_bar=True,
+            normalize_embeddings=True,
         )
-        rows = cur.fetchall()
-        msgs = [
-            {"id": r[0], "conv_id": r[1], "sender": r[2], "ts": r[3], "text": r[4]}
-            for r in rows
-        ]
-        all_chunks.extend(build_chunks(cid, msgs))
 
-    conn.close()
+    cache = EmbeddingCache(model_name=encoder_key(), normalize=True)
+    try:
+        embeddings = encode_with_cache(encode, texts, cache)
+    finally:
+        cache.close()
+    print(
+        f"✅ embedding cache: hits={cache.hits} misses={cache.misses} "
+        f"hit_rate={cache.hit_rate:.1%}"
+    )
+    return embeddings
+
+
+def _doc_freqs(tokens: list[str]) -> dict[str, int]:
+    freqs: dict[str, int] = {}
+    for w in tokens:
+        freqs[w] = freqs.get(w, 0) + 1
+    return freqs
+
+
+def _index_state(watermarks: dict[str, tuple[str, int]]) -> dict:
+    """
+    增量构建需要的状态：每个会话的高水位（最后一条已索引消息的 ts + 已索引消息数）；
+    它最后一个 chunk（开放的尾块）的全局行号由 segments.finish_snapshot 按写好的分段补上。
+    """
+    return {
+        "embedding_model": encoder_key(),
+        "convs": {cid: {"last_ts": ts, "count": n} for cid, (ts, n) in watermarks.items()},
+    }
+
+
+def _snapshot_info(dim: int) -> dict:
+    return {
+        "dim": dim,
+        "embedding_model": encoder_key(),
+        "embedding_storage": EMBEDDING_STORAGE,
+        "ann_backend": ANN_BACKEND,
+    }
+
+
+def _write_month_segments(
+    snap: SnapshotPaths,
+    chunks: list[Chunk],
+    embeddings: np.ndarray,
+    doc_freqs: list[dict[str, int]],
+) -> list[dict]:
+    """按起始月份把 chunk 写成分段：较早的月份封存，最新的月份是热分段（之后的增量构建只重写它）。"""
+    groups = group_by_month(chunks)
+    entries = []
+    for j, (month, rows) in enumerate(groups):
+        entries.append(write_segment(
+            snap,
+            [chunks[i] for i in rows],
+            embeddings[rows],
+            [doc_freqs[i] for i in rows],
+            (month, month),
+            sealed=j < len(groups) - 1,
+        ))
+    return entries
+
+
+def _publish(snap: SnapshotPaths, entries: list[dict], state: dict, dim: int, parent: SnapshotPaths | None = None):
+    """
+    分段都写进新的临时快照目录之后：写 BM25 统计量 / 状态 / manifest → 发布（改名 + 原子切换 CURRENT）。
+    运行中的服务只会看到完整的旧快照或新快照；中途失败只留下 .tmp 目录，当前快照不受影响。
+    """
+    try:
+        final = finish_snapshot(snap, sort_entries(entries), state, _snapshot_info(dim), parent=parent)
+    except SnapshotConflict as e:
+        print(f"❌ {e}：请重新运行 index_build.py --delta")
+        raise
+    except BaseException:
+        shutil.rmtree(snap.root, ignore_errors=True)
+        raise
+    print(f"✅ published index snapshot: {final.root} ({len(entries)} segments)")
+
+
+def _load_state(paths: SnapshotPaths) -> dict | None:
+    if not (paths.state.exists() and paths.complete()):
+        return None
+    with open(paths.state, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("embedding_model") != encoder_key():
+        return None
+    return state
+
+
+def build(delta: bool = False, workers: int = BUILD_WORKERS):
+    # 0) 老库原地升级 schema（补齐索引）
+    init_db()
+
+    if delta:
+        paths = resolve_paths()
+        state = _load_state(paths)
+        if state is None:
+            print("⚠️ 没有可用的索引状态（或 embedding 模型已变更），改为全量构建。")
+        elif not paths.segmented():
+            print("⚠️ 当前索引不是分段布局，改为全量构建。")
+        else:
+            return build_delta(state, paths)
+
+    # 1) 读库：取全部会话
+    cur = read_conn().cursor()
+
+    cur.execute("SELECT conv_id FROM conversations")
+    conv_ids = [r[0] for r in cur.fetchall()]
+    watermarks = _conv_watermarks(cur)
+
+    # 2) 生成 chunks（workers>1 时多进程并行切分）
+    all_chunks = chunk_conversations(cur, conv_ids, workers=workers)
 
     print(f"✅ chunks: {len(all_chunks)}")
     if not all_chunks:
         print("⚠️ 没有可用chunks。请先运行 ingest_chat.py 并确认 chat_sample.json 有内容。")
         return
 
-    # 3) Embedding（normalize_embeddings=True -> 后续点积=余弦）
-    model = SentenceTransformer(EMBEDDING_MODEL)
+    # 3) Embedding
     texts = [c.text for c in all_chunks]
-
-    embeddings = model.encode(
-        texts,
-        batch_size=32,
-        show_progress_bar=True,
-        normalize_embeddings=True,
-    )
-    embeddings = np.asarray(embeddings, dtype="float32")
+    embeddings = _embed(texts)
     print("✅ embeddings shape:", embeddings.shape)
 
-    # 4) BM25（关键词检索）
-    tokenized = [tokenize_for_bm25(t) for t in texts]
-    bm25 = BM25Okapi(tokenized)
+    # 4) BM25 词频表（每个分段各建倒排，idf / avgdl 发布时按全部分段统一计算）
+    doc_freqs = [_doc_freqs(tokenize_for_bm25(t)) for t in texts]
+
+    # 5) 按月份写分段 → 发布
+    snap = new_snapshot()
+    entries = _write_month_segments(snap, all_chunks, embeddings, doc_freqs)
+    _publish(snap, entries, _index_state(watermarks), int(embeddings.shape[1]))
+
+    print(f"✅ index built (ann backend: {ANN_BACKEND}).")
+
+
+def build_delta(state: dict, paths: SnapshotPaths):
+    """
+    增量构建：只处理有新消息的会话。
+    - 追加型（高水位之前的消息没变）：从最后一个切分状态重置的 chunk（chunking.resync_point，通常就是尾块或其前几块）起，
+      删掉这些 chunk，重新切分它们的消息 + 新消息
+    - 回填/删改型（高水位之前的消息数变了）：该会话整体重切
+    - 新会话：整体切分
+    只对新增/变化的 chunk 做 embedding（先查缓存）与分词。
+    封存分段原样硬链接进新快照，其中被替换掉的行记为墓碑；热分段的剩余行 + 新 chunk 按月份重新分组：
+    最新的月份仍是热分段，较早的月份封存（小分段由 compactor 合并）。
+    paths 是当前快照，结果发布为新快照，不改动 paths 里的文件。
+    """
+    manifest = read_manifest(paths)
+    manifest_entries = {e["name"]: e for e in manifest["segments"]}
+    segments = SegmentSet.open(paths, manifest=manifest, global_stats=False)
+    cur = read_conn().cursor()
+    watermarks = _conv_watermarks(cur)
+    conv_state = state["convs"]
+
+    dead: set[int] = set()  # 被替换掉的全局行号
+    new_chunks: list[Chunk] = []
+    changed = 0
 
-    # 5) 落盘（确保目录存在）
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    def conv_rows(cid: str) -> list[int]:
+        rows = []
+        for seg in segments:
+            code = seg.chunks.conv_code_of(cid)
+            if code >= 0:
+                local = seg.filters.conv_rows(code)
+                rows += (local[~np.isin(local, seg.deleted)] + seg.base).tolist()
+        return rows
 
-    # 保存 embeddings.npy
-    np.save(str(EMBEDDINGS_PATH), embeddings)
-    print("✅ saved embeddings:", EMBEDDINGS_PATH)
+    for cid, (last_ts, count) in watermarks.items():
+        s = conv_state.get(cid)
+        if s and s["last_ts"] == last_ts and s["count"] == count:
+            continue
+        changed += 1
 
-    # 保存 bm25.pkl
-    with open(BM25_PATH, "wb") as f:
-        pickle.dump(bm25, f)
-    print("✅ saved bm25:", BM25_PATH)
+        tail_row = s.get("tail_row") if s else None
+        rows = sorted(conv_rows(cid)) if s and tail_row is not None and last_ts > s["last_ts"] else []
+        if rows:
+            located = [segments.locate(r) for r in rows]
+            k = resync_point([seg.chunks.time_range(local) for seg, local in located])
+            seg, local = located[k]
+            rechunked = rechunk_from(cur, cid, seg.chunks.message_ids(local)[0], seg.chunks.time_range(local)[0], s["last_ts"])
+            if rechunked is not None and count - rechunked[1] == s["count"]:
+                dead.update(rows[k:])
+                new_chunks.extend(rechunked[0])
+                continue
 
-    # 保存 chunks.pkl
-    with open(CHUNKS_PATH, "wb") as f:
-        pickle.dump(all_chunks, f)
-    print("✅ saved chunks:", CHUNKS_PATH)
+        # 新会话 / 回填 / 之前全是噪声没有尾块：整体重切
+        if s:
+            dead.update(conv_rows(cid))
+        new_chunks.extend(chunk_conversation(cid, load_conv_messages(cur, cid)))
 
-    print("✅ index built (no faiss).")
+    if not changed:
+        segments.close()
+        print("✅ index up to date (no new messages).")
+        return
+
+    dim = int(segments[0].embeddings.shape[1]) if len(segments) else 0
+    # 被替换掉的尾块若文本没变，会直接命中 embedding 缓存，不会重新 encode
+    new_emb = _embed([c.text for c in new_chunks]) if new_chunks else np.zeros((0, dim), dtype="float32")
+    new_freqs = [_doc_freqs(tokenize_for_bm25(c.text)) for c in new_chunks]
+
+    snap = new_snapshot()
+    try:
+        entries: list[dict] = []
+        hot_chunks: list[Chunk] = []
+        hot_emb, hot_freqs = [], []
+        dead_rows = np.asarray(sorted(dead), dtype=np.int64)
+        for seg in segments:
+            lo, hi = np.searchsorted(dead_rows, [seg.base, seg.base + seg.rows])
+            killed = dead_rows[lo:hi] - seg.base
+            if not seg.sealed:
+                # 热分段：剩余行取出来与新 chunk 一起重写（词频表原样复用，只对新 chunk 分词）
+                live = np.setdiff1d(seg.live_rows(), killed, assume_unique=True)
+                hot_chunks += [seg.chunks.get(int(r)) for r in live]
+                hot_emb.append(np.asarray(seg.embeddings.exact[live], dtype="float32"))
+                hot_freqs += list(seg.bm25.iter_doc_freqs(live.tolist()))
+                continue
+            deleted = np.union1d(seg.deleted, killed)
+            if len(deleted) == seg.rows:
+                continue  # 整个分段都被替换了
+            link_segment(seg.paths, snap, seg.name)
+            entries.append({**manifest_entries[seg.name], "deleted": deleted.tolist()})
+
+        hot_chunks += new_chunks
+        if hot_chunks:
+            entries += _write_month_segments(
+                snap, hot_chunks, np.concatenate(hot_emb + [new_emb]), hot_freqs + new_freqs,
+            )
+    except BaseException:
+        shutil.rmtree(snap.root, ignore_errors=True)
+        raise
+    finally:
+        segments.close()
+
+    print(
+        f"✅ delta: {changed} convs changed, {len(dead)} chunks replaced, "
+        f"{len(new_chunks)} chunks added"
+    )
+    _publish(snap, entries, _index_state(watermarks), dim, parent=paths)
+    print("✅ index updated (delta).")
 
 
 if __name__ == "__main__":
-    build()
\ No newline at end of file
+    ap = argparse.ArgumentParser(description="构建 A 阶段检索索引")
+    ap.add_argument("--delta", action="store_true", help="增量构建：只处理高水位之后的新消息")
+    ap.add_argument("--workers", type=int, default=BUILD_WORKERS, help="切分阶段的进程数（1=串行）")
+    args = ap.parse_args()
+    build(delta=args.delta, workers=args.workers)
@@ -1,35 +1,264 @@
+import argparse
 import json
-from src.a_memory.db import init_db, connect
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from src.a_memory.db import init_db, get_manager, bump_generation
 from src.a_memory.config import DATA_DIR
 
-def ingest(json_path: str):
-    init_db()
-    conn = connect()
-    cur = conn.cursor()
+# 每个事务最多攒多少条消息再 executemany + commit（同时也是 checkpoint 粒度）
+BATCH_MESSAGES = 50_000
+
+# 流式解析每次从文件读取的字符数
+READ_CHUNK_CHARS = 1 << 20
+
+# 批量导入用的 pragma：WAL + NORMAL 在崩溃时最多丢最后一个事务，checkpoint 与数据同事务提交
+BULK_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+)
+
+_WS = " \t\r\n"
+
+
+def iter_conversations(json_path: str, start: int = 0) -> Iterator[Tuple[int, Dict]]:
+    """
+    流式读取导出文件 {"conversations": [ {...}, {...} ]}，一次只解析一个会话。
+    - 内存上限 ≈ 单个会话的大小 + READ_CHUNK_CHARS，而不是整个文件
+    - start 之前的会话只解析不产出（用于断点续传）
+    产出 (会话序号, 会话 dict)。
+    """
+    decoder = json.JSONDecoder()
 
     with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+        buf = ""
+        pos = 0
+        eof = False
+
+        def fill() -> bool:
+            nonlocal buf, pos, eof
+            if eof:
+                return False
+            # 单个会话跨多个块时按倍数扩读，避免反复从头重试解析
+            data = f.read(max(READ_CHUNK_CHARS, len(buf) - pos))
+            if not data:
+                eof = True
+                return False
+            buf = buf[pos:] + data
+            pos = 0
+            return True
+
+        def skip_ws():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in _WS:
+                    pos += 1
+                if pos < len(buf) or not fill():
+                    return
+
+        def expect(ch: str):
+            nonlocal pos
+            skip_ws()
+            if pos >= len(buf) or buf[pos] != ch:
+                got = buf[pos] if pos < len(buf) else "EOF"
+                raise ValueError(f"导出文件格式错误：期望 {ch!r}，实际 {got!r}")
+            pos += 1
+
+        def decode_value():
+            nonlocal pos
+            skip_ws()
+            while True:
+                try:
+                    obj, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    # 可能只是 buffer 里的值还不完整：继续读；读到 EOF 仍失败才是真错误
+                    if not fill():
+                        raise
+                    continue
+                # 数字等标量可能被 buffer 边界截断（如 "12|34"），边界处多读一段再确认
+                if end >= len(buf) and not eof and fill():
+                    continue
+                pos = end
+                return obj
+
+        # 顶层对象：逐个 key 扫描，直到 "conversations"
+        expect("{")
+        while True:
+            key = decode_value()
+            expect(":")
+            if key == "conversations":
+                break
+            decode_value()  # 其它顶层字段：解析后丢弃
+            skip_ws()
+            if pos < len(buf) and buf[pos] == ",":
+                pos += 1
+                continue
+            return  # 没有 conversations 字段
+
+        expect("[")
+        idx = 0
+        skip_ws()
+        if pos < len(buf) and buf[pos] == "]":
+            return
+        while True:
+            conv = decode_value()
+            if idx >= start:
+                yield idx, conv
+            idx += 1
+            skip_ws()
+            if pos < len(buf) and buf[pos] == ",":
+                pos += 1
+                continue
+            expect("]")
+            return
+
+
+def _source_key(json_path: str) -> Tuple[str, int, int]:
+    p = Path(json_path).resolve()
+    st = p.stat()
+    return str(p), int(st.st_size), int(st.st_mtime_ns)
+
+
+def _load_checkpoint(cur, source: str, size: int, mtime_ns: int) -> int:
+    cur.execute(
+        "SELECT next_index, file_size, file_mtime_ns FROM ingest_checkpoint WHERE source=?",
+        (source,),
+    )
+    row = cur.fetchone()
+    # 文件变了（大小/mtime 不一致）就不能续传，从头来
+    if not row or row[1] != size or row[2] != mtime_ns:
+        return 0
+    return int(row[0])
+
 
-    for conv in data["conversations"]:
+def _save_checkpoint(cur, source: str, size: int, mtime_ns: int, next_index: int, done: bool):
+    cur.execute(
+        """
+        INSERT OR REPLACE INTO ingest_checkpoint(source, file_size, file_mtime_ns, next_index, done, updated_at)
+        VALUES(?,?,?,?,?,?)
+        """,
+        (source, size, mtime_ns, next_index, 1 if done else 0, datetime.now().isoformat(timespec="seconds")),
+    )
+
+
+def peak_rss_mb() -> Optional[float]:
+    """进程峰值 RSS（MB）；平台不支持时返回 None。"""
+    try:
+        import resource  # type: ignore
+    except ImportError:
+        try:
+            import psutil  # type: ignore
+        except ImportError:
+            return None
+        mi = psutil.Process().memory_info()
+        return getattr(mi, "peak_wset", mi.rss) / (1024 * 1024)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位是 KB，macOS 是 bytes
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _ingest_stream(conn, json_path: str, *, batch_messages: int, resume: bool):
+    """写连接是 autocommit 模式：每批显式 BEGIN ... COMMIT，checkpoint 与数据同事务。"""
+    cur = conn.cursor()
+
+    source, size, mtime_ns = _source_key(json_path)
+    start = _load_checkpoint(cur, source, size, mtime_ns) if resume else 0
+    if start:
+        print(f"↩️  从 checkpoint 续传：跳过前 {start} 个会话")
+
+    conv_rows, msg_rows = [], []
+    n_convs = n_msgs = 0
+    next_index = start
+    t0 = time.perf_counter()
+
+    def flush(done: bool = False):
+        nonlocal conv_rows, msg_rows
+        cur.execute("BEGIN")
+        if conv_rows:
+            cur.executemany("""
+                INSERT OR REPLACE INTO conversations(conv_id, title, participants, last_active_ts)
+                VALUES(?,?,?,?)
+            """, conv_rows)
+            # 会话元信息变了：各进程的 ConvCatalog 看到计数器变化后增量重载
+            bump_generation(cur, "conversations")
+        if msg_rows:
+            cur.executemany("""
+                INSERT OR REPLACE INTO messages(id, conv_id, sender, ts, text)
+                VALUES(?,?,?,?,?)
+            """, msg_rows)
+        _save_checkpoint(cur, source, size, mtime_ns, next_index, done)
+        conn.commit()
+        conv_rows, msg_rows = [], []
+
+    for idx, conv in iter_conversations(json_path, start=start):
         conv_id = conv["conv_id"]
         title = conv.get("title", "")
         participants = ",".join(conv.get("participants", []))
-        last_ts = conv["messages"][-1]["ts"] if conv["messages"] else None
+        messages = conv["messages"]
+        last_ts = messages[-1]["ts"] if messages else None
 
-        cur.execute("""
-            INSERT OR REPLACE INTO conversations(conv_id, title, participants, last_active_ts)
-            VALUES(?,?,?,?)
-        """, (conv_id, title, participants, last_ts))
+        conv_rows.append((conv_id, title, participants, last_ts))
+        for m in messages:
+            msg_rows.append((m["id"], conv_id, m["sender"], m["ts"], m["text"]))
 
-        for m in conv["messages"]:
-            cur.execute("""
-                INSERT OR REPLACE INTO messages(id, conv_id, sender, ts, text)
-                VALUES(?,?,?,?,?)
-            """, (m["id"], conv_id, m["sender"], m["ts"], m["text"]))
+        n_convs += 1
+        n_msgs += len(messages)
+        next_index = idx + 1
+
+        if len(msg_rows) >= batch_messages:
+            flush()
+
+    flush(done=True)
+    return start, n_convs, n_msgs, time.perf_counter() - t0
+
+
+def ingest(
+    json_path: str,
+    *,
+    batch_messages: int = BATCH_MESSAGES,
+    resume: bool = True,
+    db_path: Optional[Path] = None,
+) -> Dict:
+    """
+    流式批量导入：
+    - 逐个会话解析（内存有界），不再 json.load 整个导出文件
+    - executemany + 大事务批量写入；每个事务同时写入 checkpoint
+    - 崩溃后重跑同一文件，会从上次提交的会话处继续
+    返回吞吐统计（也会打印出来）。
+    """
+    init_db(db_path)
+    with get_manager(db_path).writer() as conn:
+        for p in BULK_PRAGMAS:
+            conn.execute(p)
+        start, n_convs, n_msgs, elapsed = _ingest_stream(
+            conn, json_path, batch_messages=batch_messages, resume=resume
+        )
+
+    stats = {
+        "conversations": n_convs,
+        "messages": n_msgs,
+        "seconds": round(elapsed, 3),
+        "messages_per_sec": round(n_msgs / elapsed, 1) if elapsed > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "resumed_from": start,
+    }
+    rss = f"{stats['peak_rss_mb']:.1f}MB" if stats["peak_rss_mb"] is not None else "n/a"
+    print(
+        f"✅ Ingest done: {n_convs} conversations / {n_msgs} messages in {elapsed:.2f}s "
+        f"({stats['messages_per_sec']} msg/s, peak RSS {rss})"
+    )
+    return stats
 
-    conn.commit()
-    conn.close()
-    print("✅ Ingest done")
 
 if __name__ == "__main__":
-    ingest(str(DATA_DIR / "chat_sample.json"))
\ No newline at end of file
+    ap = argparse.ArgumentParser(description="流式导入聊天导出文件到 memory.db")
+    ap.add_argument("json_path", nargs="?", default=str(DATA_DIR / "chat_sample.json"))
+    ap.add_argument("--batch-messages", type=int, default=BATCH_MESSAGES)
+    ap.add_argument("--no-resume", action="store_true", help="忽略 checkpoint，从头导入")
+    args = ap.parse_args()
+    ingest(args.json_path, batch_messages=args.batch_messages, resume=not args.no_resume)
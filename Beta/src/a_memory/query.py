@@ -1,28 +1,19 @@
 # src/query.py
 from datetime import datetime
 from src.a_memory.search import MemorySearch
-from src.a_memory.db import connect
+from src.a_memory.db import read_conn
+from src.a_memory.conv_catalog import get_catalog
 from src.a_memory.time_parse import parse_time_range_cn
-import re
+from src.a_memory.preprocess import normalize_text
+from src.a_memory.query_cache import QueryCache
+from src.a_memory.conv_router import ConvRouter
 
 def load_conversations():
-    """从 DB 加载会话元信息，用于自动识别 conv_id。"""
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("SELECT conv_id, title, participants FROM conversations")
-    rows = cur.fetchall()
-    conn.close()
-
-    convs = []
-    for cid, title, participants in rows:
-        title = title or ""
-        participants = participants or ""
-        convs.append({
-            "conv_id": cid,
-            "title": title,
-            "participants": [p.strip() for p in participants.split(",") if p.strip()],
-        })
-    return convs
+    """会话元信息（进程级 ConvCatalog，ingest 之后自动增量刷新），用于自动识别 conv_id。"""
+    return [
+        {"conv_id": m.conv_id, "title": m.title, "participants": m.participant_list}
+        for m in get_catalog().all()
+    ]
 
 def detect_conv_id(query: str, convs):
     """
@@ -31,50 +22,40 @@ def detect_conv_id(query: str, convs):
     1) title 的“主关键词”命中（例如 '客户A' / '项目群B' / '产品设计'）
     2) title 全量/部分命中
     3) participant 命中（例如 'coo'/'pm'/'designer'）
+    convs 可以是 ConvRouter（编译一次、ingest 后 refresh 增量更新，查询只扫一遍问题文本），
+    也可以是 load_conversations() 的列表（临时编译一次，结果相同）。
     """
-    q = query.strip()
-
-    # 1) 先抽取 title 主关键词：取 " - " 前面的部分（如 "客户A - 合同与报价" -> "客户A"）
-    for c in convs:
-        main_key = c["title"].split(" - ")[0].strip()
-        if main_key and main_key in q:
-            return c["conv_id"], f"title主关键词命中: {main_key}"
-
-    # 2) title 里任意连续 2~4 个字的片段命中（防止标题较长）
-    for c in convs:
-        title = c["title"].strip()
-        if not title:
-            continue
-        # 粗略拆分：中文/英文都兼容
-        # 取短 token（避免把“合同与报价”这种也能命中）
-        candidates = []
-        # 中文连续词块
-        candidates += re.findall(r"[\u4e00-\u9fff]{2,6}", title)
-        # 英文/数字词块
-        candidates += re.findall(r"[A-Za-z0-9_]{2,20}", title)
-
-        for token in candidates:
-            if token in q:
-                return c["conv_id"], f"title片段命中: {token}"
-
-    # 3) participant 命中
-    q_tokens = set(re.findall(r"[A-Za-z0-9_]+|[\u4e00-\u9fff]{1,6}", q))
-    for c in convs:
-        for p in c["participants"]:
-            if p in q_tokens:
-                return c["conv_id"], f"participant命中: {p}"
-
-    return None, "未识别"
+    router = convs if isinstance(convs, ConvRouter) else ConvRouter.from_convs(convs)
+    return router.route(query)
+
+def parse_intent(query: str, now: datetime, convs, cache: QueryCache | None = None):
+    """
+    解析查询意图：(start_ts, end_ts, conv_id, 会话识别原因)。
+    时间在规范化文本上解析；会话识别用原始问题（标题 / 参与人模式串没有规范化，规范化后全角字符、连续空格会对不上）。
+    给了 cache 时按 (原始问题, now, 会话列表签名) 缓存（ConvRouter 用它的 generation）：规范化相同的两个问题可能命中不同会话，
+    不能共用一个结果；相对时间（"3天前"）随 now 变化、会话增删改都不会命中旧结果。
+    """
+
+    def compute():
+        start_ts, end_ts = parse_time_range_cn(normalize_text(query), now=now)
+        conv, reason = detect_conv_id(query, convs)
+        return start_ts, end_ts, conv, reason
+
+    if cache is None:
+        return compute()
+    if isinstance(convs, ConvRouter):
+        sig = (id(convs), convs.generation)
+    else:
+        sig = hash(tuple((c["conv_id"], c["title"], tuple(c["participants"])) for c in convs))
+    return cache.intents.get_or_compute((query, now.isoformat(), sig), compute)
 
 def detect_conv_from_query(query: str):
     """
     如果用户问题中包含会话标题关键词，则返回 conv_id
     """
-    conn = connect()
-    cur = conn.cursor()
+    cur = read_conn().cursor()
     cur.execute("SELECT conv_id, title FROM conversations")
     rows = cur.fetchall()
-    conn.close()
 
     for cid, title in rows:
         # 简单匹配（后续可以做模糊匹配）
@@ -83,13 +64,8 @@ def detect_conv_from_query(query: str):
     return None
 
 def conv_title(conv_id: str) -> str:
-    """把 conv_id 转成可读的会话标题（客户A/项目群B）。"""
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("SELECT title FROM conversations WHERE conv_id=?", (conv_id,))
-    row = cur.fetchone()
-    conn.close()
-    return row[0] if row and row[0] else conv_id
+    """把 conv_id 转成可读的会话标题（客户A/项目群B）；查内存目录，不走 SQLite。"""
+    return get_catalog().title(conv_id)
 
 
 def normalize_date_input(s: str, is_start: bool) -> str | None:
@@ -111,20 +87,20 @@ def normalize_date_input(s: str, is_start: bool) -> str | None:
 
 def main():
     ms = MemorySearch()
+    router = ConvRouter.from_db()
 
     while True:
         q = input("\n请输入问题（q退出）：").strip()
         if not q:
             continue
         if q.lower() == "q":
+            print("缓存命中:", ms.query_cache.stats())
             break
 
         # 你可以改成 datetime.now()；为了复现“3天前”等效果，先固定 now
         now = datetime(2026, 2, 19, 20, 0, 0)
-        auto_start, auto_end = parse_time_range_cn(q, now=now)
-
-        convs = load_conversations()
-        auto_conv, conv_reason = detect_conv_id(q, convs)
+        router.refresh()  # 只读 ingest 之后新增 / 改过的会话
+        auto_start, auto_end, auto_conv, conv_reason = parse_intent(q, now, router, cache=ms.query_cache)
         if auto_conv:
             print(f"自动识别会话：{conv_title(auto_conv)}（{conv_reason}）")
         else:
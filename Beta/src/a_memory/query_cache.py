@@ -0,0 +1,120 @@
+# src/a_memory/query_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Sequence
+
+import numpy as np
+
+from src.a_memory.config import QUERY_CACHE_SIZE, QUERY_CACHE_TTL_S
+
+_MISSING = object()
+
+
+class LRUCache:
+    """有界 LRU（可选 TTL），线程安全；记录 hits / misses。"""
+
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE, ttl: float | None = QUERY_CACHE_TTL_S):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                value, expires = item
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {"size": len(self), "hits": self.hits, "misses": self.misses, "hit_rate": round(self.hit_rate, 4)}
+
+
+class QueryCache:
+    """
+    查询路径缓存，键都是 normalize_text 之后的查询文本：
+    - embeddings: 查询向量（键里带模型名；set_model 换模型时整体清空）
+    - tokens:     tokenize_for_bm25 的结果（tokenize 内部先做 normalize_text，且 normalize_text 幂等，
+                  所以以规范化文本为键结果不变）
+    - intents:    解析出的时间范围 / 会话（键里带 now 与会话列表签名，相对时间、会话变化都不会命中旧值）
+    """
+
+    def __init__(self, model_name: str, maxsize: int = QUERY_CACHE_SIZE, ttl: float | None = QUERY_CACHE_TTL_S):
+        self.model_name = model_name
+        self.embeddings = LRUCache(maxsize, ttl)
+        self.tokens = LRUCache(maxsize, ttl)
+        self.intents = LRUCache(maxsize, ttl)
+
+    def set_model(self, model_name: str):
+        """embedding 模型（或后端）变化时调用；旧模型的向量全部作废。"""
+        if model_name != self.model_name:
+            self.model_name = model_name
+            self.embeddings.clear()
+
+    def embed(self, texts: Sequence[str], encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        texts 已规范化。命中的直接取；未命中的去重后一次性 encode，再写回缓存。
+        返回 (len(texts), d) float32。
+        """
+        model = self.model_name
+        vecs: list = [self.embeddings.get((model, t)) for t in texts]
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vecs) if v is None))
+        if missing:
+            fresh = np.asarray(encode(missing), dtype="float32")
+            by_text = {}
+            for t, v in zip(missing, fresh):
+                v = v.copy()
+                v.flags.writeable = False
+                by_text[t] = v
+                self.embeddings.put((model, t), v)
+            vecs = [by_text[t] if v is None else v for t, v in zip(texts, vecs)]
+        return np.stack(vecs) if vecs else np.zeros((0, 0), dtype="float32")
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "embeddings": self.embeddings.stats(),
+            "tokens": self.tokens.stats(),
+            "intents": self.intents.stats(),
+        }
+
+    def clear(self):
+        self.embeddings.clear()
+        self.tokens.clear()
+        self.intents.clear()
@@ -1,15 +1,23 @@
 # src/search.py
-import pickle
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from dateutil.parser import isoparse
-from src.a_memory.db import connect
+from src.a_memory.hydrator import get_hydrator
+from src.a_memory.chunking import _epoch_us
+from src.a_memory.query_cache import QueryCache
+from src.a_memory.encoder import get_encoder
+from src.a_memory.segments import SegmentSet
+from src.a_memory.snapshot import SnapshotPaths, read_manifest, resolve_paths
+from src.a_memory.utterances import Utterances
+from src.a_memory.shards import ShardedScorer
 
 from src.a_memory.config import (
-    EMBEDDING_MODEL,
-    BM25_PATH,
-    CHUNKS_PATH,
-    EMBEDDINGS_PATH,
+    ANN_BACKEND,
+    EMBEDDING_STORAGE,
+    FUSION_VECTOR_WEIGHT,
+    FUSION_BM25_WEIGHT,
+    RETRIEVAL_CANDIDATES,
+    SEARCH_SHARDS,
+    SEARCH_THREADS,
 )
 
 from src.a_memory.preprocess import tokenize_for_bm25, normalize_text
@@ -37,33 +45,94 @@ def time_overlap(chunk_start: str, chunk_end: str, q_start: str | None, q_end: s
     return True
 
 def fetch_messages_by_ids(ids: list[str]):
-    conn = connect()
-    cur = conn.cursor()
-    q = ",".join(["?"] * len(ids))
-    cur.execute(f"SELECT id, sender, ts, text FROM messages WHERE id IN ({q})", ids)
-    rows = cur.fetchall()
-    conn.close()
-    # 按 ts 排序
-    rows.sort(key=lambda r: r[2])
-    return [{"id": r[0], "sender": r[1], "ts": r[2], "text": r[3]} for r in rows]
+    # 一次 json_each 查询 + 消息 LRU（见 hydrator.py）；按 ts 排序
+    rows = sorted(get_hydrator().fetch(ids).values(), key=lambda m: m["ts"])
+    return [{"id": m["id"], "sender": m["sender"], "ts": m["ts"], "text": m["text"]} for m in rows]
 
 class MemorySearch:
-    def __init__(self):
-        self.model = SentenceTransformer(EMBEDDING_MODEL)
-
-        with open(BM25_PATH, "rb") as f:
-            self.bm25 = pickle.load(f)
-
-        with open(CHUNKS_PATH, "rb") as f:
-            self.chunks = pickle.load(f)
-
-        self.embeddings = np.load(str(EMBEDDINGS_PATH)).astype("float32")
-        if len(self.chunks) != self.embeddings.shape[0]:
+    def __init__(
+        self,
+        encoder=None,
+        ann_backend: str = ANN_BACKEND,
+        embedding_storage: str = EMBEDDING_STORAGE,
+        vector_weight: float = FUSION_VECTOR_WEIGHT,
+        bm25_weight: float = FUSION_BM25_WEIGHT,
+        candidates: int = RETRIEVAL_CANDIDATES,
+        snapshot: SnapshotPaths | None = None,
+        query_cache: QueryCache | None = None,
+        shards: int = SEARCH_SHARDS,
+        threads: int = SEARCH_THREADS,
+    ):
+        """
+        参数默认取 config；基准脚本用它们对比不同检索配置。
+        encoder / query_cache 可传入已有实例共享（热加载新快照时不用重新加载模型、缓存不失效）。
+        snapshot 默认为 CURRENT 指向的快照（还没有快照时用 DATA_DIR 下的旧平铺布局）。
+        """
+        # 编码器后端（config.ENCODER_BACKEND）：torch / onnx / onnx-int8，encode 接口一致
+        self.model = encoder if encoder is not None else get_encoder()
+
+        paths = snapshot if snapshot is not None else resolve_paths()
+        self.snapshot = paths
+        self.manifest = read_manifest(paths)
+        if self.manifest and self.manifest.get("embedding_model") != self.model.key:
             raise RuntimeError(
-                f"chunks数量({len(self.chunks)}) 与 embeddings行数({self.embeddings.shape[0]}) 不一致，"
-                "请重新运行 index_build.py"
+                f"快照 {paths.name} 的 embedding 模型（{self.manifest.get('embedding_model')}）"
+                f"与当前编码器（{self.model.key}）不一致，请重新运行 index_build.py"
             )
 
+        # 融合参数：向量 / BM25 各取前 candidates 条，按权重线性融合
+        self.vector_weight = vector_weight
+        self.bm25_weight = bm25_weight
+        self.candidates = candidates
+
+        # 按月份分区的索引分段（旧平铺布局整体算一个分段）：每个分段有自己的列式 chunk 存储、mmap 向量、
+        # 倒排 BM25（idf / avgdl 用快照级的全局统计量）、ANN 索引与过滤索引，都在第一次用到时才打开；
+        # EMBEDDING_STORAGE=float16/int8 时粗排走量化矩阵、top 候选再 float32 精排；
+        # ANN_BACKEND=hnsw/ivf 时每个分段从自己的 faiss.index 加载
+        self.embedding_storage = embedding_storage
+        self.ann_backend = ann_backend
+        self.segments = SegmentSet.open(
+            paths, embedding_storage=embedding_storage, ann_backend=ann_backend, manifest=self.manifest
+        )
+
+        # 各分段的行拼成全局行号打分；shards > 1 时切成分片在线程池里并行（结果与 1 相同）
+        self.scorer = ShardedScorer(self.segments, shards, threads)
+
+        # 查询路径缓存：查询向量 / BM25 分词 / 意图解析（键为规范化后的查询文本）
+        self.query_cache = query_cache if query_cache is not None else QueryCache(self.model.key)
+
+    @property
+    def snapshot_id(self) -> str | None:
+        """当前加载的快照名；旧平铺布局为 None。"""
+        return self.snapshot.name if self.manifest else None
+
+    @property
+    def num_chunks(self) -> int:
+        """可检索的 chunk 数（不含被增量构建替换掉的行）。"""
+        return self.segments.live_count
+
+    def utterances(self, row: int, chunk_id: str) -> Utterances | None:
+        """
+        检索结果（"row" / "chunk_id"）对应 chunk 的逐句特征（建索引时算好的，见 utterances.py），不放进结果 dict 里。
+        行号已不是这个 chunk（期间切换了快照）或存储里没有特征时返回 None，调用方现场计算。
+        """
+        if row < 0 or not len(self.segments):
+            return None
+        seg, local = self.segments.locate(row)
+        if local >= seg.rows or seg.chunks.chunk_id(local) != chunk_id:
+            return None
+        return seg.chunks.utterances(local)
+
+    def warm(self) -> "MemorySearch":
+        """打开快照里的全部分段文件（默认第一次用到时才打开）；服务端热加载在后台线程里调用。"""
+        self.segments.warm()
+        return self
+
+    def close(self):
+        """释放 mmap 与分片线程池（热切换后旧实例不再被使用时调用）。"""
+        self.scorer.close()
+        self.segments.close()
+
     def search(
         self,
         query: str,
@@ -71,66 +140,98 @@ class MemorySearch:
         conv_id: str | None = None,
         start_ts: str | None = None,
         end_ts: str | None = None,
+        sender: str | None = None,
     ):
-        if not self.chunks:
+        return self.search_batch(
+            [query], top_k=top_k, conv_id=conv_id, start_ts=start_ts, end_ts=end_ts, sender=sender
+        )[0]
+
+    def search_batch(
+        self,
+        queries: list[str],
+        top_k: int = 5,
+        conv_id: str | None = None,
+        start_ts: str | None = None,
+        end_ts: str | None = None,
+        sender: str | None = None,
+    ) -> list[list[dict]]:
+        """
+        一批查询（共用同一组过滤条件）：一次 encode、一次矩阵乘打分，BM25 与融合逐条做。
+        返回与 queries 对齐的结果列表；每条结果与单独调用 search 相同
+        （向量分数由 EmbeddingMatrix.rescore 逐行计算，不受批大小影响）。
+        """
+        if not queries:
             return []
+        if not self.num_chunks:
+            return [[] for _ in queries]
+
+        # ===== 0) 先过滤再打分：conv / sender / 时间 → 每个分段的候选行（None 表示不过滤）=====
+        # 时间范围与分段的时间边界不相交时整个分段跳过
+        unfiltered = not conv_id and sender is None and not start_ts and not end_ts
+        cand = self.segments.candidates(
+            conv_id=conv_id or None,
+            sender=sender,
+            q_start=_epoch_us(start_ts) if start_ts else None,
+            q_end=_epoch_us(end_ts) if end_ts else None,
+        )
+        if cand is not None and not any(c is None or len(c) for c in cand):
+            return [[] for _ in queries]
 
         # ===== 1) 向量检索：点积=余弦（因为建库时 normalize_embeddings=True）=====
-        q = self.model.encode([normalize_text(query)], normalize_embeddings=True).astype("float32")[0]
-        vec_scores = self.embeddings @ q  # shape=(N,)
-
-        # 先取全局 top50，再做过滤（MVP 简化）
-        top50 = vec_scores.argsort()[-50:][::-1]
-
-        vec_hits = []
-        for idx in top50:
-            c = self.chunks[idx]
-            if conv_id and c.conv_id != conv_id:
-                continue
-            if not time_overlap(c.time_start, c.time_end, start_ts, end_ts):
-                continue
-            vec_hits.append((idx, float(vec_scores[idx])))
-
-        # ===== 2) BM25 关键词召回（同样过滤）=====
-        bm_scores = self.bm25.get_scores(tokenize_for_bm25(query))
-        # 取 top50
-        bm_top = np.argsort(bm_scores)[-50:][::-1]
-
-        bm_hits = []
-        for idx in bm_top:
-            c = self.chunks[idx]
-            if conv_id and c.conv_id != conv_id:
-                continue
-            if not time_overlap(c.time_start, c.time_end, start_ts, end_ts):
-                continue
-            bm_hits.append((idx, float(bm_scores[idx])))
+        normalized = [normalize_text(q) for q in queries]
+        Q = self.query_cache.embed(
+            normalized,
+            lambda texts: self.model.encode(texts, normalize_embeddings=True),
+        )
+        if unfiltered and self.ann_backend != "brute":
+            # 各分段的 ANN 索引各取前 k 再归并（剔除墓碑行）
+            vec_top = [rows for rows, _ in self.scorer.ann_top(Q, self.candidates)]
+        else:
+            # 全量（brute）或过滤后的候选行（候选集已经很小，不走 ANN），按分片打分再堆归并
+            vec_top = [rows for rows, _ in self.scorer.vector_top(Q, self.candidates, cand)]
+
+        return [
+            self._fuse(norm, q, rows, cand, top_k)
+            for norm, q, rows in zip(normalized, Q, vec_top)
+        ]
+
+    def _fuse(self, norm: str, q: np.ndarray, vec_rows: np.ndarray, cand: list | None, top_k: int) -> list[dict]:
+        # 向量候选统一用 rescore 取分（ANN 后端给的分数可能有精度损失）
+        vec_scores = self.scorer.rescore(vec_rows, q)
+        vec_hits = [(int(idx), float(s)) for idx, s in zip(vec_rows, vec_scores)]
+
+        # ===== 2) BM25 关键词召回：只遍历查询词的倒排链（同样只在候选行上）=====
+        tokens = self.query_cache.tokens.get_or_compute(norm, lambda: tokenize_for_bm25(norm))
+        bm_top, bm_top_scores, bm_max = self.scorer.bm25_top(tokens, self.candidates, cand)
+        bm_hits = [(int(r), float(s)) for r, s in zip(bm_top, bm_top_scores)]
 
         # ===== 3) 融合排序 =====
-        # 归一化 bm25
-        bm_max = float(np.max(bm_scores)) if np.max(bm_scores) > 0 else 1.0
+        # 归一化 bm25（在候选集内归一化；不含查询词的文档分数为 0，不影响最大值）
+        bm_max = bm_max if bm_max > 0 else 1.0
 
         score_map = {}
         for idx, s in vec_hits:
-            score_map[idx] = score_map.get(idx, 0.0) + 0.6 * s
+            score_map[idx] = score_map.get(idx, 0.0) + self.vector_weight * s
         for idx, s in bm_hits:
-            score_map[idx] = score_map.get(idx, 0.0) + 0.4 * (s / bm_max)
+            score_map[idx] = score_map.get(idx, 0.0) + self.bm25_weight * (s / bm_max)
 
         ranked = sorted(score_map.items(), key=lambda x: x[1], reverse=True)[:top_k]
 
         results = []
         for idx, s in ranked:
-            c = self.chunks[idx]
             conf = "高" if s > 0.8 else ("中" if s > 0.5 else "低")
+            seg, row = self.segments.locate(idx)
+            chunks = seg.chunks
             results.append(
                 {
-                    "chunk_id": c.chunk_id,
-                    "conv_id": c.conv_id,
-                    "time_range": (c.time_start, c.time_end),
+                    "chunk_id": chunks.chunk_id(row),
+                    "conv_id": chunks.conv_id(row),
+                    "time_range": chunks.time_range(row),
                     "score": float(s),
                     "confidence": conf,
-                    "text": c.text,
-                    "message_ids": c.message_ids,
+                    "text": chunks.text(row),
+                    "message_ids": chunks.message_ids(row),
+                    "row": idx,
                 }
             )
         return results
-
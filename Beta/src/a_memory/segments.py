@@ -0,0 +1,583 @@
+# src/a_memory/segments.py
+"""
+按时间分区的不可变索引分段：
+    <快照>/segments/<分段名>/  chunk_store/  embeddings.npy(+量化 sidecar)  bm25_index/  faiss.index
+    <快照>/bm25_stats/        meta.json + 每个分段一份 <分段名>.idf.npy / <分段名>.doc_norm.npy
+
+- 全量构建按 chunk 起始时间的月份分组：较早的月份各成一个封存（sealed）分段，最新的月份是热分段
+- 增量构建只重写热分段（尾块 + 新消息；跨月时热分段里较早的月份封存成新分段），封存分段从上一个快照硬链接过来；
+  封存分段里被替换掉的旧尾块记在 manifest 的 deleted 里（墓碑），检索时排除
+- manifest 的 segments 记录每个分段的月份、行数、墓碑与时间边界（epoch 微秒）：
+  与查询时间范围不相交的分段整个跳过，文件都不打开
+- BM25 的 idf / avgdl 按全部分段的存活文档统一计算（bm25_index.merged_stats），分数与单个大索引一致
+- 全局行号 = 分段 base（manifest 顺序累加的行数）+ 分段内行号
+
+compactor（服务端的 SegmentCompactor，或 python -m src.a_memory.segments --compact）把相邻的小分段合并、
+墓碑过多的分段重写，结果发布为新快照，服务端照常热切换。
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.a_memory.ann import build_ann_index, load_ann_index
+from src.a_memory.bm25_index import BM25Index, merged_stats
+from src.a_memory.chunk_store import ChunkStore, write_chunk_store
+from src.a_memory.chunking import Chunk, _epoch_us
+from src.a_memory.config import (
+    ANN_BACKEND,
+    EMBEDDING_STORAGE,
+    SEGMENT_COMPACT_INTERVAL_S,
+    SEGMENT_MAX_DELETED,
+    SEGMENT_MAX_ROWS,
+    SEGMENT_MIN_ROWS,
+    SNAPSHOTS_DIR,
+)
+from src.a_memory.filters import ChunkFilter
+from src.a_memory.snapshot import (
+    FileLock,
+    SnapshotConflict,
+    SnapshotPaths,
+    new_snapshot,
+    publish,
+    read_manifest,
+    resolve_paths,
+    write_manifest,
+)
+from src.a_memory.vectors import EmbeddingMatrix, save_embeddings
+
+_EMPTY = np.zeros(0, dtype=np.int64)
+COMPACTOR_LOCK_NAME = "COMPACTOR.lock"
+
+
+def month_of(ts: str) -> str:
+    """ISO 时间 → 'YYYY-MM'。"""
+    return ts[:7]
+
+
+def group_by_month(chunks: Sequence[Chunk]) -> List[Tuple[str, List[int]]]:
+    """按起始时间的月份分组：[(月份, 行号)]，月份升序，组内保持原顺序。"""
+    groups: Dict[str, List[int]] = {}
+    for i, c in enumerate(chunks):
+        groups.setdefault(month_of(c.time_start), []).append(i)
+    return sorted(groups.items())
+
+
+# ---------- 写 ----------
+def write_segment(
+    snap: SnapshotPaths,
+    chunks: List[Chunk],
+    embeddings: np.ndarray,
+    doc_freqs: List[Dict[str, int]],
+    months: Tuple[str, str],
+    sealed: bool = True,
+) -> dict:
+    """把一组 chunk 写成 snap 下的一个新分段，返回它在 manifest 里的条目。"""
+    name = f"{months[0] if sealed else 'hot'}-{uuid.uuid4().hex[:6]}"
+    seg = snap.segment(name)
+    seg.root.mkdir(parents=True)
+    save_embeddings(embeddings, seg.embeddings)
+    build_ann_index(embeddings, ANN_BACKEND, seg.ann_index)
+    BM25Index.build(doc_freqs).save(seg.bm25_index)
+    write_chunk_store(seg.chunk_store, chunks)
+    return {
+        "name": name,
+        "months": list(months),
+        "sealed": sealed,
+        "rows": len(chunks),
+        "deleted": [],
+        "t_min": min(_epoch_us(c.time_start) for c in chunks),
+        "t_max": max(_epoch_us(c.time_end) for c in chunks),
+    }
+
+
+def link_segment(src: SnapshotPaths, snap: SnapshotPaths, name: str):
+    """上一个快照的分段原样放进新快照：逐文件硬链接（不占额外空间），文件系统不支持时复制。"""
+    dst = snap.segment(name).root
+    for p in sorted(src.root.rglob("*")):
+        target = dst / p.relative_to(src.root)
+        if p.is_dir():
+            target.mkdir(parents=True, exist_ok=True)
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(p, target)
+        except OSError:
+            shutil.copy2(p, target)
+
+
+def sort_entries(entries: List[dict]) -> List[dict]:
+    """manifest 顺序：封存分段按起始月份（同月保持原顺序），热分段在最后。"""
+    return sorted(entries, key=lambda e: (not e["sealed"], e["months"][0]))
+
+
+def write_bm25_stats(snap: SnapshotPaths, segments: "SegmentSet") -> dict:
+    """全部分段的存活文档合起来算 BM25 统计量，每个分段写一份换算到本地词 id / 行号的 idf 与 doc_norm。"""
+    parts = []
+    for seg in segments:
+        live = None
+        if len(seg.deleted):
+            live = np.ones(seg.rows, dtype=bool)
+            live[seg.deleted] = False
+        parts.append((seg.bm25, live))
+    stats, per_part = merged_stats(parts)
+    out = snap.bm25_stats
+    out.mkdir(parents=True, exist_ok=True)
+    for seg, (idf, doc_norm) in zip(segments, per_part):
+        np.save(out / f"{seg.name}.idf.npy", idf)
+        np.save(out / f"{seg.name}.doc_norm.npy", doc_norm)
+    with open(out / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(stats, f)
+    return stats
+
+
+def finish_snapshot(
+    snap: SnapshotPaths,
+    entries: List[dict],
+    state: dict,
+    info: dict,
+    parent: Optional[SnapshotPaths] = None,
+    base: Path = SNAPSHOTS_DIR,
+) -> SnapshotPaths:
+    """
+    分段都写好之后：算全局 BM25 统计量，补上增量状态里每个会话尾块的全局行号，写 manifest 并发布。
+    parent 给定时只在 CURRENT 仍指向它时发布（snapshot.publish 的 expect）。
+    """
+    segments = SegmentSet.open(snap, manifest={"segments": entries}, global_stats=False)
+    try:
+        stats = write_bm25_stats(snap, segments)
+        tails = segments.tail_rows()
+        live = segments.live_count
+    finally:
+        segments.close()
+    for cid, s in state["convs"].items():
+        s["tail_row"] = tails.get(cid)
+    with open(snap.state, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    write_manifest(
+        snap,
+        {
+            **info,
+            "layout": "segments",
+            "chunks": live,
+            "bm25_docs": stats["corpus_size"],
+            "parent": parent.name if parent is not None else None,
+            "segments": entries,
+        },
+        parent=parent,
+    )
+    return publish(snap, base, expect=parent.name if parent is not None else None)
+
+
+# ---------- 读 ----------
+class Segment:
+    """
+    快照里的一个只读分段。行数 / 墓碑 / 时间边界来自 manifest，不碰文件；
+    chunk 存储、向量、BM25、ANN、过滤索引第一次用到时才打开（时间范围不相交的分段一直不打开）。
+    满足 shards.ShardedScorer 的 part 接口（embeddings / bm25 / rows / base / ann / deleted）。
+    """
+
+    def __init__(
+        self,
+        paths: SnapshotPaths,
+        entry: dict,
+        base: int = 0,
+        stats: Optional[Tuple[dict, Path]] = None,
+        embedding_storage: str = EMBEDDING_STORAGE,
+        ann_backend: str = ANN_BACKEND,
+    ):
+        self.paths = paths
+        self.name = entry.get("name", paths.name)
+        self.months = tuple(entry.get("months") or ())
+        self.sealed = bool(entry.get("sealed", True))
+        self.base = base
+        self.deleted = np.unique(np.asarray(entry.get("deleted") or [], dtype=np.int64))
+        self.t_min = entry.get("t_min")
+        self.t_max = entry.get("t_max")
+        self.stats = stats  # (全局统计量, bm25_stats 目录)；None 时用分段自己的 idf / avgdl
+        self.embedding_storage = embedding_storage
+        self.ann_backend = ann_backend
+        self._lock = threading.RLock()  # 打开 bm25 / ann / filters 时会嵌套打开 chunks / embeddings
+        self._opened: Dict[str, object] = {}
+        self._live: Optional[np.ndarray] = None
+        # 旧平铺布局没有 manifest 条目：打开 chunk 存储数行数
+        self.rows = int(entry["rows"]) if "rows" in entry else len(self.chunks)
+
+    def _get(self, key: str, factory):
+        obj = self._opened.get(key)
+        if obj is None:
+            with self._lock:
+                obj = self._opened.get(key)
+                if obj is None:
+                    obj = self._opened[key] = factory()
+        return obj
+
+    @property
+    def chunks(self) -> ChunkStore:
+        return self._get("chunks", lambda: ChunkStore.open(self.paths.chunk_store))
+
+    def _open_embeddings(self) -> EmbeddingMatrix:
+        m = EmbeddingMatrix(self.paths.embeddings, storage=self.embedding_storage)
+        if m.shape[0] != self.rows:
+            raise RuntimeError(
+                f"分段 {self.name}：chunks数量({self.rows}) 与 embeddings行数({m.shape[0]}) 不一致，"
+                "请重新运行 index_build.py"
+            )
+        return m
+
+    @property
+    def embeddings(self) -> EmbeddingMatrix:
+        return self._get("embeddings", self._open_embeddings)
+
+    def _open_bm25(self) -> BM25Index:
+        raw = self._get("bm25_raw", lambda: BM25Index.open(self.paths.bm25_index))
+        if self.stats is None:
+            return raw
+        meta, root = self.stats
+        return raw.with_stats(
+            np.load(root / f"{self.name}.idf.npy", mmap_mode="r"),
+            np.load(root / f"{self.name}.doc_norm.npy", mmap_mode="r"),
+            meta,
+        )
+
+    @property
+    def bm25(self) -> BM25Index:
+        return self._get("bm25", self._open_bm25)
+
+    @property
+    def ann(self):
+        return self._get("ann", lambda: load_ann_index(self.embeddings, backend=self.ann_backend, path=self.paths.ann_index))
+
+    @property
+    def filters(self) -> ChunkFilter:
+        return self._get("filters", lambda: ChunkFilter(self.chunks))
+
+    @property
+    def live_count(self) -> int:
+        return self.rows - len(self.deleted)
+
+    def warm(self):
+        """
+        把懒打开的全部打开：chunk 存储、向量、BM25（含全局统计量）、ANN、过滤索引。
+        服务端热加载时在后台线程里调用，第一条请求不再付打开 mmap / 建过滤索引的代价；
+        打开之后文件被删（GC）也不影响已映射的内容。
+        """
+        self.chunks, self.embeddings, self.bm25, self.ann, self.filters
+        self.live_rows()
+
+    def live_rows(self) -> np.ndarray:
+        """未被删除的本地行号（升序）。"""
+        if self._live is None:
+            self._live = np.setdiff1d(np.arange(self.rows, dtype=np.int64), self.deleted, assume_unique=True)
+        return self._live
+
+    def overlaps(self, q_start: Optional[int], q_end: Optional[int]) -> bool:
+        """分段时间边界与查询范围是否相交（同 ChunkFilter：time_end >= q_start 且 time_start <= q_end）。"""
+        if q_start is not None and self.t_max is not None and self.t_max < q_start:
+            return False
+        if q_end is not None and self.t_min is not None and self.t_min > q_end:
+            return False
+        return True
+
+    def candidates(
+        self,
+        conv_id: Optional[str] = None,
+        sender: Optional[str] = None,
+        q_start: Optional[int] = None,
+        q_end: Optional[int] = None,
+    ) -> Optional[np.ndarray]:
+        """本分段的候选行（本地行号、升序，已去掉墓碑）；None 表示全部行。"""
+        if not self.rows or not self.overlaps(q_start, q_end):
+            return _EMPTY
+        if conv_id is None and sender is None and q_start is None and q_end is None:
+            return self.live_rows() if len(self.deleted) else None
+        rows = self.filters.candidates(
+            conv_code=self.chunks.conv_code_of(conv_id) if conv_id is not None else None,
+            sender=sender,
+            q_start=q_start,
+            q_end=q_end,
+        )
+        if len(self.deleted) and len(rows):
+            rows = rows[~np.isin(rows, self.deleted, assume_unique=True)]
+        return rows
+
+    def close(self):
+        for key in ("chunks", "bm25_raw"):
+            obj = self._opened.get(key)
+            if obj is not None:
+                obj.close()
+
+
+class SegmentSet:
+    """一个快照的全部分段（manifest 顺序）；旧平铺布局 / 分段之前的快照整体是一个分段。"""
+
+    def __init__(self, segments: List[Segment]):
+        self.segments = segments
+        self.bases = np.asarray([s.base for s in segments], dtype=np.int64)
+
+    @classmethod
+    def open(
+        cls,
+        paths: SnapshotPaths,
+        embedding_storage: str = EMBEDDING_STORAGE,
+        ann_backend: str = ANN_BACKEND,
+        manifest: Optional[dict] = None,
+        global_stats: bool = True,
+    ) -> "SegmentSet":
+        manifest = read_manifest(paths) if manifest is None else manifest
+        entries = (manifest or {}).get("segments")
+        if entries is None:
+            return cls([Segment(paths, {"name": paths.name}, 0, None, embedding_storage, ann_backend)])
+        stats = None
+        if global_stats and (paths.bm25_stats / "meta.json").exists():
+            with open(paths.bm25_stats / "meta.json", "r", encoding="utf-8") as f:
+                stats = (json.load(f), paths.bm25_stats)
+        segments, base = [], 0
+        for e in entries:
+            segments.append(Segment(paths.segment(e["name"]), e, base, stats, embedding_storage, ann_backend))
+            base += int(e["rows"])
+        return cls(segments)
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def __iter__(self) -> Iterator[Segment]:
+        return iter(self.segments)
+
+    def __getitem__(self, i: int) -> Segment:
+        return self.segments[i]
+
+    @property
+    def live_count(self) -> int:
+        return sum(s.live_count for s in self.segments)
+
+    def locate(self, row: int) -> Tuple[Segment, int]:
+        """全局行号 → (分段, 本地行号)。"""
+        i = int(np.searchsorted(self.bases, row, side="right")) - 1
+        seg = self.segments[i]
+        return seg, int(row) - seg.base
+
+    def candidates(
+        self,
+        conv_id: Optional[str] = None,
+        sender: Optional[str] = None,
+        q_start: Optional[int] = None,
+        q_end: Optional[int] = None,
+    ) -> Optional[list]:
+        """
+        与分段对齐的候选行列表（元素为 None 表示该分段全部行，空数组表示跳过），直接交给 ShardedScorer；
+        没有任何条件且没有墓碑时返回 None。时间范围不相交的分段不打开。
+        """
+        if conv_id is None and sender is None and q_start is None and q_end is None and not any(
+            len(s.deleted) for s in self.segments
+        ):
+            return None
+        return [s.candidates(conv_id, sender, q_start, q_end) for s in self.segments]
+
+    def warm(self) -> "SegmentSet":
+        """打开全部分段（见 Segment.warm）。"""
+        for s in self.segments:
+            s.warm()
+        return self
+
+    def tail_rows(self) -> Dict[str, int]:
+        """每个会话最后一个 chunk（开放尾块）的全局行号：存活行里 (time_start, 全局行号) 最大的那个。"""
+        best: Dict[str, Tuple[int, int]] = {}
+        for seg in self.segments:
+            live = seg.live_rows()
+            if not len(live):
+                continue
+            codes = np.asarray(seg.chunks.conv_code)[live]
+            ts = np.asarray(seg.chunks.time_start)[live]
+            order = np.lexsort((live, ts, codes))
+            last = order[np.r_[np.flatnonzero(np.diff(codes[order])), len(order) - 1]]
+            for code, t, r in zip(codes[last].tolist(), ts[last].tolist(), live[last].tolist()):
+                cid = seg.chunks.convs[code]
+                key = (t, seg.base + r)
+                if cid not in best or key > best[cid]:
+                    best[cid] = key
+        return {cid: row for cid, (_, row) in best.items()}
+
+    def close(self):
+        for s in self.segments:
+            s.close()
+
+
+# ---------- 合并 ----------
+def _dirty(entry: dict, max_deleted: float) -> bool:
+    return bool(entry["rows"]) and len(entry.get("deleted") or ()) / entry["rows"] > max_deleted
+
+
+def plan_compaction(
+    entries: List[dict],
+    min_rows: int = SEGMENT_MIN_ROWS,
+    max_rows: int = SEGMENT_MAX_ROWS,
+    max_deleted: float = SEGMENT_MAX_DELETED,
+) -> List[List[int]]:
+    """
+    要重写的分段组（manifest 下标，每组写成一个新分段）：
+    - 相邻的封存小分段（存活行数 < min_rows）合并，合并后不超过 max_rows
+    - 墓碑占比超过 max_deleted 的封存分段重写（与相邻的小分段一起）
+    热分段不参与；只有一个干净的小分段、没有可合并的邻居时不动它。
+    """
+    groups: List[List[int]] = []
+    run: List[int] = []
+    run_rows = 0
+
+    def close_run(run: List[int]):
+        if len(run) > 1 or any(_dirty(entries[i], max_deleted) for i in run):
+            groups.append(run)
+
+    for i, e in enumerate(entries):
+        live = e["rows"] - len(e.get("deleted") or ())
+        if e["sealed"] and (live < min_rows or _dirty(e, max_deleted)):
+            if run and run_rows + live > max_rows:
+                close_run(run)
+                run, run_rows = [], 0
+            run.append(i)
+            run_rows += live
+        else:
+            close_run(run)
+            run, run_rows = [], 0
+    close_run(run)
+    return groups
+
+
+def _rewrite(snap: SnapshotPaths, group: List[Segment]) -> Optional[dict]:
+    """几个分段的存活行按顺序写成一个新的封存分段；全部行都已删除时返回 None。"""
+    chunks: List[Chunk] = []
+    embeddings, doc_freqs = [], []
+    for seg in group:
+        live = seg.live_rows()
+        chunks += [seg.chunks.get(int(r)) for r in live]
+        embeddings.append(np.asarray(seg.embeddings.exact[live], dtype="float32"))
+        doc_freqs += list(seg.bm25.iter_doc_freqs(live.tolist()))
+    if not chunks:
+        return None
+    months = (min(s.months[0] for s in group), max(s.months[-1] for s in group))
+    return write_segment(snap, chunks, np.concatenate(embeddings), doc_freqs, months, sealed=True)
+
+
+def compact(
+    base: Path = SNAPSHOTS_DIR,
+    min_rows: int = SEGMENT_MIN_ROWS,
+    max_rows: int = SEGMENT_MAX_ROWS,
+    max_deleted: float = SEGMENT_MAX_DELETED,
+) -> Optional[SnapshotPaths]:
+    """按 plan_compaction 重写当前快照的分段并发布为新快照；没有要合并的返回 None。"""
+    paths = resolve_paths(base)
+    manifest = read_manifest(paths)
+    entries = (manifest or {}).get("segments")
+    if not entries:
+        return None
+    groups = plan_compaction(entries, min_rows, max_rows, max_deleted)
+    if not groups:
+        return None
+    with open(paths.state, "r", encoding="utf-8") as f:
+        state = json.load(f)
+
+    segments = SegmentSet.open(paths, manifest=manifest, global_stats=False)
+    snap = new_snapshot(base)
+    try:
+        heads = {g[0]: g for g in groups}
+        merged = {i for g in groups for i in g}
+        out = []
+        for i, e in enumerate(entries):
+            if i in heads:
+                entry = _rewrite(snap, [segments[j] for j in heads[i]])
+                if entry is not None:
+                    out.append(entry)
+            elif i not in merged:
+                link_segment(segments[i].paths, snap, e["name"])
+                out.append(e)
+        info = {k: manifest[k] for k in ("dim", "embedding_model", "embedding_storage", "ann_backend") if k in manifest}
+        final = finish_snapshot(snap, out, state, info, parent=paths, base=base)
+    except BaseException:
+        shutil.rmtree(snap.root, ignore_errors=True)
+        raise
+    finally:
+        segments.close()
+    print(f"✅ compacted {sum(len(g) for g in groups)} segments into {len(groups)}: {final.name}")
+    return final
+
+
+def compactor_lock(base: Path = SNAPSHOTS_DIR) -> FileLock:
+    """compactor 的 leader 锁：同一份 SNAPSHOTS_DIR 同时只有一个进程（服务端某个 worker 或命令行）做合并。"""
+    return FileLock(Path(base) / COMPACTOR_LOCK_NAME)
+
+
+class SegmentCompactor:
+    """
+    服务端后台线程：每 interval_s 秒检查一次当前快照，有要合并的分段就 compact
+    （发布的新快照由 SnapshotWatcher 照常热切换）。与增量构建同时发布时后发布的一方放弃，下一轮基于新快照重算。
+    每个 uvicorn worker 都会启动一个，但只有拿到 compactor_lock 的那个（leader）真正合并，锁一直持有到 close；
+    leader 退出后由别的 worker 在下一轮接手。
+    """
+
+    def __init__(self, interval_s: float = SEGMENT_COMPACT_INTERVAL_S, base: Path = SNAPSHOTS_DIR):
+        self.interval_s = interval_s
+        self.base = Path(base)
+        self.runs = 0
+        self.leader = False
+        self._lock = compactor_lock(self.base)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="segment-compactor", daemon=True)
+
+    def check(self) -> bool:
+        """检查一次；发布了合并后的快照返回 True。不是 leader（别的进程在合并）时什么都不做。"""
+        if not self.leader:
+            self.leader = self._lock.acquire(blocking=False)
+            if not self.leader:
+                return False
+        try:
+            done = compact(self.base) is not None
+        except SnapshotConflict:
+            return False
+        except Exception as e:
+            print(f"⚠️ 分段合并失败：{e}")
+            return False
+        self.runs += done
+        return done
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.check()
+
+    def start(self) -> "SegmentCompactor":
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._lock.release()
+        self.leader = False
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="索引分段：查看 / 合并")
+    ap.add_argument("--compact", action="store_true", help="按 SEGMENT_* 配置合并一次当前快照的分段（可放进 cron）")
+    args = ap.parse_args()
+
+    if args.compact:
+        lock = compactor_lock()
+        if not lock.acquire(blocking=False):
+            print("⚠️ 另一个进程（服务端 compactor）正在负责合并，跳过")
+        else:
+            try:
+                final = compact()
+            finally:
+                lock.release()
+            print("✅ nothing to compact" if final is None else f"✅ CURRENT -> {final.name}")
+    paths = resolve_paths()
+    for e in (read_manifest(paths) or {}).get("segments") or []:
+        kind = "sealed" if e["sealed"] else "hot   "
+        months = e["months"][0] if e["months"][0] == e["months"][1] else "~".join(e["months"])
+        print(f"  {kind} {e['name']:<24} months={months}  rows={e['rows']}  deleted={len(e['deleted'])}")
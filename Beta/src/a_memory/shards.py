@@ -0,0 +1,174 @@
+# src/a_memory/shards.py
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.a_memory.bm25_index import BM25Index
+from src.a_memory.config import EMBEDDING_RESCORE_K, SEARCH_SHARDS, SEARCH_THREADS
+from src.a_memory.filters import top_k
+from src.a_memory.vectors import SCAN_UNIT_ROWS, EmbeddingMatrix
+
+_EMPTY_ROWS = np.zeros(0, dtype=np.int64)
+
+
+class ScanPart(NamedTuple):
+    """一段独立打分的行：自己的向量矩阵与 BM25 倒排，行号 + base 即全局行号（segments.Segment 也满足这个接口）。"""
+    embeddings: EmbeddingMatrix
+    bm25: BM25Index
+    rows: int
+    base: int = 0
+
+
+def _merge(parts: List[Tuple[np.ndarray, np.ndarray]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """各分片的 (行, 分数)（已按 分数降序、行号升序 排好）用堆归并出全局前 k，并列时行号小的优先。"""
+    streams = [zip((-s).tolist(), rows.tolist()) for rows, s in parts if len(rows)]
+    best = [(r, -ns) for ns, r in heapq.merge(*streams)][:k] if k > 0 else []
+    rows = np.fromiter((r for r, _ in best), dtype=np.int64, count=len(best))
+    scores = np.fromiter((s for _, s in best), dtype=np.float64, count=len(best))
+    return rows, scores
+
+
+class ShardedScorer:
+    """
+    分片并行打分：每个 part（整个索引，或分段索引的一个分段）切成连续分片（边界按 SCAN_UNIT_ROWS 对齐）。
+    行是按会话顺序写入的（增量构建的新 chunk 追加在末尾），所以每个分片是一组完整会话 / 一段增量。
+    - 向量：每个分片粗排后取前 rescore_k + k，堆归并出全局前 rescore_k 做 float32 精排，再取前 k
+    - BM25：每个分片只截取倒排链里落在本分片的一段，分片内 top-k 后堆归并
+    shards > 1 时分片在线程池里并行（BLAS / NumPy 内核释放 GIL）。选择时分数并列一律全局行号小的优先，
+    结果与不分片的 EmbeddingMatrix.scores_batch / scores_rows、BM25Index.score_sparse + top_k 逐位一致。
+    """
+
+    def __init__(
+        self,
+        parts: Sequence,
+        shards: int = SEARCH_SHARDS,
+        threads: int = SEARCH_THREADS,
+        rescore_k: int = EMBEDDING_RESCORE_K,
+    ):
+        self.parts = list(parts)
+        self.rescore_k = rescore_k
+        self.bases = np.asarray([p.base for p in self.parts], dtype=np.int64)
+        total = sum(p.rows for p in self.parts)
+        # (part 下标, a, b)：大的 part 多切几片，每个 part 至少一片
+        self.bounds = []
+        for i, p in enumerate(self.parts):
+            n = p.rows
+            units = max(1, -(-n // SCAN_UNIT_ROWS))
+            pieces = max(1, min(units, round(shards * n / total) if total else 1))
+            cuts = [min(n, units * j // pieces * SCAN_UNIT_ROWS) for j in range(pieces)] + [n]
+            self.bounds += [(i, a, b) for a, b in zip(cuts, cuts[1:]) if b > a] or [(i, 0, n)]
+        workers = threads or shards
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="shard") if shards > 1 and workers > 1 and len(self.bounds) > 1 else None
+
+    def __len__(self) -> int:
+        return len(self.bounds)
+
+    def _map(self, fn, spans):
+        return list(self.pool.map(fn, spans)) if self.pool is not None else [fn(s) for s in spans]
+
+    def _spans(self, cands: Optional[list]):
+        """
+        (part, a, b, 本分片的候选行 | None)。cands 与 parts 对齐：None 表示该 part 全部行，数组为候选行（本地行号、升序）；
+        cands 本身为 None 表示所有 part 都不过滤。没有候选的分片跳过。
+        """
+        spans = []
+        for i, a, b in self.bounds:
+            rows = None if cands is None else cands[i]
+            if rows is None:
+                spans.append((self.parts[i], a, b, None))
+                continue
+            lo, hi = np.searchsorted(rows, [a, b])
+            if hi > lo:
+                spans.append((self.parts[i], a, b, rows[lo:hi]))
+        return spans
+
+    def _total(self, cands: Optional[list]) -> int:
+        if cands is None:
+            return sum(p.rows for p in self.parts)
+        return sum(p.rows if c is None else len(c) for p, c in zip(self.parts, cands))
+
+    def rescore(self, rows: np.ndarray, q: np.ndarray) -> np.ndarray:
+        """全局行号的 float32 精确分数（按 part 分组交给各自的 EmbeddingMatrix.rescore）。"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(self.parts) == 1:
+            return self.parts[0].embeddings.rescore(rows - self.parts[0].base, q)
+        out = np.empty(len(rows), dtype="float32")
+        which = np.searchsorted(self.bases, rows, side="right") - 1
+        for i in np.unique(which).tolist():
+            sel = which == i
+            out[sel] = self.parts[i].embeddings.rescore(rows[sel] - self.parts[i].base, q)
+        return out
+
+    def vector_top(self, Q: np.ndarray, k: int, cands: Optional[list] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """每个查询的向量前 k（全局行号, 分数）；cands 见 _spans。"""
+        Q = np.atleast_2d(np.asarray(Q, dtype="float32"))
+        total = self._total(cands)
+        refine = min(self.rescore_k, total)
+        m = refine + k
+
+        def shard(span):
+            part, a, b, sub = span
+            emb = part.embeddings
+            S = emb.coarse_range(a, b, Q) if sub is None else emb.coarse_rows(sub, Q)
+            ids = (np.arange(a, b, dtype=np.int64) if sub is None else sub) + part.base
+            out = []
+            for j in range(Q.shape[0]):
+                sel = top_k(S[:, j], m)
+                out.append((ids[sel], S[sel, j]))
+            return out
+
+        parts = self._map(shard, self._spans(cands))
+        results = []
+        for j in range(Q.shape[0]):
+            cand, coarse = _merge([p[j] for p in parts], m)
+            scores = coarse.astype("float32")
+            # 全局粗排前 refine 行换成精确分数（与 EmbeddingMatrix._refine 相同），其后 k 行保留粗排分数
+            if refine > 0:
+                scores[:refine] = self.rescore(cand[:refine], Q[j])
+            # cand 是粗排顺序而不是行号顺序，并列要按行号断开：只有 refine + k 个，直接全排
+            sel = np.lexsort((cand, -scores))[:k]
+            results.append((cand[sel], scores[sel]))
+        return results
+
+    def ann_top(self, Q: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        各 part 的 ANN 索引（part.ann）各取前 k 再按分数归并（不过滤时用；hnsw / ivf 本身是近似的）。
+        part 有被删除的行（part.deleted，升序）时多取几条再剔除。
+        """
+        Q = np.atleast_2d(np.asarray(Q, dtype="float32"))
+
+        def part_top(part):
+            deleted = getattr(part, "deleted", _EMPTY_ROWS)
+            out = []
+            for rows, scores in part.ann.search_batch(Q, k + len(deleted)):
+                rows = np.asarray(rows, dtype=np.int64)
+                scores = np.asarray(scores)
+                if len(deleted):
+                    keep = ~np.isin(rows, deleted)
+                    rows, scores = rows[keep], scores[keep]
+                order = np.lexsort((rows, -scores))[:k]
+                out.append((rows[order] + part.base, scores[order]))
+            return out
+
+        per_part = self._map(part_top, [p for p in self.parts if p.rows])
+        return [_merge([p[j] for p in per_part], k) for j in range(Q.shape[0])]
+
+    def bm25_top(self, tokens: List[str], k: int, cands: Optional[list] = None) -> Tuple[np.ndarray, np.ndarray, float]:
+        """BM25 前 k（全局行号, 分数）以及候选集内的最高分（没有命中时为 0）。"""
+        def shard(span):
+            part, a, b, sub = span
+            docs, scores = part.bm25.score_sparse(tokens, sub, lo=a, hi=b)
+            sel = top_k(scores, k)
+            return docs[sel] + part.base, scores[sel], float(scores.max()) if len(scores) else 0.0
+
+        parts = self._map(shard, self._spans(cands))
+        if not parts:
+            return _EMPTY_ROWS, np.zeros(0), 0.0
+        top_rows, top_scores = _merge([(r, s) for r, s, _ in parts], k)
+        return top_rows, top_scores, max(mx for _, _, mx in parts)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
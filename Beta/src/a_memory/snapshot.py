@@ -0,0 +1,480 @@
+# src/a_memory/snapshot.py
+"""
+版本化索引快照：
+    data/snapshots/<快照名>/
+        segments/<分段名>/  chunk_store/  embeddings.npy(+量化 sidecar)  bm25_index/  faiss.index(+.json)
+        bm25_stats/        # 全部分段合起来的 BM25 统计量（每个分段一份换算好的 idf / doc_norm），见 segments.py
+        index_state.json
+        manifest.json      # 行数 / 模型 / 分段列表 / 每个文件的大小与 sha256
+    data/snapshots/CURRENT # 当前快照名（写临时文件再 os.replace，原子切换）
+    data/snapshots/LOCK    # 进程间排它锁：发布 / 回滚 / GC 改 CURRENT 与删快照都在锁里
+    data/snapshots/.leases/<pid>-<随机>  # 运行中服务端的租约：正在用 / 正在加载的快照名，GC 不删
+
+index_build 先把整套索引写进 .tmp 目录、写 manifest、改名成正式快照，最后才切 CURRENT；
+读者（MemorySearch / 服务端热加载）只会看到完整的旧快照或完整的新快照。
+还没有任何快照时退回旧的平铺布局（DATA_DIR 下的 chunk_store/、embeddings.npy ...），文件名与分段内一致；
+分段之前的旧快照也是这种平铺布局，检索时整体当作一个分段。
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+from src.a_memory.config import DATA_DIR, SNAPSHOTS_DIR, SNAPSHOT_KEEP, SNAPSHOT_LEASE_TTL_S, SNAPSHOT_POLL_S
+
+MANIFEST_VERSION = 1
+CURRENT_NAME = "CURRENT"
+LOCK_NAME = "LOCK"
+LEASES_DIR = ".leases"
+
+
+class SnapshotPaths:
+    """一个快照（或旧平铺布局）里各索引文件的位置。"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    @property
+    def name(self) -> str:
+        return self.root.name
+
+    @property
+    def chunk_store(self) -> Path:
+        return self.root / "chunk_store"
+
+    @property
+    def embeddings(self) -> Path:
+        return self.root / "embeddings.npy"
+
+    @property
+    def bm25_index(self) -> Path:
+        return self.root / "bm25_index"
+
+    @property
+    def ann_index(self) -> Path:
+        return self.root / "faiss.index"
+
+    @property
+    def state(self) -> Path:
+        return self.root / "index_state.json"
+
+    @property
+    def manifest(self) -> Path:
+        return self.root / "manifest.json"
+
+    @property
+    def segments(self) -> Path:
+        return self.root / "segments"
+
+    @property
+    def bm25_stats(self) -> Path:
+        return self.root / "bm25_stats"
+
+    def segment(self, name: str) -> "SnapshotPaths":
+        """分段目录（里面的文件名与平铺布局相同）。"""
+        return SnapshotPaths(self.segments / name)
+
+    def segmented(self) -> bool:
+        return self.segments.is_dir()
+
+    def complete(self) -> bool:
+        if self.segmented():
+            return self.manifest.exists()
+        return (
+            (self.chunk_store / "meta.json").exists()
+            and self.embeddings.exists()
+            and (self.bm25_index / "meta.json").exists()
+        )
+
+
+class FileLock:
+    """
+    进程间排它文件锁（POSIX flock / Windows msvcrt.locking）。锁跟着打开的文件走，进程退出时自动释放；
+    同一进程里两个 FileLock 打开同一路径也互斥。
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._f = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """拿到锁返回 True；blocking=False 且锁被别人持有时返回 False。"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(self.path, "a+b")
+        try:
+            if os.name == "nt":
+                import msvcrt
+
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                        break
+                    except OSError:
+                        if not blocking:
+                            raise
+                        time.sleep(0.05)
+            else:
+                import fcntl
+
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except OSError:
+            f.close()
+            if blocking:
+                raise
+            return False
+        self._f = f
+        return True
+
+    def release(self):
+        f, self._f = self._f, None
+        if f is None:
+            return
+        try:
+            if os.name == "nt":
+                import msvcrt
+
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        finally:
+            f.close()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def snapshot_lock(base: Path = SNAPSHOTS_DIR) -> FileLock:
+    """改 CURRENT / 删快照用的锁（with snapshot_lock(base): ...）。"""
+    return FileLock(Path(base) / LOCK_NAME)
+
+
+def current_snapshot(base: Path = SNAPSHOTS_DIR) -> Optional[str]:
+    """CURRENT 指向的快照名；没有快照（或指向的目录不存在）时返回 None。"""
+    try:
+        name = (Path(base) / CURRENT_NAME).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+    return name if name and (Path(base) / name).is_dir() else None
+
+
+def resolve_paths(base: Path = SNAPSHOTS_DIR) -> SnapshotPaths:
+    """当前快照；还没发布过快照时用 DATA_DIR 下的旧平铺布局。"""
+    name = current_snapshot(base)
+    return SnapshotPaths(Path(base) / name) if name else SnapshotPaths(DATA_DIR)
+
+
+def snapshot_name() -> str:
+    """
+    <年月日-时分秒>-<秒内纳秒，9 位补零>-<随机后缀>：同一秒里发布的多个快照按名字排序也是新旧顺序，
+    gc_snapshots / --list 都靠这一点。
+    """
+    ns = time.time_ns()
+    return f"{datetime.fromtimestamp(ns // 10**9):%Y%m%d-%H%M%S}-{ns % 10**9:09d}-{uuid.uuid4().hex[:6]}"
+
+
+def new_snapshot(base: Path = SNAPSHOTS_DIR) -> SnapshotPaths:
+    """分配一个临时快照目录（.tmp-<名字>），写完后交给 publish（正式名字在发布时才定）。"""
+    tmp = Path(base) / f".tmp-{snapshot_name()}"
+    tmp.mkdir(parents=True)
+    return SnapshotPaths(tmp)
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _files(root: Path) -> list[Path]:
+    return sorted(p for p in root.rglob("*") if p.is_file() and p.name != "manifest.json")
+
+
+def write_manifest(paths: SnapshotPaths, info: dict, parent: Optional[SnapshotPaths] = None) -> dict:
+    """
+    info：行数 / 模型 / 构建参数等；这里补上每个文件的大小与 sha256。
+    parent 给定时，从父快照硬链接过来的文件（同一个 inode）直接沿用父 manifest 里的记录，不再重算 sha256。
+    """
+    known = (read_manifest(parent) or {}).get("files", {}) if parent is not None else {}
+    files = {}
+    for p in _files(paths.root):
+        rel = p.relative_to(paths.root).as_posix()
+        old = parent.root / rel if rel in known else None
+        if old is not None and old.exists() and os.path.samefile(p, old):
+            files[rel] = known[rel]
+        else:
+            files[rel] = {"bytes": p.stat().st_size, "sha256": _sha256(p)}
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        **info,
+        "files": files,
+    }
+    with open(paths.manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def read_manifest(paths: SnapshotPaths) -> Optional[dict]:
+    if not paths.manifest.exists():
+        return None
+    with open(paths.manifest, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def verify(paths: SnapshotPaths, hashes: bool = False) -> list[str]:
+    """按 manifest 校验文件是否齐全、大小（hashes=True 时连 sha256）一致；返回问题列表。"""
+    manifest = read_manifest(paths)
+    if manifest is None:
+        return [f"{paths.manifest} 不存在"]
+    problems = []
+    for rel, meta in manifest["files"].items():
+        p = paths.root / rel
+        if not p.exists():
+            problems.append(f"缺少文件 {rel}")
+        elif p.stat().st_size != meta["bytes"]:
+            problems.append(f"{rel} 大小不一致")
+        elif hashes and _sha256(p) != meta["sha256"]:
+            problems.append(f"{rel} sha256 不一致")
+    return problems
+
+
+def _write_current(name: str, base: Path):
+    tmp = Path(base) / f"{CURRENT_NAME}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, Path(base) / CURRENT_NAME)
+
+
+class SnapshotConflict(RuntimeError):
+    """发布时 CURRENT 已经不是构建所基于的快照（另一个构建 / 合并先发布了）。"""
+
+
+def publish(
+    tmp: SnapshotPaths,
+    base: Path = SNAPSHOTS_DIR,
+    keep: int = SNAPSHOT_KEEP,
+    expect: Optional[str] = None,
+) -> SnapshotPaths:
+    """
+    临时目录改名为正式快照，再原子地把 CURRENT 指过去；最后清理旧快照。
+    正式名字按发布时刻取（snapshot_name），所以快照名的先后就是发布的先后，与构建开始的早晚无关。
+    expect：增量构建 / 分段合并基于的快照名；CURRENT 已经变了就丢弃临时目录并抛 SnapshotConflict，不覆盖别人的结果。
+    从 expect 检查到写完 CURRENT、清理旧快照都持有 snapshot_lock：多个进程（服务端各 worker 的 compactor、
+    命令行增量构建）同时发布时依次进行，后到的一方看到 CURRENT 已变就放弃。
+    """
+    with snapshot_lock(base):
+        current = current_snapshot(base)
+        if expect is not None and current != expect:
+            shutil.rmtree(tmp.root, ignore_errors=True)
+            raise SnapshotConflict(f"CURRENT 已不是 {expect}（当前 {current}），放弃发布")
+        name = snapshot_name()
+        final = SnapshotPaths(Path(base) / name)
+        os.replace(tmp.root, final.root)
+        _write_current(name, base)
+        _gc_snapshots(base, keep)
+    return final
+
+
+def list_snapshots(base: Path = SNAPSHOTS_DIR) -> list[str]:
+    """全部正式快照，从旧到新。"""
+    base = Path(base)
+    if not base.exists():
+        return []
+    return sorted(p.name for p in base.iterdir() if p.is_dir() and not p.name.startswith("."))
+
+
+class SnapshotLease:
+    """
+    进程级租约文件 .leases/<pid>-<随机>：逐行写本进程正在用（或正在加载）的快照名，gc_snapshots 不删这些快照。
+    靠 mtime 续期（SnapshotWatcher 每次轮询 renew）；超过 SNAPSHOT_LEASE_TTL_S 没续期的视为进程已退出，GC 时删掉。
+    """
+
+    def __init__(self, base: Path = SNAPSHOTS_DIR):
+        self.path = Path(base) / LEASES_DIR / f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.names: tuple = ()
+
+    def hold(self, *names: Optional[str]):
+        """租约内容换成 names（None 忽略）。"""
+        self.names = tuple(n for n in names if n)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text("\n".join(self.names), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def renew(self):
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            # 被 GC 当作过期删掉了（例如进程挂起过很久）：重新写一份
+            self.hold(*self.names)
+
+    def release(self):
+        self.names = ()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def leased_snapshots(base: Path = SNAPSHOTS_DIR, ttl_s: float = SNAPSHOT_LEASE_TTL_S) -> set[str]:
+    """有效租约里的快照名；顺手删掉过期的租约文件。"""
+    root = Path(base) / LEASES_DIR
+    if not root.is_dir():
+        return set()
+    cutoff = time.time() - ttl_s
+    names: set[str] = set()
+    for p in root.iterdir():
+        try:
+            if p.stat().st_mtime < cutoff:
+                p.unlink()
+            elif p.suffix != ".tmp":
+                names.update(p.read_text(encoding="utf-8").split())
+        except FileNotFoundError:
+            continue
+    return names
+
+
+def gc_snapshots(base: Path = SNAPSHOTS_DIR, keep: int = SNAPSHOT_KEEP):
+    """
+    只保留最新的 keep 个快照（CURRENT 指向的、运行中服务端租约里的永远保留），并清掉中途失败留下的 .tmp 目录。
+    旧快照可能还被正在退场的进程 mmap 着：删除失败（Windows）就留到下次。
+    """
+    with snapshot_lock(base):
+        _gc_snapshots(base, keep)
+
+
+def _gc_snapshots(base: Path, keep: int):
+    base = Path(base)
+    pinned = {current_snapshot(base)} | leased_snapshots(base)
+    names = list_snapshots(base)
+    for name in names[:-keep] if keep > 0 else names:
+        if name not in pinned:
+            shutil.rmtree(base / name, ignore_errors=True)
+    cutoff = time.time() - 3600
+    for p in base.glob(".tmp-*"):
+        if p.stat().st_mtime < cutoff:
+            shutil.rmtree(p, ignore_errors=True)
+
+
+def rollback(name: str, base: Path = SNAPSHOTS_DIR):
+    """把 CURRENT 指回某个已有快照（服务端会像发布新快照一样热切换过去）。"""
+    paths = SnapshotPaths(Path(base) / name)
+    with snapshot_lock(base):
+        problems = verify(paths)
+        if problems:
+            raise RuntimeError(f"快照 {name} 不可用：{problems}")
+        _write_current(name, base)
+
+
+class SnapshotWatcher:
+    """
+    后台线程每 poll_s 秒读一次 CURRENT。指向的快照变了就在本线程里 load(paths)（不占请求线程），
+    成功后交给 on_ready(新对象) 切换；加载或校验失败则继续用旧快照，直到 CURRENT 再次变化。
+    在用的快照（加载期间连同新快照）记在本进程的 SnapshotLease 里，每次轮询续期，GC 不会删掉它们。
+    """
+
+    def __init__(
+        self,
+        active: Optional[str],
+        load: Callable[[SnapshotPaths], object],
+        on_ready: Callable[[object], None],
+        poll_s: float = SNAPSHOT_POLL_S,
+        base: Path = SNAPSHOTS_DIR,
+    ):
+        self.active = active
+        self.load = load
+        self.on_ready = on_ready
+        self.poll_s = poll_s
+        self.base = Path(base)
+        self.swaps = 0
+        self._failed: Optional[str] = None
+        self.lease = SnapshotLease(self.base)
+        self.lease.hold(active)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="snapshot-watcher", daemon=True)
+
+    def check(self) -> bool:
+        """检查一次；切换了新快照返回 True。"""
+        self.lease.renew()
+        name = current_snapshot(self.base)
+        if name is None or name == self.active or name == self._failed:
+            return False
+        paths = SnapshotPaths(self.base / name)
+        self.lease.hold(self.active, name)
+        try:
+            problems = verify(paths)
+            if problems:
+                raise RuntimeError("; ".join(problems))
+            new = self.load(paths)
+        except Exception as e:
+            self._failed = name
+            self.lease.hold(self.active)
+            print(f"⚠️ 快照 {name} 加载失败，继续使用 {self.active}：{e}")
+            return False
+        self.on_ready(new)
+        self.lease.hold(name)
+        self.active = name
+        self._failed = None
+        self.swaps += 1
+        print(f"✅ switched to index snapshot {name}")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.poll_s):
+            self.check()
+
+    def start(self) -> "SnapshotWatcher":
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.lease.release()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="索引快照管理")
+    ap.add_argument("--list", action="store_true", help="列出快照（* 为当前）")
+    ap.add_argument("--verify", metavar="NAME", nargs="?", const="", help="按 manifest 校验 sha256（默认当前快照）")
+    ap.add_argument("--rollback", metavar="NAME", help="把 CURRENT 指回某个快照")
+    ap.add_argument("--gc", action="store_true", help=f"只保留最新 {SNAPSHOT_KEEP} 个快照")
+    args = ap.parse_args()
+
+    if args.rollback:
+        rollback(args.rollback)
+        print("✅ CURRENT ->", args.rollback)
+    if args.gc:
+        gc_snapshots()
+    if args.verify is not None:
+        name = args.verify or current_snapshot()
+        if not name:
+            ap.error("no snapshot published yet")
+        problems = verify(SnapshotPaths(SNAPSHOTS_DIR / name), hashes=True)
+        print("✅ ok:" if not problems else "❌ broken:", name, *problems, sep="\n  ")
+    if args.list or not (args.rollback or args.gc or args.verify is not None):
+        current = current_snapshot()
+        for name in list_snapshots():
+            m = read_manifest(SnapshotPaths(SNAPSHOTS_DIR / name)) or {}
+            mark = "*" if name == current else " "
+            print(f"{mark} {name}  chunks={m.get('chunks')}  model={m.get('embedding_model')}  created={m.get('created')}")
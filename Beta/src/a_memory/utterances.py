@@ -0,0 +1,173 @@
+# src/a_memory/utterances.py
+"""
+chunk 文本的逐句（utterance）特征：构建索引时算一次，和 chunk_store 放在一起，回答时不用再切句 / 分词 / 跑正则。
+规则与抽取式回答（b_answer.qwen_answer.ExtractiveAnswerer）一一对应：
+- 切句：按 splitlines 取非空行，"speaker: text" 拆出说话人（其它行说话人为空）
+- 分词：中文 2-gram + 英文/数字按词（小写），每句去重后存 64 位 token id（blake2b，进程间稳定）
+- flags：说话人是 me / client* 、句子里有时间表达
+- keywords：回答打分 / 选句用到的关键词命中位图（KEYWORDS 的下标即位号）
+只存字符偏移，不另存文本：回答时句子原文直接从 snippet 上切出来。
+"""
+import hashlib
+import re
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Sequence
+
+import numpy as np
+
+# 规则变化（关键词表 / 分词 / 时间表达）时 +1：存储里的特征版本不一致就退回现场计算
+UTTERANCE_VERSION = 1
+
+_SPEAKER_RE = re.compile(r"^([A-Za-z0-9_\-]+)\s*:\s*(.+)$")
+_NON_WORD_RE = re.compile(r"[^0-9A-Za-z\u4e00-\u9fff]+")
+_HAN_RE = re.compile(r"[\u4e00-\u9fff]")
+_TIME_RE = re.compile(
+    r"\d{4}[-/.]\d{1,2}[-/.]\d{1,2}|\d{1,2}月\d{1,2}日|周[一二三四五六日天]"
+    r"|今天|明天|后天|下周|本周|周末|今晚|下午|上午"
+)
+
+FLAG_ME = 1
+FLAG_CLIENT = 2
+FLAG_TIME = 4
+
+KEYWORDS = (
+    "彩排", "流程", "回签", "更新", "确认", "付款", "节点", "内部", "版本", "发你",
+    "下周", "包含", "培训", "部署", "报价", "已更新", "不含", "单独",
+)
+_KW_BIT = {kw: 1 << i for i, kw in enumerate(KEYWORDS)}
+
+
+def keyword_mask(words: Iterable[str]) -> int:
+    mask = 0
+    for w in words:
+        mask |= _KW_BIT[w]
+    return mask
+
+
+def tokenize_zh(s: str) -> List[str]:
+    """中文 2-gram（单字词保留单字）+ 英文/数字按词，全部小写。"""
+    s = _NON_WORD_RE.sub(" ", s or "").strip().lower()
+    if not s:
+        return []
+    tokens = []
+    for p in s.split():
+        if _HAN_RE.search(p):
+            if len(p) == 1:
+                tokens.append(p)
+            else:
+                tokens.extend(p[i : i + 2] for i in range(len(p) - 1))
+        else:
+            tokens.append(p)
+    return tokens
+
+
+def has_time_expr(s: str) -> bool:
+    return _TIME_RE.search(s or "") is not None
+
+
+@lru_cache(maxsize=1 << 16)
+def token_id(token: str) -> int:
+    """token → 有符号 64 位 id（不同 token 撞车的概率约 2^-64，可忽略）。"""
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+def token_ids(tokens: Iterable[str]) -> np.ndarray:
+    """去重并排序后的 token id。"""
+    return np.unique(np.fromiter((token_id(t) for t in set(tokens)), dtype=np.int64))
+
+
+def speaker_flags(speaker: str) -> int:
+    spk = (speaker or "").lower()
+    return (FLAG_ME if spk in {"me", "我"} else 0) | (FLAG_CLIENT if spk.startswith("client") else 0)
+
+
+class Utterances(NamedTuple):
+    """
+    一段文本的全部句子（按原顺序）。
+    - span: int32 (n, 3)，每句在文本里的字符偏移 [行首, 正文起点, 行尾]（行已去掉首尾空白）
+    - speakers: 说话人（没有说话人时为空串）
+    - flags: uint8，FLAG_*；keywords: uint32，KEYWORDS 命中位图
+    - tok_off: int64 (n+1)，每句在 tokens 里的区间；tokens: int64 token id（句内去重、升序）
+    """
+    span: np.ndarray
+    speakers: List[str]
+    flags: np.ndarray
+    keywords: np.ndarray
+    tok_off: np.ndarray
+    tokens: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.speakers)
+
+    def raw(self, text: str, i: int) -> str:
+        return text[self.span[i, 0] : self.span[i, 2]]
+
+    def body(self, text: str, i: int) -> str:
+        return text[self.span[i, 1] : self.span[i, 2]]
+
+    def prefix(self, snippet: str) -> "Utterances":
+        """
+        整段文本的特征 → 其前缀 snippet（例如截断到 800 字的证据片段）的特征，与直接对 snippet 抽取一致：
+        完整落在前缀里的句子原样保留，被截断的那一句现场重算。
+        """
+        n_keep = int(np.searchsorted(self.span[:, 2], len(snippet), side="right"))
+        if n_keep == len(self):
+            return self
+        head = self.take(n_keep)
+        start = int(self.span[n_keep, 0])
+        if start >= len(snippet):
+            return head
+        return concat([head, extract_utterances(snippet[start:], offset=start)])
+
+    def take(self, n: int) -> "Utterances":
+        """前 n 句。"""
+        return Utterances(
+            self.span[:n], self.speakers[:n], self.flags[:n], self.keywords[:n],
+            self.tok_off[: n + 1], self.tokens[: int(self.tok_off[n])],
+        )
+
+
+def extract_utterances(text: str, offset: int = 0) -> Utterances:
+    """切句并算出每句的特征；offset 加到所有字符偏移上。"""
+    spans, speakers, flags, keywords, tok_off, tokens = [], [], [], [], [0], []
+    pos = offset
+    for piece in (text or "").splitlines(keepends=True):
+        line = piece.strip()
+        if line:
+            start = pos + len(piece) - len(piece.lstrip())
+            m = _SPEAKER_RE.match(line)
+            spk, body_at = (m.group(1), m.start(2)) if m else ("", 0)
+            txt = line[body_at:]
+            ids = sorted({token_id(t) for t in tokenize_zh(txt)})
+            spans.append((start, start + body_at, start + len(line)))
+            speakers.append(spk)
+            flags.append(speaker_flags(spk) | (FLAG_TIME if has_time_expr(txt) else 0))
+            keywords.append(sum(bit for kw, bit in _KW_BIT.items() if kw in txt))
+            tokens.extend(ids)
+            tok_off.append(tok_off[-1] + len(ids))
+        pos += len(piece)
+    return Utterances(
+        np.asarray(spans, dtype=np.int32).reshape(-1, 3),
+        speakers,
+        np.asarray(flags, dtype=np.uint8),
+        np.asarray(keywords, dtype=np.uint32),
+        np.asarray(tok_off, dtype=np.int64),
+        np.asarray(tokens, dtype=np.int64),
+    )
+
+
+def concat(parts: Sequence[Utterances]) -> Utterances:
+    """按顺序拼接（偏移保持各自的值，不做平移）。"""
+    tok_off = [np.zeros(1, dtype=np.int64)]
+    base = 0
+    for u in parts:
+        tok_off.append(u.tok_off[1:] - u.tok_off[0] + base)
+        base += int(u.tok_off[-1] - u.tok_off[0])
+    return Utterances(
+        np.concatenate([u.span for u in parts]).reshape(-1, 3).astype(np.int32, copy=False),
+        [s for u in parts for s in u.speakers],
+        np.concatenate([u.flags for u in parts]).astype(np.uint8, copy=False),
+        np.concatenate([u.keywords for u in parts]).astype(np.uint32, copy=False),
+        np.concatenate(tok_off),
+        np.concatenate([u.tokens[int(u.tok_off[0]) : int(u.tok_off[-1])] for u in parts]).astype(np.int64, copy=False),
+    )
@@ -0,0 +1,164 @@
+# src/a_memory/vectors.py
+from pathlib import Path
+
+import numpy as np
+
+from src.a_memory.config import EMBEDDINGS_PATH, EMBEDDING_STORAGE, EMBEDDING_RESCORE_K
+from src.a_memory.filters import top_k
+
+# 量化矩阵分块反量化打分的块行数：块小到能留在 CPU cache 里，反量化 + BLAS 才不会被内存带宽拖慢
+_BLOCK_ROWS = 2048
+
+# 粗排的扫描单元：每个单元做一次矩阵乘。一行的粗排分数只取决于它所在的单元，
+# 分片（shards.py）边界按单元对齐，分片打分与整体打分逐位一致
+SCAN_UNIT_ROWS = 8 * _BLOCK_ROWS
+
+
+def _sidecar(path: Path, storage: str) -> Path:
+    return path.with_name(f"{path.stem}.{storage}.npy")
+
+
+def _scale_path(path: Path) -> Path:
+    return path.with_name(f"{path.stem}.int8_scale.npy")
+
+
+def save_embeddings(embeddings: np.ndarray, path: Path = EMBEDDINGS_PATH, storage: str = EMBEDDING_STORAGE):
+    """
+    始终写 float32 原矩阵（精排用，mmap 打开只会读到候选行）；
+    storage=float16/int8 时额外写一份量化矩阵做粗排：
+    - float16: 直接降精度
+    - int8: 每行对称量化，scale = max|x| / 127
+    """
+    path = Path(path)
+    embeddings = np.asarray(embeddings, dtype="float32")
+    np.save(str(path), embeddings)
+    if storage == "float16":
+        np.save(str(_sidecar(path, storage)), embeddings.astype(np.float16))
+    elif storage == "int8":
+        scale = np.abs(embeddings).max(axis=1) / 127.0 if len(embeddings) else np.zeros(0, dtype="float32")
+        scale = np.where(scale > 0, scale, 1.0).astype("float32")
+        q = np.clip(np.rint(embeddings / scale[:, None]), -127, 127).astype(np.int8)
+        np.save(str(_sidecar(path, storage)), q)
+        np.save(str(_scale_path(path)), scale)
+    elif storage != "float32":
+        raise ValueError(f"unknown embedding storage: {storage}")
+
+
+class EmbeddingMatrix:
+    """
+    mmap 打开的 embedding 矩阵，不在进程里复制一份 float32。
+    - float32: 粗排直接 exact @ Q
+    - float16 / int8: 粗排用量化矩阵（分块反量化）
+    粗排后每个查询的前 rescore_k 行用 rescore 重新打分：逐行独立计算，结果与批大小、BLAS 分块无关，
+    所以单条查询与批量查询得到的分数完全一致；其余行保留粗排值（只用来决定谁进候选）。
+    """
+
+    def __init__(self, path: Path = EMBEDDINGS_PATH, storage: str = EMBEDDING_STORAGE, rescore_k: int = EMBEDDING_RESCORE_K):
+        path = Path(path)
+        self.storage = storage
+        self.rescore_k = rescore_k
+        self.exact = np.load(str(path), mmap_mode="r")
+        if self.exact.dtype != np.float32:
+            # 老索引可能不是 float32：退回一次性转换
+            self.exact = self.exact.astype("float32")
+        self.approx = None
+        self.scale = None
+        if storage in ("float16", "int8"):
+            side = _sidecar(path, storage)
+            if side.exists() and np.load(str(side), mmap_mode="r").shape[0] == self.exact.shape[0]:
+                self.approx = np.load(str(side), mmap_mode="r")
+                if storage == "int8":
+                    self.scale = np.load(str(_scale_path(path)), mmap_mode="r")
+            else:
+                print(f"⚠️ {side.name} 不存在或与 embeddings 行数不一致，退回 float32 精确打分（重新运行 index_build.py）")
+                self.storage = "float32"
+
+    @property
+    def shape(self):
+        return self.exact.shape
+
+    def __len__(self) -> int:
+        return self.exact.shape[0]
+
+    def _coarse_unit(self, a: int, b: int, Q: np.ndarray) -> np.ndarray:
+        """一个扫描单元 [a, b) 的粗排分数。"""
+        if self.approx is None:
+            return np.asarray(self.exact[a:b] @ Q.T, dtype="float32")
+        out = np.empty((b - a, Q.shape[0]), dtype="float32")
+        for c in range(a, b, _BLOCK_ROWS):
+            d = min(c + _BLOCK_ROWS, b)
+            s = np.asarray(self.approx[c:d], dtype="float32") @ Q.T
+            if self.scale is not None:
+                s *= self.scale[c:d, None]
+            out[c - a:d - a] = s
+        return out
+
+    def coarse_range(self, a: int, b: int, Q: np.ndarray) -> np.ndarray:
+        """行 [a, b) 的粗排分数 (b-a, B)；a 须按 SCAN_UNIT_ROWS 对齐，b 为单元边界或 N。"""
+        out = np.empty((b - a, Q.shape[0]), dtype="float32")
+        for u in range(a, b, SCAN_UNIT_ROWS):
+            v = min(u + SCAN_UNIT_ROWS, b)
+            out[u - a:v - a] = self._coarse_unit(u, v, Q)
+        return out
+
+    def coarse_rows(self, rows: np.ndarray, Q: np.ndarray) -> np.ndarray:
+        """
+        候选行（升序）的粗排分数，按扫描单元分组：
+        gather 每行的代价约是顺序扫描的 3~4 倍，单元内候选超过 1/4 时整单元打分再取出这些行，否则只 gather 候选行。
+        """
+        out = np.empty((len(rows), Q.shape[0]), dtype="float32")
+        if not len(rows):
+            return out
+        n = self.exact.shape[0]
+        units = rows // SCAN_UNIT_ROWS
+        cuts = np.flatnonzero(np.diff(units)) + 1
+        for s, e in zip(np.r_[0, cuts], np.r_[cuts, len(rows)]):
+            u = int(units[s]) * SCAN_UNIT_ROWS
+            v = min(u + SCAN_UNIT_ROWS, n)
+            sub = rows[s:e]
+            if (e - s) * 4 > v - u:
+                out[s:e] = self._coarse_unit(u, v, Q)[sub - u]
+            else:
+                out[s:e] = self.exact[sub] @ Q.T
+        return out
+
+    def _coarse(self, Q: np.ndarray) -> np.ndarray:
+        return self.coarse_range(0, self.exact.shape[0], Q)
+
+    def rescore(self, rows: np.ndarray, q: np.ndarray) -> np.ndarray:
+        """
+        候选行用 float32 原向量精确打分（按行号顺序读，mmap 只碰到这些行所在的页）。
+        逐行乘加后按行求和：每行的结果只取决于该行和 q，不受候选集合或批大小影响。
+        """
+        rows = np.asarray(rows)
+        order = np.argsort(rows)
+        out = np.empty(len(rows), dtype="float32")
+        out[order] = np.multiply(self.exact[rows[order]], np.asarray(q, dtype="float32")).sum(axis=1)
+        return out
+
+    def _refine(self, S: np.ndarray, rows: np.ndarray | None, Q: np.ndarray) -> np.ndarray:
+        """每列（每个查询）的粗排前 rescore_k 行换成 rescore 的精确分数。"""
+        k = min(self.rescore_k, S.shape[0])
+        if k <= 0:
+            return S
+        for j in range(Q.shape[0]):
+            top = top_k(S[:, j], k)
+            S[top, j] = self.rescore(top if rows is None else rows[top], Q[j])
+        return S
+
+    def scores_batch(self, Q: np.ndarray) -> np.ndarray:
+        """一次矩阵乘给 B 个查询打分，返回 (N, B)。"""
+        Q = np.atleast_2d(np.asarray(Q, dtype="float32"))
+        return self._refine(self._coarse(Q), None, Q)
+
+    def scores_rows(self, rows: np.ndarray, q: np.ndarray) -> np.ndarray:
+        """
+        只给候选行（升序）打分（过滤检索用）；q 可以是单个查询 (d,) 或一批 (B, d)，返回 (len(rows),) 或 (len(rows), B)。
+        """
+        q = np.asarray(q, dtype="float32")
+        Q = np.atleast_2d(q)
+        S = self._refine(self.coarse_rows(np.asarray(rows), Q), rows, Q)
+        return S[:, 0] if q.ndim == 1 else S
+
+    def scores(self, q: np.ndarray) -> np.ndarray:
+        return self.scores_batch(q)[:, 0]
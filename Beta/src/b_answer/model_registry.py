@@ -0,0 +1,158 @@
+"""
+进程级 base model 注册表：同一个 (base_model, dtype, device) 在进程里只加载一次 tokenizer + 权重，
+生成式回答（qwen_answer.GenerativeBackend）和风格改写（b_style.adapter.apply.StyleAdapter）拿到同一份引用。
+- LoRA adapter 通过 PEFT 挂在共享权重上（SharedModel.attach_adapter）：回答时关掉 adapter，风格改写时只开自己那一个
+- adapter 开关是共享权重上的全局状态，所以每次生成都在 SharedModel.use(...) 里做（每个 base 一把锁）
+- memory_report()：每个 base 的权重 / adapter 字节数、使用方，以及共享省下的字节数（不共享时每个使用方各一份 base）
+导入本模块不导入 torch / transformers / peft，第一次 get() 才导入。
+"""
+from __future__ import annotations
+
+import contextlib
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+_TORCH_DTYPES = ("float16", "bfloat16", "float32")
+
+
+def _param_bytes(params) -> int:
+    return sum(p.numel() * p.element_size() for p in params)
+
+
+class SharedModel:
+    """
+    一份常驻的 base model。model 在挂上第一个 adapter 之后换成包着同一份权重的 PeftModel，
+    所以使用方不要缓存 .model，生成时从 use() 里拿。
+    """
+
+    def __init__(self, key: Tuple[str, str, str], tokenizer, model):
+        self.key = key
+        self.tokenizer = tokenizer
+        self.model = model
+        self.base_bytes = _param_bytes(model.parameters())
+        self.adapter_bytes = 0
+        self.adapters: Dict[str, str] = {}  # adapter 名 → 路径
+        self.users: List[str] = []
+        self.lock = threading.RLock()
+
+    @property
+    def base_model(self) -> str:
+        return self.key[0]
+
+    def attach_adapter(self, adapter_path: str, name: str = "default"):
+        """用 PEFT 把 LoRA adapter 挂到共享权重上；同名 adapter 只挂一次。"""
+        from peft import PeftModel
+
+        with self.lock:
+            if name in self.adapters:
+                if self.adapters[name] != str(adapter_path):
+                    raise ValueError(f"adapter {name!r} 已挂载为 {self.adapters[name]}，不能再挂 {adapter_path}")
+                return
+            if self.adapters:
+                self.model.load_adapter(str(adapter_path), adapter_name=name)
+            else:
+                self.model = PeftModel.from_pretrained(self.model, str(adapter_path), adapter_name=name)
+            self.model.eval()
+            self.adapters[name] = str(adapter_path)
+            self.adapter_bytes = _param_bytes(p for n, p in self.model.named_parameters() if "lora_" in n)
+
+    @contextlib.contextmanager
+    def use(self, adapter: Optional[str] = None) -> Iterator:
+        """
+        独占共享权重做一次生成，产出当前的 model：
+        adapter=None 时所有 adapter 都关闭（等价于纯 base），否则只启用这一个。
+        """
+        with self.lock:
+            if adapter is not None and adapter not in self.adapters:
+                raise KeyError(f"adapter {adapter!r} 未挂载到 {self.base_model}")
+            if adapter is None and self.adapters:
+                with self.model.disable_adapter():
+                    yield self.model
+            else:
+                if adapter is not None:
+                    self.model.set_adapter(adapter)
+                yield self.model
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._models: Dict[Tuple[str, str, str], SharedModel] = {}
+        self._lock = threading.Lock()       # _models / users（memory_report 不会被加载中的模型卡住）
+        self._load_lock = threading.Lock()  # 同时首次 get() 只加载一次
+
+    @staticmethod
+    def _key(base_model: str, dtype: str, device: Optional[str]) -> Tuple[str, str, str]:
+        import torch
+
+        if dtype not in _TORCH_DTYPES:
+            raise ValueError(f"unknown dtype: {dtype}")
+        # device=None 表示 device_map="auto"；没有 GPU 时 auto 就是 cpu，和显式 cpu 共用一份
+        if device is None:
+            device = "auto" if torch.cuda.is_available() else "cpu"
+        return base_model, dtype, device
+
+    @staticmethod
+    def _load(key: Tuple[str, str, str]) -> SharedModel:
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        base_model, dtype, device = key
+        tokenizer = AutoTokenizer.from_pretrained(base_model, use_fast=True, trust_remote_code=False)
+        if tokenizer.pad_token is None and tokenizer.eos_token is not None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        model = AutoModelForCausalLM.from_pretrained(
+            base_model,
+            trust_remote_code=False,
+            device_map="auto" if device == "auto" else None,
+            torch_dtype=getattr(torch, dtype),
+        )
+        if device != "auto":
+            model.to(device)
+        model.eval()
+        return SharedModel(key, tokenizer, model)
+
+    def get(self, base_model: str, dtype: str = "bfloat16", device: Optional[str] = None, user: str = "") -> SharedModel:
+        """取（必要时加载）共享的 base model；user 记到使用方列表里，用于内存报告。"""
+        key = self._key(base_model, dtype, device)
+        with self._load_lock:
+            shared = self._models.get(key)
+            if shared is None:
+                shared = self._load(key)
+                with self._lock:
+                    self._models[key] = shared
+                print(f"✅ loaded base model: {base_model} ({dtype}, {key[2]}) {shared.base_bytes / 2**20:.0f} MB")
+        with self._lock:
+            if user and user not in shared.users:
+                shared.users.append(user)
+                if len(shared.users) > 1:
+                    print(f"♻️  {user} 复用 base model {base_model}，省下 {shared.base_bytes / 2**20:.0f} MB")
+            return shared
+
+    def memory_report(self) -> List[dict]:
+        """每个已加载 base 一条：saved_bytes = 不共享时多出来的 base 副本（每个使用方一份）。"""
+        report = []
+        with self._lock:
+            for (base_model, dtype, device), shared in self._models.items():
+                copies = max(1, len(shared.users))
+                report.append(
+                    {
+                        "base_model": base_model,
+                        "dtype": dtype,
+                        "device": device,
+                        "users": list(shared.users),
+                        "adapters": dict(shared.adapters),
+                        "base_bytes": shared.base_bytes,
+                        "adapter_bytes": shared.adapter_bytes,
+                        "resident_bytes": shared.base_bytes + shared.adapter_bytes,
+                        "saved_bytes": shared.base_bytes * (copies - 1),
+                    }
+                )
+        return report
+
+
+_REGISTRY = ModelRegistry()
+
+
+def get_registry() -> ModelRegistry:
+    return _REGISTRY
@@ -1,11 +1,35 @@
-
 from __future__ import annotations
 
 from dataclasses import dataclass
 from typing import List, Optional, Tuple
 import re
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
+
+import numpy as np
+
+from src.a_memory.utterances import (
+    FLAG_CLIENT,
+    FLAG_ME,
+    FLAG_TIME,
+    KEYWORDS,
+    Utterances,
+    extract_utterances,
+    keyword_mask,
+    token_ids,
+    tokenize_zh,
+)
+from src.b_answer.model_registry import get_registry
+
+_KW_REHEARSAL = keyword_mask(["彩排"])
+_KW_PROCESS_SCORE = keyword_mask(["流程", "回签", "更新", "确认", "付款", "节点", "内部", "版本", "发你", "下周"])
+_KW_ASKED_SCORE = keyword_mask(["包含", "培训", "部署", "报价"])
+_KW_PROCESS_PICK = keyword_mask(["付款", "节点", "更新", "已更新", "确认", "回签", "内部", "流程", "下周"])
+_KW_CLIENT_PICK = keyword_mask(["报价", "包含", "部署", "培训"])
+_KW_ME_PICK = keyword_mask(["包含", "不含", "培训", "部署", "单独"])
+
+
+def _popcount(masks: np.ndarray) -> np.ndarray:
+    """每个关键词位图里置位的个数。"""
+    return sum(((masks >> b) & 1).astype(np.int64) for b in range(len(KEYWORDS)))
 
 
 @dataclass
@@ -21,15 +45,14 @@ class EvidenceBlock:
     score: float
     confidence: str
     snippet: str
+    utterances: Optional[Utterances] = None  # 索引里预先算好的 chunk 逐句特征（snippet 是其文本的前缀）
 
 
-class QwenEvidenceAnswerer:
+class GenerativeBackend:
     """
-    B：基于证据生成回答（抽取式，不编造），并输出“依据”。
-    设计目标：
-    - Answer 只基于 evidence/snippet 中出现过的信息（不让 1B 模型脑补）。
-    - 相关：根据问题意图在 evidence 内挑最相关的 1-4 句原话组合成结论。
-    - 结构：严格输出 Answer/Evidence 两段，便于 UI 渲染引用。
+    生成式后端（transformers CausalLM），惰性加载：构造时不导入 torch / transformers，
+    第一次 generate() 才从进程级注册表（model_registry）取 tokenizer + 模型，之后常驻。
+    同一个 base model 与风格 adapter 共用一份权重：这里生成时 adapter 全部关闭。
     """
 
     def __init__(
@@ -38,76 +61,74 @@ class QwenEvidenceAnswerer:
         dtype: str = "bfloat16",
         device: Optional[str] = None,
     ):
-        # 目前这版 answer 是纯抽取式，不依赖 LLM；保留加载代码以兼容你后续要用 rewrite
         self.base_model = base_model
-        self.tokenizer = AutoTokenizer.from_pretrained(base_model, trust_remote_code=False)
-
-        if self.tokenizer.pad_token is None and self.tokenizer.eos_token is not None:
-            self.tokenizer.pad_token = self.tokenizer.eos_token
-
-        torch_dtype = torch.bfloat16 if dtype == "bfloat16" else torch.float16
-        self.model = AutoModelForCausalLM.from_pretrained(
-            base_model,
-            trust_remote_code=False,
-            device_map="auto" if device is None else None,
-            torch_dtype=torch_dtype,
-        )
-        if device is not None:
-            self.model.to(device)
-        self.model.eval()
+        self.dtype = dtype
+        self.device = device
+        self.shared = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.shared is not None
+
+    def load(self):
+        if self.shared is None:
+            self.shared = get_registry().get(self.base_model, self.dtype, self.device, user="answerer")
+
+    @property
+    def tokenizer(self):
+        self.load()
+        return self.shared.tokenizer
+
+    @property
+    def model(self):
+        self.load()
+        return self.shared.model
+
+    def generate(self, prompt: str, max_new_tokens: int = 260, temperature: float = 0.0) -> str:
+        import torch
+
+        self.load()
+        tokenizer = self.shared.tokenizer
+        with self.shared.use(adapter=None) as model:
+            inputs = tokenizer.apply_chat_template(
+                [{"role": "user", "content": prompt}],
+                add_generation_prompt=True,
+                return_tensors="pt",
+            ).to(model.device)
+            sampling = {"do_sample": True, "temperature": temperature} if temperature > 0 else {"do_sample": False}
+            with torch.no_grad():
+                out = model.generate(
+                    inputs,
+                    max_new_tokens=max_new_tokens,
+                    pad_token_id=tokenizer.pad_token_id,
+                    **sampling,
+                )
+        return tokenizer.decode(out[0, inputs.shape[1]:], skip_special_tokens=True).strip()
+
+
+class ExtractiveAnswerer:
+    """
+    B：基于证据生成回答（抽取式，不编造），并输出“依据”。
+    设计目标：
+    - Answer 只基于 evidence/snippet 中出现过的信息（不让 1B 模型脑补）。
+    - 相关：根据问题意图在 evidence 内挑最相关的 1-4 句原话组合成结论。
+    - 结构：严格输出 Answer/Evidence 两段，便于 UI 渲染引用。
+    纯规则 + 字符串处理，不加载任何模型（进程里不需要 torch / transformers）。
+    逐句特征优先用建索引时存下的（EvidenceBlock.utterances），打分 / 选句都是数组运算。
+    """
 
     # ---------- helpers (instance methods) ----------
     def _norm(self, s: str) -> str:
         return re.sub(r"\s+", " ", (s or "")).strip()
 
-    def _split_utterances(self, snippet: str):
+    def _utterances(self, ev: EvidenceBlock) -> Utterances:
         """
-        Parse snippet into ordered utterances: (speaker, text, raw_line).
-        Supports lines like: "clientA: xxx" / "me: xxx" / "coo: xxx"
+        证据块的逐句特征（切句 / 分词 / 时间表达 / 关键词规则见 a_memory.utterances）：
+        检索结果带了建索引时算好的特征就按 snippet 截断后直接用，否则对 snippet 现场抽取。
         """
-        out = []
-        for raw in (snippet or "").splitlines():
-            line = raw.strip()
-            if not line:
-                continue
-            m = re.match(r"^([A-Za-z0-9_\-]+)\s*:\s*(.+)$", line)
-            if m:
-                spk = m.group(1).strip()
-                txt = m.group(2).strip()
-                out.append((spk, txt, line))
-            else:
-                out.append(("", line, line))
-        return out
-
-    def _tokenize_zh(self, s: str):
-        s = re.sub(r"[^0-9A-Za-z\u4e00-\u9fff]+", " ", s or "").strip().lower()
-        if not s:
-            return []
-        tokens = []
-        parts = s.split()
-        for p in parts:
-            if re.search(r"[\u4e00-\u9fff]", p):
-                # Chinese bigrams
-                if len(p) == 1:
-                    tokens.append(p)
-                else:
-                    for i in range(len(p) - 1):
-                        tokens.append(p[i : i + 2])
-            else:
-                tokens.append(p)
-        return tokens
-
-    def _has_time_expr(self, s: str) -> bool:
-        s = s or ""
-        if re.search(r"\d{4}[-/.]\d{1,2}[-/.]\d{1,2}", s):
-            return True
-        if re.search(r"\d{1,2}月\d{1,2}日", s):
-            return True
-        if re.search(r"周[一二三四五六日天]", s):
-            return True
-        if any(k in s for k in ["今天", "明天", "后天", "下周", "本周", "周末", "今晚", "下午", "上午"]):
-            return True
-        return False
+        if ev.utterances is not None:
+            return ev.utterances.prefix(ev.snippet)
+        return extract_utterances(ev.snippet)
 
     def _q_intent(self, q: str) -> str:
         q = q or ""
@@ -127,105 +148,85 @@ class QwenEvidenceAnswerer:
             return f"{spk}说{txt}"
         return txt
 
-    def _score_line(self, intent: str, q_tokens: set, spk: str, txt: str, ev_score: float) -> float:
-        tks = self._tokenize_zh(txt)
-        overlap = len(q_tokens.intersection(tks))
-        score = float(overlap)
+    def _score_lines(self, intent: str, q_ids: np.ndarray, utts: Utterances, ev_score: float) -> np.ndarray:
+        """
+        一个证据块内每句的分数：问题 token 命中数 + 意图加分 + 0.2 × 检索分。
+        - time: 含“彩排” +2，有时间表达 +3
+        - process: 每命中一个流程关键词 +1
+        - asked: client 说的 +2，me 说的 +1，每命中一个报价类关键词 +1
+        """
+        n = len(utts)
+        owner = np.repeat(np.arange(n), np.diff(utts.tok_off))
+        score = np.bincount(owner[np.isin(utts.tokens, q_ids)], minlength=n).astype(np.int64)
+        kw, flags = utts.keywords, utts.flags
 
         if intent == "time":
-            if "彩排" in txt:
-                score += 2
-            if self._has_time_expr(txt):
-                score += 3
+            score += 2 * ((kw & _KW_REHEARSAL) > 0) + 3 * ((flags & FLAG_TIME) > 0)
 
         if intent == "process":
-            for kw in ["流程", "回签", "更新", "确认", "付款", "节点", "内部", "版本", "发你", "下周"]:
-                if kw in txt:
-                    score += 1
+            score += _popcount(kw & _KW_PROCESS_SCORE)
 
         if intent == "asked":
-            if (spk or "").lower().startswith("client"):
-                score += 2
-            if (spk or "").lower() in {"me", "我"}:
-                score += 1
-            for kw in ["包含", "培训", "部署", "报价"]:
-                if kw in txt:
-                    score += 1
-
-        score += float(ev_score) * 0.2
-        return score
-
-    def _pick_primary_evidence(self, question: str, evidences: List[EvidenceBlock]) -> EvidenceBlock:
-        q_tokens = set(self._tokenize_zh(question))
-        intent = self._q_intent(question)
+            score += 2 * ((flags & FLAG_CLIENT) > 0) + ((flags & FLAG_ME) > 0)
+            score += _popcount(kw & _KW_ASKED_SCORE)
+
+        return score.astype(np.float64) + float(ev_score) * 0.2
 
-        best = None  # (score, EvidenceBlock)
-        for ev in evidences:
-            for spk, txt, _raw in self._split_utterances(ev.snippet):
-                s = self._score_line(intent, q_tokens, spk, txt, ev.score)
-                if best is None or s > best[0]:
-                    best = (s, ev)
-        return best[1] if best else evidences[0]
+    def _pick_primary_evidence(self, scores: List[np.ndarray]) -> int:
+        """最佳匹配句所在的证据块（分数并列取靠前的）；所有证据块都没有句子时取第一个。"""
+        best = None  # (score, 证据块下标)
+        for i, s in enumerate(scores):
+            if len(s) and (best is None or s.max() > best[0]):
+                best = (s.max(), i)
+        return best[1] if best else 0
 
-    def _select_indices_in_block(self, intent: str, question: str, ev: EvidenceBlock) -> List[int]:
+    def _select_indices_in_block(self, intent: str, utts: Utterances, scores: np.ndarray) -> List[int]:
         """
         在一个 evidence block 内挑出最相关的 1-4 句（按原顺序输出）。
         """
-        utts = self._split_utterances(ev.snippet)
-        q_tokens = set(self._tokenize_zh(question))
-
-        # score each utterance
-        scored = []
-        for i, (spk, txt, raw) in enumerate(utts):
-            s = self._score_line(intent, q_tokens, spk, txt, ev.score)
-            scored.append((s, i, spk, txt, raw))
-        scored.sort(key=lambda x: x[0], reverse=True)
-
+        # 分数降序，并列保持原顺序
+        order = np.argsort(-scores, kind="stable")
+        kw, flags = utts.keywords, utts.flags
         chosen = set()
 
-        def add_if(pred, limit: int):
+        def add_if(pred: np.ndarray, limit: int):
             added = 0
-            for _s, i, spk, txt, raw in scored:
+            for i in order[pred[order]].tolist():
                 if i in chosen:
                     continue
-                if pred(spk, txt, raw):
-                    chosen.add(i)
-                    added += 1
-                    if added >= limit:
-                        break
+                chosen.add(i)
+                added += 1
+                if added >= limit:
+                    break
 
         if intent == "time":
-            add_if(lambda spk, txt, raw: ("彩排" in txt) and self._has_time_expr(txt), limit=2)
+            has_time = (flags & FLAG_TIME) > 0
+            add_if(((kw & _KW_REHEARSAL) > 0) & has_time, limit=2)
             if not chosen:
-                add_if(lambda spk, txt, raw: self._has_time_expr(txt), limit=2)
+                add_if(has_time, limit=2)
 
         elif intent == "process":
             # 先抓关键节点
-            add_if(lambda spk, txt, raw: any(k in txt for k in ["付款", "节点", "更新", "已更新", "确认", "回签", "内部", "流程", "下周"]), limit=6)
+            add_if((kw & _KW_PROCESS_PICK) > 0, limit=6)
 
         elif intent == "asked":
             # client 问 + me 答（尽量都带上）
-            add_if(lambda spk, txt, raw: (spk or "").lower().startswith("client") and any(k in txt for k in ["报价", "包含", "部署", "培训"]), limit=2)
-            add_if(lambda spk, txt, raw: (spk or "").lower() in {"me", "我"} and any(k in txt for k in ["包含", "不含", "培训", "部署", "单独"]), limit=2)
+            add_if(((flags & FLAG_CLIENT) > 0) & ((kw & _KW_CLIENT_PICK) > 0), limit=2)
+            add_if(((flags & FLAG_ME) > 0) & ((kw & _KW_ME_PICK) > 0), limit=2)
 
         # general fallback: top-2 scored lines if still empty
         if not chosen:
-            for s, i, *_ in scored[:2]:
-                if s > 0:
+            for i in order[:2].tolist():
+                if scores[i] > 0:
                     chosen.add(i)
 
         # final fallback: prefer me line else first line
-        if not chosen and utts:
-            for i, (spk, _txt, _raw) in enumerate(utts):
-                if (spk or "").lower() in {"me", "我"}:
-                    chosen.add(i)
-                    break
-        if not chosen and utts:
-            chosen.add(0)
+        if not chosen and len(utts):
+            me = np.flatnonzero(flags & FLAG_ME)
+            chosen.add(int(me[0]) if len(me) else 0)
 
         return sorted(chosen)
 
-    @torch.no_grad()
     def answer(
         self,
         question: str,
@@ -238,21 +239,23 @@ class QwenEvidenceAnswerer:
             return "Answer: （未检索到相关记录，无法从证据确定。）\nEvidence:\n- [1] （无）"
 
         intent = self._q_intent(question)
+        q_ids = token_ids(tokenize_zh(question))
+        blocks = [self._utterances(ev) for ev in evidences]
+        scores = [self._score_lines(intent, q_ids, u, ev.score) for u, ev in zip(blocks, evidences)]
 
         # 1) choose best evidence block by best matching utterance
-        primary_ev = self._pick_primary_evidence(question, evidences)
-        utts = self._split_utterances(primary_ev.snippet)
+        p = self._pick_primary_evidence(scores)
+        primary_ev, utts = evidences[p], blocks[p]
 
         # 2) select relevant utterances (indices) within that block
-        idxs = self._select_indices_in_block(intent, question, primary_ev)
+        idxs = self._select_indices_in_block(intent, utts, scores[p])
 
         # 3) build answer text
         selected_display = []
         selected_raw = []
         for i in idxs:
-            spk, txt, raw = utts[i]
-            selected_display.append(self._display_line(spk, txt))
-            selected_raw.append(raw)
+            selected_display.append(self._display_line(utts.speakers[i], utts.body(primary_ev.snippet, i)))
+            selected_raw.append(utts.raw(primary_ev.snippet, i))
 
         if intent == "asked":
             # 强化你要的“问过/没问过”的结论句
@@ -262,4 +265,44 @@ class QwenEvidenceAnswerer:
 
         ev_join = " / ".join(selected_raw) if selected_raw else self._norm(primary_ev.snippet)[:200]
         out = "Answer: " + self._norm(answer_text) + "\nEvidence:\n" + f"- [{primary_ev.idx}] {ev_join}"
-        return out
\ No newline at end of file
+        return out
+
+
+class QwenEvidenceAnswerer(ExtractiveAnswerer):
+    """
+    抽取式 answer() + 可选的生成式后端（后续 rewrite 用）。
+    构造参数与旧版一致，但模型不再在 __init__ 里加载：只有第一次 generate()
+    （或访问 .model / .tokenizer）时才加载。
+    """
+
+    def __init__(
+        self,
+        base_model: str = "google/gemma-3-1b-it",
+        dtype: str = "bfloat16",
+        device: Optional[str] = None,
+    ):
+        self.base_model = base_model
+        self.generator = GenerativeBackend(base_model=base_model, dtype=dtype, device=device)
+
+    @property
+    def tokenizer(self):
+        return self.generator.tokenizer
+
+    @property
+    def model(self):
+        return self.generator.model
+
+    def generate(self, prompt: str, max_new_tokens: int = 260, temperature: float = 0.0) -> str:
+        return self.generator.generate(prompt, max_new_tokens=max_new_tokens, temperature=temperature)
+
+
+def make_answerer(mode: str = "extractive", base_model: str = "google/gemma-3-1b-it") -> ExtractiveAnswerer:
+    """
+    extractive: 只有抽取式引擎，进程里没有任何 transformers 模型
+    generative: 额外挂上惰性加载的生成式后端（首次 generate 时加载）
+    """
+    if mode == "extractive":
+        return ExtractiveAnswerer()
+    if mode == "generative":
+        return QwenEvidenceAnswerer(base_model=base_model)
+    raise ValueError(f"unknown answer mode: {mode}")
@@ -2,9 +2,8 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
-from peft import PeftModel
 
+from src.b_answer.model_registry import get_registry
 from ..style_profile import StyleProfile
 
 
@@ -12,6 +11,7 @@ from ..style_profile import StyleProfile
 class LoraAdapterConfig:
     base_model_name_or_path: str = "google/gemma-3-1b-it"
     adapter_path: str = "data/style_adapters/user_default/v1"
+    adapter_name: str = "style"  # 在共享 base model 上的 PEFT adapter 名
     device: str = "cuda" if torch.cuda.is_available() else "cpu"
     dtype: str = "bfloat16"  # "float16" / "bfloat16" / "float32"
     max_new_tokens: int = 220
@@ -23,28 +23,24 @@ class StyleAdapter:
     """
     LoRA rewrite-only adapter for B.
     Uses Qwen chat template + token-slice to avoid prompt-echo.
+    base model 从进程级注册表取（与生成式回答共用一份权重），LoRA 通过 PEFT 挂在上面，改写时只启用这个 adapter。
     """
     def __init__(self, cfg: LoraAdapterConfig):
         self.cfg = cfg
         self.enabled = True
 
-        torch_dtype = {
-            "float16": torch.float16,
-            "bfloat16": torch.bfloat16,
-            "float32": torch.float32,
-        }[cfg.dtype]
-
-        self.tokenizer = AutoTokenizer.from_pretrained(cfg.base_model_name_or_path, use_fast=True)
-        if self.tokenizer.pad_token is None:
-            self.tokenizer.pad_token = self.tokenizer.eos_token
-
-        base = AutoModelForCausalLM.from_pretrained(
+        self.shared = get_registry().get(
             cfg.base_model_name_or_path,
-            torch_dtype=torch_dtype,  # ✅ 正确使用 torch_dtype 指定精度
-            device_map="auto" if cfg.device != "cpu" else None,
+            dtype=cfg.dtype,
+            device=None if cfg.device != "cpu" else "cpu",  # 非 cpu 用 device_map="auto"
+            user="style_adapter",
         )
-        self.model = PeftModel.from_pretrained(base, cfg.adapter_path)
-        self.model.eval()
+        self.shared.attach_adapter(cfg.adapter_path, name=cfg.adapter_name)
+        self.tokenizer = self.shared.tokenizer
+
+    @property
+    def model(self):
+        return self.shared.model
 
     def _build_messages(self, draft: str, profile: StyleProfile):
         forbidden = "、".join(profile.lexicon.forbidden_words[:20])
@@ -74,17 +70,18 @@ class StyleAdapter:
             tokenize=False,
             add_generation_prompt=True
         )
-        inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
-
-        out = self.model.generate(
-            **inputs,
-            max_new_tokens=self.cfg.max_new_tokens,
-            do_sample=True,
-            temperature=self.cfg.temperature,
-            top_p=self.cfg.top_p,
-            eos_token_id=self.tokenizer.eos_token_id,
-            pad_token_id=self.tokenizer.pad_token_id,
-        )
+        with self.shared.use(adapter=self.cfg.adapter_name) as model:
+            inputs = self.tokenizer(prompt, return_tensors="pt").to(model.device)
+
+            out = model.generate(
+                **inputs,
+                max_new_tokens=self.cfg.max_new_tokens,
+                do_sample=True,
+                temperature=self.cfg.temperature,
+                top_p=self.cfg.top_p,
+                eos_token_id=self.tokenizer.eos_token_id,
+                pad_token_id=self.tokenizer.pad_token_id,
+            )
 
         # ✅ 关键：只取“新生成部分”，避免 prompt 回显
         gen_ids = out[0][inputs["input_ids"].shape[-1]:]
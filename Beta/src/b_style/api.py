@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Optional, Dict, Any, List
+from typing import TYPE_CHECKING, Optional, Dict, Any, List
 
 from .style_profile import StyleProfile
 from .preprocess import normalize_text
@@ -9,7 +9,9 @@ from .rules import rule_rewrite, RuleEdit
 from .invariants import check_invariants, InvariantViolation
 from .diff_report import build_diff_report, DiffReport
 from .gating import should_apply_style
-from .adapter.apply import StyleAdapter
+
+if TYPE_CHECKING:
+    from .adapter.apply import StyleAdapter
 
 
 @dataclass
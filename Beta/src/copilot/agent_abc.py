@@ -3,33 +3,41 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 import time
-from typing import Any, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
 from src.a_memory.search import MemorySearch
-from src.a_memory.db import connect
+from src.a_memory.conv_catalog import ConvMeta, get_catalog
 
-from src.b_answer.qwen_answer import QwenEvidenceAnswerer, EvidenceBlock
+from src.b_answer.qwen_answer import EvidenceBlock, make_answerer
 from src.b_style.api import style_rewrite
 from src.b_style.style_profile import StyleProfile
-from src.b_style.adapter.apply import StyleAdapter
+
+if TYPE_CHECKING:
+    # 只用于类型标注：apply.py 顶层导入 torch / transformers / peft，抽取式模式下不应加载
+    from src.b_style.adapter.apply import StyleAdapter
+
+
+def _meta_dict(meta: Optional[ConvMeta]) -> Dict[str, Any]:
+    if meta is None:
+        return {"title": "", "participants": "", "last_active_ts": ""}
+    return {"title": meta.title, "participants": meta.participants, "last_active_ts": meta.last_active_ts}
 
 
 def fetch_conv_meta(conv_id: str) -> Dict[str, Any]:
     """
-    从 SQLite 中取会话 title/participants 等元信息。
+    取会话 title/participants 等元信息（进程级内存目录，ingest 后自动刷新）。
     A 的检索结果里只有 conv_id，需要在这里补上 title 才能“像助手”回答。
     """
+    return fetch_conv_metas([conv_id])[0]
+
+
+def fetch_conv_metas(conv_ids: List[str]) -> List[Dict[str, Any]]:
+    """一批证据的会话元信息，一次批量查询。"""
     try:
-        conn = connect()
-        cur = conn.cursor()
-        cur.execute("SELECT title, participants, last_active_ts FROM conversations WHERE conv_id = ?", (conv_id,))
-        row = cur.fetchone()
-        conn.close()
-        if not row:
-            return {"title": "", "participants": "", "last_active_ts": ""}
-        return {"title": row[0] or "", "participants": row[1] or "", "last_active_ts": row[2] or ""}
+        metas = get_catalog().get_many(conv_ids)
     except Exception:
-        return {"title": "", "participants": "", "last_active_ts": ""}
+        metas = [None] * len(conv_ids)
+    return [_meta_dict(m) for m in metas]
 
 
 @dataclass
@@ -55,7 +63,13 @@ class CopilotAgentABC:
         profile: StyleProfile,
         base_model: str = "google/gemma-3-1b-it",
         adapter: Optional[StyleAdapter] = None,
+        answer_mode: str = "extractive",
     ):
+        """
+        answer_mode:
+          - extractive: B 只用抽取式引擎，不加载 LLM（默认；服务端用这个）
+          - generative: B 挂上生成式后端，首次生成时才加载 base_model
+        """
         self.profile = profile
         self.adapter = adapter
 
@@ -63,13 +77,13 @@ class CopilotAgentABC:
         self.search = MemorySearch()
 
         # B
-        self.answerer = QwenEvidenceAnswerer(base_model=base_model)
+        self.answerer = make_answerer(answer_mode, base_model=base_model)
 
     def _build_evidence_blocks(self, results: List[Dict[str, Any]]) -> List[EvidenceBlock]:
         blocks: List[EvidenceBlock] = []
-        for i, r in enumerate(results, 1):
+        metas = fetch_conv_metas([r.get("conv_id", "") for r in results])
+        for i, (r, meta) in enumerate(zip(results, metas), 1):
             conv_id = r.get("conv_id", "")
-            meta = fetch_conv_meta(conv_id)
             blocks.append(
                 EvidenceBlock(
                     idx=i,
@@ -80,6 +94,8 @@ class CopilotAgentABC:
                     score=float(r.get("score", 0.0)),
                     confidence=r.get("confidence", ""),
                     snippet=(r.get("text") or "")[:800],
+                    # 建索引时算好的逐句特征按行号 + chunk_id 取（检索结果 dict 里不带 numpy 数组）
+                    utterances=self.search.utterances(r["row"], r.get("chunk_id", "")) if "row" in r else None,
                 )
             )
         return blocks